@@ -0,0 +1,816 @@
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Callable, Optional
+
+import helpers
+
+
+def copy_database(target_dir: str) -> str:
+    """
+    Function copying the bundled database into a scratch directory so benchmarks never modify it.
+
+    :param: target directory
+    :return: path to the copy
+    """
+    source = '{}/db/qho429.db'.format(helpers.get_root_dir())
+    target = os.path.join(target_dir, 'qho429.db')
+    shutil.copyfile(source, target)
+    return target
+
+
+def time_calls(function: Callable, repeat: int) -> float:
+    """
+    Function calling the passed in function repeatedly and returning the mean latency in microseconds.
+
+    :param: function taking no arguments
+    :param: number of calls
+    :return: mean latency in microseconds
+    """
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        elapsed = time.perf_counter() - start
+    return elapsed / repeat * 1_000_000
+
+
+def add_shoppers(connection: sqlite3.Connection, count: int) -> None:
+    """
+    Function appending synthetic shoppers to the shoppers table.
+
+    :param: connection
+    :param: number of shoppers to add
+    :return: None
+    """
+    cursor = connection.cursor()
+    cursor.execute("""SELECT IFNULL(MAX(shopper_id), 0) FROM shoppers""")
+    first_id = cursor.fetchone()[0] + 1
+    cursor.executemany("""INSERT INTO
+                                shoppers (shopper_id, shopper_account_ref, shopper_first_name, shopper_surname,
+                                          shopper_email_address, date_joined)
+                                VALUES(?,?,?,?,?,?)""",
+                       ((shopper_id, f'BENCH{shopper_id}', 'Bench', 'Shopper', f'{shopper_id}@example.com',
+                         '2020-01-01') for shopper_id in range(first_id, first_id + count)))
+    connection.commit()
+
+
+def benchmark_login(sizes: list[int], repeat: int) -> None:
+    """
+    Function timing check_if_shopper_exists while the shoppers table grows, with and without the
+    membership cache.
+
+    :param: table sizes to measure at
+    :param: number of logins per measurement
+    :return: None
+    """
+    from db import shoppers
+
+    with tempfile.TemporaryDirectory() as scratch:
+        connection = sqlite3.connect(copy_database(scratch))
+        cursor = connection.cursor()
+        print(f'{"shoppers":>10} {"uncached µs":>12} {"cached µs":>10}')
+        for size in sizes:
+            cursor.execute("""SELECT COUNT(*) FROM shoppers""")
+            current = cursor.fetchone()[0]
+            if size > current:
+                add_shoppers(connection, size - current)
+            cursor.execute("""SELECT MAX(shopper_id) FROM shoppers""")
+            shopper_id = cursor.fetchone()[0]
+
+            def uncached_login() -> None:
+                shoppers.forget_shopper(shopper_id)
+                shoppers.check_if_shopper_exists(cursor, shopper_id)
+
+            uncached = time_calls(uncached_login, repeat)
+            cached = time_calls(lambda: shoppers.check_if_shopper_exists(cursor, shopper_id), repeat)
+            print(f'{max(size, current):>10} {uncached:>12.2f} {cached:>10.2f}')
+        connection.close()
+
+
+def _id_allocation_worker(database_path: str, shopper_id: int, offer: tuple, operations: int,
+                          shard: Optional[int] = None) -> tuple:
+    """
+    Function run in each stress test process: creates a basket and checks it out, repeatedly.
+
+    :param: database path
+    :param: shopper_id
+    :param: (product_id, seller_id, price) to put in every basket
+    :param: number of basket and order pairs to create
+    :param: shard holding the shopper's data, None for the main database
+    :return: (basket ids, order ids, failed operations)
+    """
+    from db.basket import add_item_to_basket, checkout
+    from db.connect import create_connection
+
+    connection = create_connection(database_path, shard=shard)
+    cursor = connection.cursor()
+    product_id, seller_id, price = offer
+    basket_ids, order_ids, failures = [], [], 0
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(operations):
+            basket_id = add_item_to_basket(cursor, shopper_id, seller_id, product_id, 1, price)
+            order_id = checkout(cursor, basket_id, shopper_id) if basket_id else None
+            if basket_id:
+                basket_ids.append(basket_id)
+            if order_id:
+                order_ids.append(order_id)
+            else:
+                failures += 1
+    connection.close()
+    return basket_ids, order_ids, failures
+
+
+def stress_id_allocation(process_counts: list[int], operations: int) -> bool:
+    """
+    Function creating baskets and orders from several processes at once against a scratch copy of the
+    database and checking that no basket or order id was handed out twice.
+
+    :param: numbers of processes to run with
+    :param: basket and order pairs created by each process
+    :return: True if every run completed without collisions or failures
+    """
+    from db.connect import create_connection
+
+    passed = True
+    print(f'{"processes":>9} {"orders":>8} {"failures":>8} {"collisions":>10} {"orders/s":>9}')
+    for process_count in process_counts:
+        with tempfile.TemporaryDirectory() as scratch:
+            database_path = copy_database(scratch)
+            connection = create_connection(database_path)
+            shopper_ids = [row[0] for row in connection.execute("""SELECT shopper_id FROM shoppers""")]
+            offer = connection.execute("""SELECT product_id, seller_id, price FROM product_sellers""").fetchone()
+            connection.close()
+
+            arguments = [(database_path, shopper_ids[index % len(shopper_ids)], offer, operations)
+                         for index in range(process_count)]
+            start = time.perf_counter()
+            with multiprocessing.Pool(process_count) as pool:
+                results = pool.starmap(_id_allocation_worker, arguments)
+            elapsed = time.perf_counter() - start
+
+        basket_ids = [basket_id for result in results for basket_id in result[0]]
+        order_ids = [order_id for result in results for order_id in result[1]]
+        failures = sum(result[2] for result in results)
+        collisions = (len(basket_ids) - len(set(basket_ids))) + (len(order_ids) - len(set(order_ids)))
+        passed = passed and not failures and not collisions
+        print(f'{process_count:>9} {len(order_ids):>8} {failures:>8} {collisions:>10} '
+              f'{len(order_ids) / elapsed:>9.0f}')
+    return passed
+
+
+def benchmark_shards(shard_counts: list[int], process_count: int, operations: int) -> bool:
+    """
+    Function measuring checkout throughput with shopper data split across each number of shards, 0 standing
+    for the unsharded database. process_count processes each create and check out baskets for a shopper of
+    their own, with the shoppers spread evenly over the shards, and ids are checked for collisions across
+    shards. Each shard has its own write lock, so with at least process_count cores the orders per second
+    should grow roughly linearly with the shard count, up to process_count shards.
+
+    :param: numbers of shards to run with
+    :param: number of processes
+    :param: basket and order pairs created by each process
+    :return: True if every run completed without collisions or failures
+    """
+    from db.connect import create_connection, get_shard
+    from db.shards import split_shopper_data
+
+    passed = True
+    print(f'{process_count} processes on {os.cpu_count()} cores')
+    print(f'{"shards":>6} {"orders":>8} {"failures":>8} {"collisions":>10} {"orders/s":>9}')
+    for shard_count in shard_counts:
+        with tempfile.TemporaryDirectory() as scratch:
+            database_path = copy_database(scratch)
+            connection = create_connection(database_path)
+            shopper_ids = [row[0] for row in connection.execute("""SELECT shopper_id FROM shoppers""")]
+            offer = connection.execute("""SELECT product_id, seller_id, price FROM product_sellers""").fetchone()
+            connection.close()
+            if shard_count:
+                with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                    split_shopper_data(database_path, shard_count)
+
+            arguments = []
+            for index in range(process_count):
+                candidates = [shopper_id for shopper_id in shopper_ids
+                              if not shard_count or get_shard(shopper_id, shard_count) == index % shard_count]
+                shopper_id = candidates[index // (shard_count or 1) % len(candidates)]
+                arguments.append((database_path, shopper_id, offer, operations, get_shard(shopper_id, shard_count)))
+            start = time.perf_counter()
+            with multiprocessing.Pool(process_count) as pool:
+                results = pool.starmap(_id_allocation_worker, arguments)
+            elapsed = time.perf_counter() - start
+
+        basket_ids = [basket_id for result in results for basket_id in result[0]]
+        order_ids = [order_id for result in results for order_id in result[1]]
+        failures = sum(result[2] for result in results)
+        collisions = (len(basket_ids) - len(set(basket_ids))) + (len(order_ids) - len(set(order_ids)))
+        passed = passed and not failures and not collisions
+        print(f'{shard_count or "none":>6} {len(order_ids):>8} {failures:>8} {collisions:>10} '
+              f'{len(order_ids) / elapsed:>9.0f}')
+    return passed
+
+
+def _compile_options_with_lists(rows: list[tuple]) -> list[list]:
+    """
+    Function reproducing the former row handling: every row copied into a list, then numbered with
+    list.index(), which makes numbering quadratic.
+
+    :param: rows as returned by the cursor
+    :return: numbered options
+    """
+    options = [list(row) for row in rows]
+    options.sort(key=lambda tup: tup[1])
+    numbered = []
+    for option in options:
+        index = options.index(option)
+        numbered.append([int(index) + 1, option])
+    return numbered
+
+
+def _compile_options_with_records(rows: list[tuple]) -> list[tuple]:
+    """
+    Function building records and numbering them the way db.inventory does now.
+
+    :param: rows as returned by the cursor
+    :return: numbered options
+    """
+    from db.records import Seller
+
+    return helpers.compile_options_for_printing(list(map(Seller._make, rows)))
+
+
+def benchmark_option_numbering(sizes: list[int]) -> None:
+    """
+    Function comparing the time and peak allocations of building numbered catalog options from list copies
+    and from records, for catalogs of several sizes.
+
+    :param: numbers of rows
+    :return: None
+    """
+    print(f'{"rows":>8} {"lists ms":>10} {"lists KiB":>10} {"records ms":>11} {"records KiB":>12}')
+    for size in sizes:
+        rows = [(seller_id, f'Seller {seller_id:08d}', 9.99) for seller_id in range(size, 0, -1)]
+        measurements = []
+        for compile_options in (_compile_options_with_lists, _compile_options_with_records):
+            tracemalloc.start()
+            start = time.perf_counter()
+            compile_options(list(rows))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            measurements.extend([elapsed * 1000, peak / 1024])
+        print(f'{size:>8} {measurements[0]:>10.1f} {measurements[1]:>10.0f} {measurements[2]:>11.1f} '
+              f'{measurements[3]:>12.0f}')
+
+
+def add_products(connection: sqlite3.Connection, count: int, seed: int = 0) -> None:
+    """
+    Function appending synthetic products, named like the synthetic dataset's, to the products table.
+
+    :param: connection
+    :param: number of products to add
+    :param: random seed
+    :return: None
+    """
+    from db.synthetic import MANUFACTURERS, PRODUCT_WORDS
+
+    rng = random.Random(seed)
+    cursor = connection.cursor()
+    cursor.execute("""SELECT IFNULL(MAX(product_id), 0) FROM products""")
+    first_id = cursor.fetchone()[0] + 1
+    categories = cursor.execute("""SELECT category_id, category_description FROM categories""").fetchall()
+
+    def product_rows():
+        for product_id in range(first_id, first_id + count):
+            category_id, category_description = rng.choice(categories)
+            manufacturer = rng.choice(MANUFACTURERS)
+            model = '{}{}'.format(manufacturer[:2].upper(), rng.randrange(1000, 99999))
+            yield (product_id, category_id, f'BENCH{product_id}',
+                   '{} {} {} {}'.format(manufacturer, category_description.split()[0], rng.choice(PRODUCT_WORDS),
+                                        model),
+                   manufacturer, model, 'Available')
+
+    cursor.executemany("""INSERT INTO
+                                products (product_id, category_id, product_code, product_description,
+                                          product_manufacturer, product_model, product_status)
+                                VALUES(?,?,?,?,?,?,?)""", product_rows())
+    connection.commit()
+
+
+"""Search texts timed by benchmark_search, from a rare exact model to words matching most of the catalog"""
+SEARCH_QUERIES: tuple[str, ...] = ('samsung galaxy', 'a', 'so', 'sony pro', 'SA123', 'lenovo mini', 'noexist')
+
+
+def benchmark_search(sizes: list[int], repeat: int) -> None:
+    """
+    Function timing search_products while the products table grows, for a mix of selective and
+    unselective search texts.
+
+    :param: table sizes to measure at
+    :param: number of searches per measurement
+    :return: None
+    """
+    from db.inventory import search_products
+    from db.migrations import migrate
+
+    with tempfile.TemporaryDirectory() as scratch:
+        connection = sqlite3.connect(copy_database(scratch))
+        migrate(connection)
+        cursor = connection.cursor()
+        print(f'{"products":>10} {"search":>16} {"matches":>8} {"p50 ms":>8} {"p99 ms":>8}')
+        for size in sizes:
+            current = cursor.execute("""SELECT COUNT(*) FROM products""").fetchone()[0]
+            if size > current:
+                add_products(connection, size - current)
+            for text in SEARCH_QUERIES:
+                matches = cursor.execute("""SELECT COUNT(*) FROM product_search WHERE product_search MATCH ?""",
+                                         (' '.join(f'"{word}"*' for word in text.split()),)).fetchone()[0]
+                samples = sorted(time_operation(lambda: search_products(cursor, text), repeat))
+                print(f'{max(size, current):>10} {text:>16} {matches:>8} {samples[len(samples) // 2] / 1000:>8.2f} '
+                      f'{samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000:>8.2f}')
+        connection.close()
+
+
+"""Longest median time importing main.py may take before the startup benchmark fails"""
+STARTUP_BUDGET_MS: float = 80.0
+
+"""Modules only needed by some menu options or modes, which importing main.py must not load"""
+DEFERRED_MODULES: tuple[str, ...] = ('tabulate', 'headless', 'db.writer', 'pathlib', 'numpy')
+
+
+def benchmark_startup(launches: int, budget_ms: float = STARTUP_BUDGET_MS) -> bool:
+    """
+    Function timing the import of main.py in fresh interpreters, the part of a cold start spent before the
+    first prompt, and checking it against a budget and that none of DEFERRED_MODULES were imported.
+
+    :param: number of interpreters to start
+    :param: budget for the median import time in milliseconds
+    :return: True if the import is within budget and no deferred module was imported
+    """
+    script = ('import sys, time\n'
+              'start = time.perf_counter()\n'
+              'import main\n'
+              'print(time.perf_counter() - start)\n'
+              'print(",".join(name for name in {!r} if name in sys.modules))').format(DEFERRED_MODULES)
+    samples = []
+    loaded: set[str] = set()
+    for _ in range(launches):
+        output = subprocess.run([sys.executable, '-c', script], cwd=helpers.get_root_dir(), check=True,
+                                capture_output=True, text=True).stdout.splitlines()
+        samples.append(float(output[0]) * 1000)
+        loaded.update(filter(None, output[1].split(',')))
+
+    samples.sort()
+    median = samples[len(samples) // 2]
+    print(f'import main: min {samples[0]:.1f} ms, median {median:.1f} ms, max {samples[-1]:.1f} ms '
+          f'(budget {budget_ms:.0f} ms)')
+    if loaded:
+        helpers.error('Imported at startup: {}'.format(', '.join(sorted(loaded))))
+    if median > budget_ms:
+        helpers.error(f'Startup is {median - budget_ms:.1f} ms over budget')
+    return median <= budget_ms and not loaded
+
+
+def time_operation(function: Callable, repeat: int, setup: Optional[Callable] = None) -> list[float]:
+    """
+    Function timing repeated calls one by one. When setup is passed it is called, untimed, before each
+    call and its return value is passed to the function as arguments.
+
+    :param: function to time
+    :param: number of calls
+    :param: function returning a tuple of arguments for the next call
+    :return: latency of each call in microseconds
+    """
+    samples = []
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(repeat):
+            arguments = setup() if setup else ()
+            start = time.perf_counter()
+            function(*arguments)
+            samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def get_suite_workload(cursor: sqlite3.Cursor) -> list[tuple[str, Callable, Optional[Callable]]]:
+    """
+    Function returning (name, function, setup) for every public function in db.basket, db.inventory and
+    db.shoppers, called with the busiest shopper, product and category in the database. Catalog functions
+    are timed twice: cold, with the catalog cache emptied before each call, and warm.
+
+    :param: db cursor
+    :return: list of named calls
+    """
+    from db import basket, inventory, shoppers
+
+    cursor.execute("""SELECT shopper_id FROM shopper_orders GROUP BY shopper_id ORDER BY COUNT(*) DESC LIMIT 1""")
+    shopper_id = cursor.fetchone()[0]
+    cursor.execute("""SELECT product_id, MIN(seller_id), COUNT(*) FROM product_sellers
+                      GROUP BY product_id ORDER BY COUNT(*) DESC LIMIT 1""")
+    product_id, seller_id, _ = cursor.fetchone()
+    cursor.execute("""SELECT category_id FROM products GROUP BY category_id ORDER BY COUNT(*) DESC LIMIT 1""")
+    category_id = cursor.fetchone()[0]
+    sellers = inventory.get_product_sellers(cursor, product_id)
+    price = inventory.get_product_offer(cursor, product_id, seller_id).price
+
+    def new_basket() -> tuple:
+        return basket.add_item_to_basket(cursor, shopper_id, seller_id, product_id, 1, price),
+
+    basket_id = new_basket()[0]
+    workload = [
+        ('shoppers.check_if_shopper_exists (cold)', lambda: shoppers.check_if_shopper_exists(cursor, shopper_id),
+         lambda: shoppers.forget_shopper(shopper_id) or ()),
+        ('shoppers.check_if_shopper_exists', lambda: shoppers.check_if_shopper_exists(cursor, shopper_id), None),
+        ('shoppers.get_order_history_page', lambda: shoppers.get_order_history_page(cursor, shopper_id), None),
+        ('shoppers.get_order_history', lambda: next(shoppers.get_order_history(cursor, shopper_id)), None),
+    ]
+    for name, function in (('get_product_categories', lambda: inventory.get_product_categories(cursor)),
+                           ('get_category_products', lambda: inventory.get_category_products(cursor, category_id)),
+                           ('get_product_sellers', lambda: inventory.get_product_sellers(cursor, product_id)),
+                           ('get_product_offer', lambda: inventory.get_product_offer(cursor, product_id, seller_id)),
+                           ('get_product', lambda: inventory.get_product(cursor, product_id))):
+        workload.append((f'inventory.{name} (cold)', function, lambda: inventory.catalog_cache.invalidate() or ()))
+        workload.append((f'inventory.{name}', function, None))
+    workload += [
+        ('inventory.get_sellers_product_price', lambda: inventory.get_sellers_product_price(sellers, seller_id),
+         None),
+        ('basket.get_todays_shopper_basket_id', lambda: basket.get_todays_shopper_basket_id(cursor, shopper_id),
+         None),
+        ('basket.add_item_to_basket',
+         lambda: basket.add_item_to_basket(cursor, shopper_id, seller_id, product_id, 1, price), None),
+        ('basket.get_baskets_contents', lambda: basket.get_baskets_contents(cursor, basket_id), None),
+        ('basket.get_basket_total', lambda: basket.get_basket_total(cursor, basket_id), None),
+        ('basket.display_basket_contents',
+         lambda: basket.display_basket_contents(cursor, basket.get_baskets_contents(cursor, basket_id), basket_id),
+         None),
+        ('basket.check_if_item_exists_in_basket',
+         lambda: basket.check_if_item_exists_in_basket(cursor, product_id, basket_id), None),
+        ('basket.update_item_quantity_in_basket_contents',
+         lambda: basket.update_item_quantity_in_basket_contents(cursor, basket_id, product_id, 2), None),
+        ('basket.delete_item_from_basket_contents',
+         lambda new_basket_id: basket.delete_item_from_basket_contents(cursor, new_basket_id, product_id),
+         new_basket),
+        ('basket.delete_basket_contents',
+         lambda new_basket_id: basket.delete_basket_contents(cursor, new_basket_id), new_basket),
+        ('basket.delete_basket_from_shopper_baskets',
+         lambda new_basket_id: basket.delete_basket_from_shopper_baskets(cursor, new_basket_id, shopper_id),
+         new_basket),
+        ('basket.create_shopper_order', lambda: basket.create_shopper_order(cursor, shopper_id), None),
+        ('basket.create_ordered_products',
+         lambda new_basket_id, order_id: basket.create_ordered_products(cursor, new_basket_id, order_id),
+         lambda: new_basket() + (basket.create_shopper_order(cursor, shopper_id),)),
+        ('basket.checkout', lambda new_basket_id: basket.checkout(cursor, new_basket_id, shopper_id), new_basket),
+        ('basket.BasketSession', lambda: basket.BasketSession(cursor, shopper_id), None),
+    ]
+    return workload
+
+
+def benchmark_suite(scales: list[str], repeat: int, results_path: str, compare_path: Optional[str] = None,
+                    seed: int = 0) -> None:
+    """
+    Function generating a synthetic dataset for each scale in a scratch directory, timing every call from
+    get_suite_workload() against it, and writing the mean, p50 and p95 latencies to a JSON file so runs can
+    be compared. With compare_path, each mean is also shown relative to the same entry in that file.
+
+    :param: dataset scales from db.synthetic.SCALES
+    :param: calls per function
+    :param: JSON file the results are written to
+    :param: JSON file written by an earlier run
+    :param: random seed for the datasets
+    :return: None
+    """
+    from db.connect import create_connection
+    from db.synthetic import SCALES, create_dataset
+
+    previous = {}
+    if compare_path:
+        with open(compare_path, encoding='utf-8') as results_file:
+            previous = json.load(results_file)['scales']
+
+    results = {'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'repeat': repeat, 'seed': seed, 'scales': {}}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as scratch:
+            start = time.perf_counter()
+            create_dataset(os.path.join(scratch, 'qho429.db'), SCALES[scale], seed)
+            print(f'\n{scale}: {SCALES[scale]} generated in {time.perf_counter() - start:.1f}s')
+            print(f'{"mean µs":>10} {"p50 µs":>10} {"p95 µs":>10} {"vs prev":>8}  function')
+
+            connection = create_connection(os.path.join(scratch, 'qho429.db'))
+            cursor = connection.cursor()
+            timings = results['scales'][scale] = {}
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                workload = get_suite_workload(cursor)
+            for name, function, setup in workload:
+                samples = sorted(time_operation(function, repeat, setup))
+                timings[name] = {'mean_us': round(statistics.fmean(samples), 2),
+                                 'p50_us': round(samples[len(samples) // 2], 2),
+                                 'p95_us': round(samples[int(len(samples) * 0.95)], 2)}
+                before = previous.get(scale, {}).get(name)
+                ratio = f'{timings[name]["mean_us"] / before["mean_us"]:>7.2f}x' if before else f'{"-":>8}'
+                print(f'{timings[name]["mean_us"]:>10.1f} {timings[name]["p50_us"]:>10.1f} '
+                      f'{timings[name]["p95_us"]:>10.1f} {ratio}  {name}')
+            connection.close()
+
+    with open(results_path, 'w', encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f'\nResults written to {results_path}')
+
+
+async def _http_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                        body: Optional[dict] = None) -> int:
+    """
+    Function sending one request on a keep-alive connection and reading the response.
+
+    :param: stream reader
+    :param: stream writer
+    :param: HTTP method
+    :param: path
+    :param: JSON body
+    :return: HTTP status code
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n'.encode()
+                 + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _load_test_client(port: int, requests: int, shopper_ids: list[int], offers: list[tuple],
+                            category_ids: list[int], seed: int) -> list[tuple[str, int, float]]:
+    """
+    Function run by each simulated shopper: a keep-alive connection sending a browsing-heavy mix of
+    requests, adding to the basket and checking out now and then.
+
+    :param: service port
+    :param: number of requests to send
+    :param: shopper ids to act as
+    :param: (product_id, seller_id) pairs on sale
+    :param: category ids
+    :param: random seed
+    :return: (request kind, HTTP status, latency in seconds) per request
+    """
+    rng = random.Random(seed)
+    shopper_id = rng.choice(shopper_ids)
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    samples = []
+    for _ in range(requests):
+        product_id, seller_id = rng.choice(offers)
+        kind = rng.choices(('categories', 'products', 'sellers', 'orders', 'basket', 'add', 'checkout'),
+                           (10, 30, 25, 10, 10, 10, 5))[0]
+        method, path, body = {
+            'categories': ('GET', '/categories', None),
+            'products': ('GET', f'/categories/{rng.choice(category_ids)}/products', None),
+            'sellers': ('GET', f'/products/{product_id}/sellers', None),
+            'orders': ('GET', f'/shoppers/{shopper_id}/orders', None),
+            'basket': ('GET', f'/shoppers/{shopper_id}/basket', None),
+            'add': ('POST', f'/shoppers/{shopper_id}/basket',
+                    {'product_id': product_id, 'seller_id': seller_id, 'quantity': 1}),
+            'checkout': ('POST', f'/shoppers/{shopper_id}/checkout', None),
+        }[kind]
+        start = time.perf_counter()
+        status = await _http_request(reader, writer, method, path, body)
+        samples.append((kind, status, time.perf_counter() - start))
+    writer.close()
+    return samples
+
+
+async def _first_add_client(port: int, shopper_id: int, product_id: int, seller_id: int) -> int:
+    """
+    Function adding one product to a shopper's basket over its own connection.
+
+    :param: service port
+    :param: shopper_id
+    :param: product_id
+    :param: seller_id
+    :return: HTTP status code
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    status = await _http_request(reader, writer, 'POST', f'/shoppers/{shopper_id}/basket',
+                                 {'product_id': product_id, 'seller_id': seller_id, 'quantity': 1})
+    writer.close()
+    return status
+
+
+def load_test_service(clients: int, requests: int, workers: int, max_pending: int,
+                      scale: Optional[str] = None, split: bool = False) -> bool:
+    """
+    Function starting service.py against a scratch copy of the database, or a synthetic dataset of the given
+    scale, and sending requests from many concurrent keep-alive clients. Reports throughput, p50 and p99
+    latency per request kind, and how many requests were refused with 503 by admission control.
+
+    Beforehand, shoppers without a basket today each get several different products added at once, and the
+    test fails if any of them ends up with more than one basket.
+
+    :param: number of concurrent clients
+    :param: requests sent by each client
+    :param: service worker threads
+    :param: service admission limit
+    :param: db.synthetic scale, None for the bundled data
+    :param: run the service with read-only readers and a single writer
+    :return: True if every shopper added to concurrently kept a single basket
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        if scale:
+            from db.synthetic import SCALES, create_dataset
+
+            database_path = os.path.join(scratch, 'qho429.db')
+            create_dataset(database_path, SCALES[scale])
+        else:
+            database_path = copy_database(scratch)
+        connection = sqlite3.connect(database_path)
+        shopper_ids = [row[0] for row in connection.execute("""SELECT shopper_id FROM shoppers LIMIT 10000""")]
+        offers = connection.execute("""SELECT product_id, seller_id FROM product_sellers LIMIT 10000""").fetchall()
+        category_ids = [row[0] for row in connection.execute("""SELECT category_id FROM categories""")]
+        first_add_shopper_ids = [row[0] for row in connection.execute(
+            """SELECT shopper_id FROM shoppers
+               WHERE shopper_id NOT IN (SELECT shopper_id FROM shopper_baskets
+                                        WHERE DATE(basket_created_date_time) = DATE('now'))
+               LIMIT 20""")]
+        first_add_offers = list({product_id: (product_id, seller_id) for product_id, seller_id in offers}.values())
+        first_add_offers = first_add_offers[:min(clients, 8)]
+        connection.close()
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen([sys.executable, os.path.join(helpers.get_root_dir(), 'service.py'),
+                                   '--port', str(port), '--workers', str(workers), '--max-pending', str(max_pending)]
+                                  + (['--split'] if split else []),
+                                  env=dict(os.environ, QHO429_DB_PATH=database_path), stdout=subprocess.DEVNULL)
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port)).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            async def run_first_adds() -> list[int]:
+                statuses = []
+                for shopper_id in first_add_shopper_ids:
+                    statuses.extend(await asyncio.gather(*(_first_add_client(port, shopper_id, product_id, seller_id)
+                                                           for product_id, seller_id in first_add_offers)))
+                return statuses
+
+            first_add_statuses = collections.Counter(asyncio.run(run_first_adds()))
+            connection = sqlite3.connect(database_path)
+            duplicates = connection.execute(
+                f"""SELECT COUNT(*) FROM (SELECT shopper_id FROM shopper_baskets
+                                          WHERE shopper_id IN ({','.join('?' * len(first_add_shopper_ids))})
+                                          AND DATE(basket_created_date_time) = DATE('now')
+                                          GROUP BY shopper_id
+                                          HAVING COUNT(*) > 1)""", first_add_shopper_ids).fetchone()[0]
+            connection.close()
+
+            async def run_clients() -> list[list[tuple[str, int, float]]]:
+                return await asyncio.gather(*(_load_test_client(port, requests, shopper_ids, offers, category_ids,
+                                                                seed) for seed in range(clients)))
+
+            start = time.perf_counter()
+            results = asyncio.run(run_clients())
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f'Concurrent first adds: {len(first_add_shopper_ids)} shoppers x {len(first_add_offers)} products, '
+          + ', '.join(f'{status}: {count}' for status, count in sorted(first_add_statuses.items()))
+          + f', shoppers with more than one basket: {duplicates}')
+    samples = [sample for result in results for sample in result]
+    print(f'{clients} clients, {workers} workers, {len(samples)} requests in {elapsed:.2f}s: '
+          f'{len(samples) / elapsed:.0f} requests/s')
+    statuses = collections.Counter(status for _, status, _ in samples)
+    print('Statuses: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items())))
+    print(f'{"request":>10} {"count":>7} {"p50 ms":>8} {"p99 ms":>8}')
+    for kind in sorted({kind for kind, _, _ in samples}) + ['all']:
+        latencies = sorted(latency for sample_kind, _, latency in samples if kind in ('all', sample_kind))
+        print(f'{kind:>10} {len(latencies):>7} {latencies[len(latencies) // 2] * 1000:>8.2f} '
+              f'{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:>8.2f}')
+    return not duplicates
+
+
+def benchmark_group_commit(clients: int, operations: int, windows: list[float]) -> None:
+    """
+    Function comparing a SerializedWriter with GroupCommitWriters of several window lengths, with
+    synchronous=NORMAL and synchronous=FULL. Each client thread owns a basket and changes the quantity of
+    its item through the writer, waiting for each result, like a shopper session would.
+
+    :param: number of client threads
+    :param: quantity changes made by each client
+    :param: group commit windows in milliseconds
+    :return: None
+    """
+    import threading
+    from db.basket import add_item_to_basket, update_item_quantity_in_basket_contents
+    from db.writer import GroupCommitWriter, SerializedWriter
+
+    print(f'{"synchronous":>11} {"writer":>16} {"ops/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"commits":>8}')
+    for synchronous in ('NORMAL', 'FULL'):
+        for window in [None] + windows:
+            with tempfile.TemporaryDirectory() as scratch:
+                database_path = copy_database(scratch)
+                writer = SerializedWriter(database_path) if window is None else \
+                    GroupCommitWriter(database_path, window_ms=window, max_batch=clients)
+                writer.call(lambda cursor: cursor.execute(f'PRAGMA synchronous={synchronous}'))
+                connection = sqlite3.connect(database_path)
+                shopper_ids = [row[0] for row in connection.execute("""SELECT shopper_id FROM shoppers""")]
+                product_id, seller_id, price = connection.execute(
+                    """SELECT product_id, seller_id, price FROM product_sellers""").fetchone()
+                connection.close()
+                with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                    baskets = [writer.call(add_item_to_basket, shopper_ids[index % len(shopper_ids)], seller_id,
+                                           product_id, 1, price) for index in range(clients)]
+
+                latencies: list[float] = []
+
+                def client(basket_id: int) -> None:
+                    samples = []
+                    for quantity in range(operations):
+                        start = time.perf_counter()
+                        writer.call(update_item_quantity_in_basket_contents, basket_id, product_id, quantity + 1)
+                        samples.append(time.perf_counter() - start)
+                    latencies.extend(samples)
+
+                threads = [threading.Thread(target=client, args=(basket_id,)) for basket_id in baskets]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+                writer.close()
+
+            latencies.sort()
+            commits = writer.batches if window is not None else len(latencies)
+            name = 'serialized' if window is None else f'group {window:g} ms'
+            print(f'{synchronous:>11} {name:>16} {len(latencies) / elapsed:>8.0f} '
+                  f'{latencies[len(latencies) // 2] * 1000:>8.2f} {latencies[int(len(latencies) * 0.99)] * 1000:>8.2f} '
+                  f'{commits:>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks run against a scratch copy of db/qho429.db')
+    parser.add_argument('benchmark', choices=('login', 'ids', 'options', 'suite', 'service', 'groupcommit', 'search',
+                                              'startup', 'shards'), help='benchmark to run')
+    parser.add_argument('--repeat', type=int, default=1000, help='calls per measurement')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000],
+                        help='table sizes to measure at')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='process counts for the id allocation stress test')
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'],
+                        help='synthetic dataset scales for the suite: small, medium, large')
+    parser.add_argument('--results', default='benchmark-results.json', help='file the suite results are written to')
+    parser.add_argument('--compare', metavar='PATH', help='results file from an earlier suite run to compare with')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent clients for the service load test')
+    parser.add_argument('--workers', type=int, default=4, help='service worker threads for the load test')
+    parser.add_argument('--max-pending', type=int, default=64, help='service admission limit for the load test')
+    parser.add_argument('--scale', help='synthetic dataset scale for the service load test, bundled data if unset')
+    parser.add_argument('--split', action='store_true',
+                        help='load test the service with read-only readers and a single writer')
+    parser.add_argument('--launches', type=int, default=20, help='interpreters started by the startup benchmark')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help='median import time allowed by the startup benchmark')
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 2, 4],
+                        help='shard counts for the shard benchmark, 0 for the unsharded database')
+    parser.add_argument('--windows', type=float, nargs='+', default=[0.5, 2, 5],
+                        help='group commit windows in milliseconds')
+    arguments = parser.parse_args()
+    if arguments.benchmark == 'login':
+        benchmark_login(arguments.sizes, arguments.repeat)
+    if arguments.benchmark == 'options':
+        benchmark_option_numbering(arguments.sizes)
+    if arguments.benchmark == 'ids':
+        raise SystemExit(0 if stress_id_allocation(arguments.processes, arguments.repeat) else 1)
+    if arguments.benchmark == 'suite':
+        benchmark_suite(arguments.scales, arguments.repeat, arguments.results, arguments.compare)
+    if arguments.benchmark == 'service':
+        raise SystemExit(0 if load_test_service(arguments.clients, arguments.repeat, arguments.workers,
+                                                arguments.max_pending, arguments.scale, arguments.split) else 1)
+    if arguments.benchmark == 'groupcommit':
+        benchmark_group_commit(arguments.clients, arguments.repeat, arguments.windows)
+    if arguments.benchmark == 'search':
+        benchmark_search(arguments.sizes, arguments.repeat)
+    if arguments.benchmark == 'shards':
+        raise SystemExit(0 if benchmark_shards(arguments.shards, max(arguments.processes), arguments.repeat) else 1)
+    if arguments.benchmark == 'startup':
+        raise SystemExit(0 if benchmark_startup(arguments.launches, arguments.budget_ms) else 1)
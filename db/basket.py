@@ -1,10 +1,16 @@
 import sqlite3
 from datetime import datetime
 from sqlite3 import Cursor
-from typing import Union, Optional
-from tabulate import tabulate
-import copy
+from typing import TYPE_CHECKING, Callable, Optional, Union
 import helpers
+from db.records import BasketLine
+from render import render_table
+
+if TYPE_CHECKING:
+    from db.writer import SerializedWriter
+
+"""Message add_item_to_basket prints once the item is committed"""
+ITEM_ADDED_MESSAGE: str = f'{helpers.PrintColors.GREEN}Item added to your basket{helpers.PrintColors.END} \n'
 
 
 def get_todays_shopper_basket_id(cursor: Cursor, shopper_id: int) -> Union[int, None]:
@@ -16,23 +22,36 @@ def get_todays_shopper_basket_id(cursor: Cursor, shopper_id: int) -> Union[int,
     :return: Most recent basket id
     """
     try:
-        cursor.execute("""SELECT 
-                                shopper_baskets.basket_id
-                          FROM shopper_baskets
-                          WHERE shopper_baskets.shopper_id = ?
-                          AND DATE(shopper_baskets.basket_created_date_time) = DATE('now')
-                          ORDER BY shopper_baskets.basket_created_date_time DESC
-                          LIMIT 1""", (shopper_id,))
-        shopper_basket = cursor.fetchone()
-
-        if shopper_basket:
-            return shopper_basket[0]
+        return _select_todays_basket_id(cursor, shopper_id)
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation: \'{e}\'')
 
     return None
 
 
+def _select_todays_basket_id(cursor: Cursor, shopper_id: int) -> Union[int, None]:
+    """
+    Function running the query of get_todays_shopper_basket_id, letting database errors through.
+
+    :param: db cursor
+    :param: shopper_id
+    :return: Most recent basket id
+    :raises: sqlite3.Error
+    """
+    cursor.execute("""SELECT 
+                            shopper_baskets.basket_id
+                      FROM shopper_baskets
+                      WHERE shopper_baskets.shopper_id = ?
+                      AND DATE(shopper_baskets.basket_created_date_time) = DATE('now')
+                      ORDER BY shopper_baskets.basket_created_date_time DESC
+                      LIMIT 1""", (shopper_id,))
+    shopper_basket = cursor.fetchone()
+
+    if shopper_basket:
+        return shopper_basket[0]
+    return None
+
+
 def add_item_to_basket(
         cursor: Cursor,
         shopper_id: int,
@@ -41,9 +60,10 @@ def add_item_to_basket(
         quantity: int,
         price: int,
         basket_id: int = False,
-) -> None:
+) -> Optional[int]:
     """
-    Function adding an item to an existing basket or creating a new one.
+    Function adding an item to an existing basket or creating a new one. New basket ids are allocated by
+    the database inside a BEGIN IMMEDIATE transaction, so concurrent sessions never collide.
 
     :param: db cursor
     :param: shopper_id
@@ -52,72 +72,85 @@ def add_item_to_basket(
     :param: quantity
     :param: price
     :param: basket_id
-    :return: None
+    :return: id of the basket the item was added to, None if the operation was rolled back
     """
-    if basket_id:
-        try:
-            cursor.execute("BEGIN TRANSACTION")
-            cursor.execute("""INSERT INTO
-                                    basket_contents (basket_id, product_id, seller_id, quantity, price)
-                                    VALUES(?,?,?, ?,?) """, (basket_id, product_id, seller_id, quantity, price))
-            cursor.execute("COMMIT")
-        except sqlite3.Error as e:
-            helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-            cursor.execute("ROLLBACK")
-    else:
-        try:
-            cursor.execute("""PRAGMA foreign_keys=ON""")
-            cursor.execute("BEGIN TRANSACTION")
-            cursor.execute("""SELECT seq+1 FROM sqlite_sequence WHERE name='shopper_baskets'""")
-            seq_row = cursor.fetchone()
-            new_id = seq_row[0]
-            date = datetime.today().strftime('%Y-%m-%d')
-            cursor.execute("""INSERT INTO
-                                    shopper_baskets (basket_id, shopper_id, basket_created_date_time)
-                                    VALUES(?,?,?) """, (new_id, shopper_id, date))
-            cursor.execute("""INSERT INTO
-                                    basket_contents (basket_id, product_id, seller_id, quantity, price)
-                                    VALUES(?,?,?, ?,?) """, (new_id, product_id, seller_id, quantity, price))
-            cursor.execute("COMMIT")
-        except sqlite3.Error as e:
-            helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+    try:
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        basket_id = insert_basket_item(cursor, shopper_id, seller_id, product_id, quantity, price, basket_id)
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+        if cursor.connection.in_transaction:
             cursor.execute("ROLLBACK")
+        return None
 
-    print(f'{helpers.PrintColors.GREEN}Item added to your basket{helpers.PrintColors.END} \n')
+    print(ITEM_ADDED_MESSAGE)
 
-    return None
+    return basket_id
 
 
-def get_baskets_contents(cursor: Cursor, basket_id: int) -> Union[list[list], None]:
+def insert_basket_item(
+        cursor: Cursor,
+        shopper_id: int,
+        seller_id: int,
+        product_id: int,
+        quantity: int,
+        price: int,
+        basket_id: int = False,
+) -> int:
     """
-    Function returning basket's content
+    Function running the statements of add_item_to_basket inside the caller's transaction. Without a
+    basket_id, today's basket is looked up again inside the transaction before a new one is created, so
+    concurrent first adds by the same shopper, each from a session that saw no basket, share one basket.
+
+    :param: db cursor
+    :param: shopper_id
+    :param: seller_id
+    :param: product_id
+    :param: quantity
+    :param: price
+    :param: basket_id
+    :return: id of the basket the item was added to
+    :raises: sqlite3.Error
+    """
+    if not basket_id:
+        basket_id = _select_todays_basket_id(cursor, shopper_id)
+    if not basket_id:
+        date = datetime.today().strftime('%Y-%m-%d')
+        cursor.execute("""INSERT INTO
+                                shopper_baskets (shopper_id, basket_created_date_time)
+                                VALUES(?,?) """, (shopper_id, date))
+        basket_id = cursor.lastrowid
+    cursor.execute("""INSERT INTO
+                            basket_contents (basket_id, product_id, seller_id, quantity, price)
+                            VALUES(?,?,?, ?,?) """, (basket_id, product_id, seller_id, quantity, price))
+    return basket_id
+
+
+def get_baskets_contents(cursor: Cursor, basket_id: int) -> Union[list[tuple[int, BasketLine]], None]:
+    """
+    Function returning basket's content, numbered from 1 in product_id order
 
     :param: basket_id
     :return: basket contents
     """
     try:
         cursor.execute("""SELECT 
-                                products.product_id,
+                                basket_contents.product_id,
                                 products.product_description,
+                                basket_contents.seller_id,
                                 sellers.seller_name,
                                 basket_contents.quantity,
-                                '£ '||PRINTF("%.2f", basket_contents.price),
-                                '£ '||PRINTF("%.2f", basket_contents.quantity * basket_contents.price)
+                                basket_contents.price
                            FROM basket_contents 
-                           INNER JOIN product_sellers ON product_sellers.seller_id = basket_contents.seller_id
-                           INNER JOIN sellers ON product_sellers.seller_id = sellers.seller_id
+                           INNER JOIN sellers ON sellers.seller_id = basket_contents.seller_id
                            INNER JOIN products ON products.product_id = basket_contents.product_id
                            WHERE basket_contents.basket_id = ?
-                           GROUP BY products.product_id""", (basket_id,))
-        basket_contents = cursor.fetchall()
+                           ORDER BY basket_contents.product_id""", (basket_id,))
+        basket_contents = list(enumerate(map(BasketLine._make, cursor), start=1))
 
         if basket_contents:
-            list_of_lists: list[list] = [list(elem) for elem in basket_contents]
-            numbered: list[list[Union[int, list]]] = []
-            for item in list_of_lists:
-                index = list_of_lists.index(item)
-                numbered.append(list([int(index) + 1] + item))
-            return numbered
+            return basket_contents
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation: \'{e}\'')
 
@@ -146,26 +179,34 @@ def get_basket_total(cursor: Cursor, basket_id: int) -> Union[list, None]:
     return None
 
 
-def display_basket_contents(cursor: Cursor, basket_contents: Union[list[list], None], basket_id: int) -> None:
+def display_basket_contents(cursor: Cursor,
+                            basket_contents: Union[list[tuple[int, BasketLine]], None],
+                            basket_id: int,
+                            basket_total: Optional[float] = None
+                            ) -> None:
     """
     Function fetching basket contents and displaying as table
 
     :param: cursor
     :param: basket_contents
     :param: basket_id
+    :param: basket total, queried from the database when not passed in
     :return: None
     """
     if basket_contents and len(basket_contents):
-        edited_for_printing = copy.deepcopy(basket_contents)
-        for item in edited_for_printing:
-            del item[1]
-        total = get_basket_total(cursor, basket_id)
+        if basket_total is None:
+            total = get_basket_total(cursor, basket_id)[0][0]
+        else:
+            total = '£ {:.2f}'.format(basket_total)
         print(f'{helpers.PrintColors.BLUE}Basket Contents{helpers.PrintColors.END}')
         print(f'{helpers.PrintColors.HEADER}{helpers.separator}'
               f'{helpers.PrintColors.END}')
-        edited_for_printing.append(['', '', '', 'Basket Total', '', total[0][0]])
-        print(tabulate(edited_for_printing, headers=(
-            'Basket Item', 'Product Description', 'Seller Name', 'Qty', 'Price', 'Total')))
+        rows = [(number, line.product_description, line.seller_name, line.quantity,
+                 '£ {:.2f}'.format(line.price), '£ {:.2f}'.format(line.total))
+                for number, line in basket_contents]
+        rows.append(('', '', '', 'Basket Total', '', total))
+        render_table(rows, headers=(
+            'Basket Item', 'Product Description', 'Seller Name', 'Qty', 'Price', 'Total'))
         print('\n')
 
     return None
@@ -175,7 +216,7 @@ def update_item_quantity_in_basket_contents(cursor: Cursor,
                                             basket_id: int,
                                             product_id: int,
                                             quantity: int
-                                            ) -> None:
+                                            ) -> bool:
     """
     Function updating basket contents
 
@@ -183,42 +224,75 @@ def update_item_quantity_in_basket_contents(cursor: Cursor,
     :param: basket_id
     :param: product_id
     :param: quantity
-    :return: None
+    :return: True if the change was committed
     """
     try:
-        cursor.execute("""PRAGMA foreign_keys=ON""")
-        cursor.execute("""UPDATE
-                                basket_contents
-                           SET quantity = ?
-                           WHERE basket_id = ? AND product_id = ?""", (quantity, basket_id, product_id))
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        update_basket_item_quantity(cursor, basket_id, product_id, quantity)
         cursor.execute("COMMIT")
+        return True
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
-    return None
+    return False
 
 
-def delete_item_from_basket_contents(cursor: Cursor, basket_id: int, product_id: int) -> None:
+def update_basket_item_quantity(cursor: Cursor, basket_id: int, product_id: int, quantity: int) -> bool:
+    """
+    Function running the statement of update_item_quantity_in_basket_contents inside the caller's transaction.
+
+    :param: cursor
+    :param: basket_id
+    :param: product_id
+    :param: quantity
+    :return: True
+    :raises: sqlite3.Error
+    """
+    cursor.execute("""UPDATE
+                            basket_contents
+                       SET quantity = ?
+                       WHERE basket_id = ? AND product_id = ?""", (quantity, basket_id, product_id))
+    return True
+
+
+def delete_item_from_basket_contents(cursor: Cursor, basket_id: int, product_id: int) -> bool:
     """
     Function deleting item from basket
 
     :param: cursor
     :param: basket_id
     :param: product_id
-    :return: None
+    :return: True if the change was committed
     """
     try:
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.execute("""DELETE  
-                           FROM basket_contents
-                           WHERE basket_id = ? AND product_id = ?""", (basket_id, product_id))
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        delete_basket_item(cursor, basket_id, product_id)
         cursor.execute("COMMIT")
+        return True
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
-    return None
+    return False
+
+
+def delete_basket_item(cursor: Cursor, basket_id: int, product_id: int) -> bool:
+    """
+    Function running the statement of delete_item_from_basket_contents inside the caller's transaction.
+
+    :param: cursor
+    :param: basket_id
+    :param: product_id
+    :return: True
+    :raises: sqlite3.Error
+    """
+    cursor.execute("""DELETE  
+                       FROM basket_contents
+                       WHERE basket_id = ? AND product_id = ?""", (basket_id, product_id))
+    return True
 
 
 def delete_basket_contents(cursor: Cursor, basket_id: int) -> None:
@@ -230,66 +304,70 @@ def delete_basket_contents(cursor: Cursor, basket_id: int) -> None:
     :return: None
     """
     try:
-        cursor.execute("BEGIN TRANSACTION")
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
         cursor.execute("""DELETE  
                            FROM basket_contents
                            WHERE basket_id = ?""", (basket_id,))
         cursor.execute("COMMIT")
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
     return None
 
 
-def check_if_item_exists_in_basket(cursor: Cursor, product_id: int) -> bool:
+def check_if_item_exists_in_basket(cursor: Cursor, product_id: int, basket_id: Optional[int] = None) -> bool:
     """
     Function checking if passed in product_id already exists in the basket
 
-    :param: connection
     :param: cursor
-    :param: basket_id
     :param: product_id
-    :return: None
+    :param: basket_id, when not passed in any basket is checked
+    :return: True if the product is in the basket
     """
     try:
-        cursor.execute("""SELECT 
-                                basket_contents.product_id
-                          FROM basket_contents
-                          WHERE basket_contents.product_id = ?;""", (product_id,))
-        product_ids = cursor.fetchall()
-
-        if len(product_ids):
-            if id in product_ids:
-                return False
-            else:
-                return True
+        if basket_id is None:
+            cursor.execute("""SELECT 
+                                    basket_contents.product_id
+                              FROM basket_contents
+                              WHERE basket_contents.product_id = ?
+                              LIMIT 1""", (product_id,))
         else:
-            return False
+            cursor.execute("""SELECT 
+                                    basket_contents.product_id
+                              FROM basket_contents
+                              WHERE basket_contents.basket_id = ? AND basket_contents.product_id = ?""",
+                           (basket_id, product_id))
+        return cursor.fetchone() is not None
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation: \'{e}\'')
 
+    return False
+
 
-def delete_basket_from_shopper_baskets(cursor: Cursor, basket_id: int, shopper_id: int) -> None:
+def delete_basket_from_shopper_baskets(cursor: Cursor, basket_id: int, shopper_id: int) -> bool:
     """
     Function deleting basket
 
     :param: cursor
     :param: basket_id
     :param: shopper_id
-    :return: None
+    :return: True if the change was committed
     """
     try:
-        cursor.execute("BEGIN TRANSACTION")
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
         cursor.execute("""DELETE  
                            FROM shopper_baskets
                            WHERE basket_id = ? AND shopper_id = ?""", (basket_id, shopper_id))
         cursor.execute("COMMIT")
+        return True
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
-    return None
+    return False
 
 
 def create_shopper_order(cursor: Cursor, shopper_id: int) -> Optional[int]:
@@ -298,23 +376,21 @@ def create_shopper_order(cursor: Cursor, shopper_id: int) -> Optional[int]:
 
     :param: cursor
     :param: shopper_id
-    :return: None
+    :return: new order id
     """
     try:
-        cursor.execute("""PRAGMA foreign_keys=ON""")
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.execute("""SELECT seq+1 FROM sqlite_sequence WHERE name='shopper_orders'""")
-        seq_row = cursor.fetchone()
-        new_id = seq_row[0]
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
         date = datetime.today().strftime('%Y-%m-%d')
         cursor.execute("""INSERT INTO
-                                shopper_orders (order_id, shopper_id, order_date, order_status)
-                                VALUES(?,?,?,?) """, (new_id, shopper_id, date, 'Placed'))
+                                shopper_orders (shopper_id, order_date, order_status)
+                                VALUES(?,?,?) """, (shopper_id, date, 'Placed'))
+        order_id = cursor.lastrowid
         cursor.execute("COMMIT")
-        return cursor.lastrowid
+        return order_id
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
     return None
 
@@ -328,23 +404,251 @@ def create_ordered_products(cursor: Cursor, basket_id: int, shopper_order_id: in
     :return: None
     """
     try:
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        cursor.execute("""INSERT INTO
+                                ordered_products (order_id, product_id, seller_id, quantity, price,
+                                                  ordered_product_status)
+                          SELECT 
+                                ?,
+                                basket_contents.product_id,
+                                basket_contents.seller_id,
+                                basket_contents.quantity,
+                                basket_contents.price,
+                                'Placed'
+                          FROM basket_contents
+                          WHERE basket_contents.basket_id = ?""", (shopper_order_id, basket_id))
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
+
+    return None
+
+
+def checkout(cursor: Cursor, basket_id: int, shopper_id: int) -> Optional[int]:
+    """
+    Function placing an order for the basket's contents and deleting the basket in a single transaction.
+    The basket lines are copied into ordered_products with one INSERT ... SELECT, so either the whole
+    order is placed or nothing changes.
+
+    :param: cursor
+    :param: basket_id
+    :param: shopper_id
+    :return: new order id, None if the checkout was rolled back
+    """
+    try:
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
         cursor.execute("""SELECT 
+                                shopper_baskets.basket_id
+                          FROM shopper_baskets
+                          WHERE shopper_baskets.basket_id = ? AND shopper_baskets.shopper_id = ?""",
+                       (basket_id, shopper_id))
+        if not cursor.fetchone():
+            helpers.error(f'Basket {basket_id} does not belong to shopper {shopper_id}')
+            cursor.execute("ROLLBACK")
+            return None
+
+        date = datetime.today().strftime('%Y-%m-%d')
+        cursor.execute("""INSERT INTO
+                                shopper_orders (shopper_id, order_date, order_status)
+                                VALUES(?,?,?) """, (shopper_id, date, 'Placed'))
+        order_id = cursor.lastrowid
+        cursor.execute("""INSERT INTO
+                                ordered_products (order_id, product_id, seller_id, quantity, price,
+                                                  ordered_product_status)
+                          SELECT 
+                                ?,
                                 basket_contents.product_id,
                                 basket_contents.seller_id,
                                 basket_contents.quantity,
-                                basket_contents.price
+                                basket_contents.price,
+                                'Placed'
                           FROM basket_contents
-                          WHERE basket_contents.basket_id = ?""", (basket_id,))
-        basket_contents = cursor.fetchall()
-        records = []
-        for item in basket_contents:
-            records.append((shopper_order_id, item[0], item[1], item[2], item[3], 'Placed'))
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.execute("BEGIN TRANSACTION")
-        cursor.executemany('INSERT INTO ordered_products VALUES(?, ?, ?, ?, ?, ?);', records)
+                          WHERE basket_contents.basket_id = ?""", (order_id, basket_id))
+        if cursor.rowcount < 1:
+            helpers.error('Your basket is empty')
+            cursor.execute("ROLLBACK")
+            return None
+
+        cursor.execute("""DELETE  
+                           FROM basket_contents
+                           WHERE basket_id = ?""", (basket_id,))
+        cursor.execute("""DELETE  
+                           FROM shopper_baskets
+                           WHERE basket_id = ? AND shopper_id = ?""", (basket_id, shopper_id))
         cursor.execute("COMMIT")
+        return order_id
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
-        cursor.execute("ROLLBACK")
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
 
     return None
+
+
+class BasketSession:
+    """
+    A shopper's basket for today, loaded once and then kept in step with the database by writing every
+    change through to it. The session keeps the basket lines and running total in memory, so displaying
+    the basket or checking whether it holds a product needs no queries.
+
+    Lines are kept as BasketLine records keyed by product_id. When a writer is passed, the cursor is only
+    used for reads, which lets it come from a read-only connection, and every change is queued on the
+    writer instead.
+    """
+
+    def __init__(self, cursor: Cursor, shopper_id: int, writer: Optional['SerializedWriter'] = None) -> None:
+        self.cursor: Cursor = cursor
+        self.shopper_id: int = shopper_id
+        self.writer: Optional['SerializedWriter'] = writer
+        self.basket_id: Optional[int] = None
+        self.lines: dict[int, BasketLine] = {}
+        self.total: float = 0.0
+        self._basket_date: Optional[str] = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Function (re)loading today's basket and its lines from the database.
+
+        :return: None
+        """
+        self._basket_date = datetime.today().strftime('%Y-%m-%d')
+        self.basket_id = get_todays_shopper_basket_id(self.cursor, self.shopper_id)
+        self.lines = {}
+        self.total = 0.0
+        if self.basket_id:
+            for _, line in get_baskets_contents(self.cursor, self.basket_id) or []:
+                self.lines[line.product_id] = line
+                self.total += line.total
+
+        return None
+
+    def _ensure_current(self) -> None:
+        """
+        Function reloading the basket when the day has changed since it was loaded, as baskets are scoped
+        to the day they were created on.
+
+        :return: None
+        """
+        if self._basket_date != datetime.today().strftime('%Y-%m-%d'):
+            self.refresh()
+
+    def _write(self, function: Callable, *arguments) -> object:
+        """
+        Function running a db.basket write function on the writer if there is one, else on the session's cursor
+
+        :param: function taking a cursor followed by the arguments
+        :param: arguments
+        :return: the function's return value
+        """
+        if self.writer is not None:
+            return self.writer.call(function, *arguments)
+        return function(self.cursor, *arguments)
+
+    def contains(self, product_id: int) -> bool:
+        """
+        Function checking if the product is already in the basket
+
+        :param: product_id
+        :return: bool
+        """
+        self._ensure_current()
+        return product_id in self.lines
+
+    def get_contents(self) -> Optional[list[tuple[int, BasketLine]]]:
+        """
+        Function returning the basket lines numbered for display, in the format of get_baskets_contents
+
+        :return: basket contents, None if the basket is empty
+        """
+        self._ensure_current()
+        if not self.lines:
+            return None
+
+        return list(enumerate(sorted(self.lines.values()), start=1))
+
+    def add(self,
+            product_id: int,
+            product_description: str,
+            seller_id: int,
+            seller_name: str,
+            quantity: int,
+            price: float
+            ) -> bool:
+        """
+        Function adding a product to the basket, creating the basket if the shopper has none today
+
+        :param: product_id
+        :param: product_description
+        :param: seller_id
+        :param: seller_name
+        :param: quantity
+        :param: price
+        :return: True if the product was added
+        """
+        self._ensure_current()
+        basket_id = self._write(add_item_to_basket, self.shopper_id, seller_id, product_id, quantity, price,
+                                self.basket_id)
+        if not basket_id:
+            return False
+
+        self.basket_id = basket_id
+        line = BasketLine(product_id, product_description, seller_id, seller_name, quantity, price)
+        self.lines[product_id] = line
+        self.total += line.total
+        return True
+
+    def update_quantity(self, product_id: int, quantity: int) -> bool:
+        """
+        Function changing the quantity of a product in the basket
+
+        :param: product_id
+        :param: quantity
+        :return: True if the quantity was changed
+        """
+        self._ensure_current()
+        line = self.lines.get(product_id)
+        if not line or not self._write(update_item_quantity_in_basket_contents, self.basket_id, product_id, quantity):
+            return False
+
+        self.lines[product_id] = line._replace(quantity=quantity)
+        self.total += (quantity - line.quantity) * line.price
+        return True
+
+    def remove(self, product_id: int) -> bool:
+        """
+        Function removing a product from the basket, deleting the basket once it is empty
+
+        :param: product_id
+        :return: True if the product was removed
+        """
+        self._ensure_current()
+        line = self.lines.get(product_id)
+        if not line or not self._write(delete_item_from_basket_contents, self.basket_id, product_id):
+            return False
+
+        del self.lines[product_id]
+        self.total -= line.total
+        if not self.lines:
+            self._write(delete_basket_from_shopper_baskets, self.basket_id, self.shopper_id)
+            self.basket_id = None
+            self.total = 0.0
+        return True
+
+    def checkout(self) -> Optional[int]:
+        """
+        Function placing an order for the basket and emptying the session
+
+        :return: new order id, None if the checkout was rolled back
+        """
+        if not self.basket_id:
+            return None
+
+        order_id = self._write(checkout, self.basket_id, self.shopper_id)
+        if order_id:
+            self.basket_id = None
+            self.lines = {}
+            self.total = 0.0
+        return order_id
@@ -1,19 +1,374 @@
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from sqlite3 import Connection
+from typing import Iterator, Optional
 
 import helpers
+from db.migrations import SHARD_MIGRATIONS, migrate
 
+"""Environment variable overriding the location of the database file"""
+DATABASE_PATH_VARIABLE: str = 'QHO429_DB_PATH'
 
-def open_database_connection() -> Connection:
+"""Environment variable setting the number of shard files shopper data is split across; unset or 0 for none"""
+SHARD_COUNT_VARIABLE: str = 'QHO429_SHARD_COUNT'
+
+"""Name the main database, holding the catalog and the shoppers, is attached under on shard connections"""
+CATALOG_SCHEMA: str = 'catalog'
+
+"""
+Basket and order ids handed out by shard n start above (n + 1) * SHARD_ID_SPAN, so ids stay unique across the
+shards and never collide with ids copied from the unsharded database
+"""
+SHARD_ID_SPAN: int = 10 ** 12
+
+"""Pragmas applied once to every new connection"""
+CONNECTION_PRAGMAS: tuple[str, ...] = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=268435456',
+)
+
+"""Pragmas applied in addition to CONNECTION_PRAGMAS to read-only connections"""
+READ_ONLY_PRAGMAS: tuple[str, ...] = (
+    'PRAGMA query_only=ON',
+)
+
+"""Number of prepared statements kept per connection"""
+STATEMENT_CACHE_SIZE: int = 256
+
+"""Default upper bound on the number of connections held by a pool"""
+DEFAULT_POOL_SIZE: int = 8
+
+"""Database files already migrated by this process"""
+_migrated_paths: set[str] = set()
+_migration_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection created by this module. Unlike the built-in class it can be weakly referenced, which
+    lets the db modules keep per-connection state without keeping closed connections alive. catalog_schema
+    names the schema holding the catalog tables: 'main', or CATALOG_SCHEMA on shard connections.
+    """
+
+    catalog_schema: str = 'main'
+
+
+"""Class of the connections created by create_connection, replaced by db.profiling when profiling is enabled"""
+connection_factory: type = PooledConnection
+
+
+def get_database_path() -> str:
+    """
+    Function returning the path of the database file, taken from the QHO429_DB_PATH environment variable
+    when set.
+
+    :param: None
+    :return: str
+    """
+    return os.environ.get(DATABASE_PATH_VARIABLE) or '{}/db/qho429.db'.format(helpers.get_root_dir())
+
+
+def get_shard_count() -> int:
+    """
+    Function returning the number of shards shopper data is split across, taken from the QHO429_SHARD_COUNT
+    environment variable.
+
+    :param: None
+    :return: number of shards, 0 when shopper data is kept in the main database
+    """
+    return int(os.environ.get(SHARD_COUNT_VARIABLE) or 0)
+
+
+def get_shard(shopper_id: int, shard_count: Optional[int] = None) -> Optional[int]:
+    """
+    Function returning the shard holding a shopper's baskets and orders.
+
+    :param: shopper_id
+    :param: number of shards, defaults to get_shard_count()
+    :return: shard number, None when shopper data is not sharded
+    """
+    shard_count = get_shard_count() if shard_count is None else shard_count
+    return shopper_id % shard_count if shard_count else None
+
+
+def get_shards() -> list[Optional[int]]:
+    """
+    Function returning every shard, for jobs that have to visit all shopper data.
+
+    :param: None
+    :return: shard numbers, [None] when shopper data is kept in the main database
+    """
+    return list(range(get_shard_count())) or [None]
+
+
+def get_shard_path(shard: int, database_path: Optional[str] = None) -> str:
+    """
+    Function returning the path of a shard file, next to the main database: db/qho429.shard0.db for shard 0.
+
+    :param: shard number
+    :param: main database path, defaults to get_database_path()
+    :return: str
+    """
+    root, extension = os.path.splitext(database_path or get_database_path())
+    return f'{root}.shard{shard}{extension}'
+
+
+def _file_uri(database_path: str, read_only: bool = False) -> str:
+    import pathlib
+
+    uri = pathlib.Path(database_path).resolve().as_uri()
+    return f'{uri}?mode=ro' if read_only else uri
+
+
+def _open_connection(database_path: str, read_only: bool = False, uri: bool = False) -> Connection:
+    """
+    Function opening a connection and applying the connection pragmas to it, without migrating.
+
+    :param: database path
+    :param: open the connection read-only, through a mode=ro URI
+    :param: open the connection through a file: URI, so it can attach databases by URI
+    :return: Connection
+    """
+    uri = uri or read_only
+    connection = sqlite3.connect(_file_uri(database_path, read_only) if uri else database_path,
+                                 cached_statements=STATEMENT_CACHE_SIZE,
+                                 check_same_thread=False,
+                                 factory=connection_factory,
+                                 uri=uri)
+    for pragma in CONNECTION_PRAGMAS + (READ_ONLY_PRAGMAS if read_only else ()):
+        if not (read_only and pragma.startswith('PRAGMA journal_mode')):
+            connection.execute(pragma)
+    return connection
+
+
+def _reserve_shard_ids(connection: Connection, shard: int) -> None:
+    """
+    Function moving the AUTOINCREMENT sequences of a shard's baskets and orders up to the start of the
+    shard's id range, unless they are past it already.
+
+    :param: shard connection
+    :param: shard number
+    :return: None
+    """
+    first_id = (shard + 1) * SHARD_ID_SPAN
+    cursor = connection.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for table in ('shopper_baskets', 'shopper_orders'):
+            cursor.execute("""UPDATE sqlite_sequence
+                              SET seq = MAX(seq, ?)
+                              WHERE sqlite_sequence.name = ?""", (first_id, table))
+            if not cursor.rowcount:
+                cursor.execute("""INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)""", (table, first_id))
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        helpers.error(f'Shard {shard} id range could not be reserved. Rolling back... \'{e}\'')
+        if connection.in_transaction:
+            cursor.execute("ROLLBACK")
+
+
+def create_connection(database_path: Optional[str] = None, read_only: bool = False,
+                      shard: Optional[int] = None) -> Connection:
+    """
+    Function creating a new connection and applying the connection pragmas to it. The first connection
+    to each database file made by this process also applies any pending schema migrations.
+
+    Read-only connections are opened with a mode=ro URI and query_only set, so any write through them fails.
+    They skip the journal_mode pragma, which needs write access; the read-write connection that migrates
+    the file switches it to WAL, and under WAL each read-only connection reads from its own snapshot
+    without blocking, or being blocked by, the writer.
+
+    A shard connection opens the shard file, holding the baskets and orders of the shoppers get_shard()
+    maps to it, and attaches the main database read-only as CATALOG_SCHEMA. SQLite resolves an unqualified
+    table name to the first schema holding it, main first, so the db functions read and write the shard's
+    shopper tables and read the catalog and shoppers from the main database without naming either. Each
+    shard has its own write lock and WAL, and a transaction never write-locks the read-only catalog, so
+    writers to different shards never wait for each other.
+
+    :param: database path, defaults to get_database_path()
+    :param: open the connection read-only
+    :param: shard number, None for the main database
+    :return: Connection
+    """
+    database_path = database_path or get_database_path()
+    if shard is not None:
+        return _create_shard_connection(database_path, read_only, shard)
+
+    if read_only:
+        with _migration_lock:
+            migrated = database_path in _migrated_paths
+        if not migrated:
+            create_connection(database_path).close()
+        return _open_connection(database_path, read_only=True)
+
+    connection = _open_connection(database_path)
+    with _migration_lock:
+        if database_path not in _migrated_paths:
+            migrate(connection)
+            _migrated_paths.add(database_path)
+    return connection
+
+
+def _create_shard_connection(database_path: str, read_only: bool, shard: int) -> Connection:
+    """
+    Function creating a connection to a shard with the main database attached, creating and migrating the
+    shard file on first use.
+
+    :param: main database path
+    :param: open the connection read-only
+    :param: shard number
+    :return: Connection
+    """
+    shard_path = get_shard_path(shard, database_path)
+    with _migration_lock:
+        catalog_migrated = database_path in _migrated_paths
+        shard_migrated = shard_path in _migrated_paths
+    if not catalog_migrated:
+        create_connection(database_path).close()
+
+    if read_only:
+        if not shard_migrated:
+            create_connection(database_path, shard=shard).close()
+        connection = _open_connection(shard_path, read_only=True)
+    else:
+        connection = _open_connection(shard_path, uri=True)
+        with _migration_lock:
+            if shard_path not in _migrated_paths:
+                migrate(connection, SHARD_MIGRATIONS)
+                _reserve_shard_ids(connection, shard)
+                _migrated_paths.add(shard_path)
+    connection.execute(f"""ATTACH DATABASE ? AS {CATALOG_SCHEMA}""", (_file_uri(database_path, read_only=True),))
+    connection.catalog_schema = CATALOG_SCHEMA
+    return connection
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections to one database and its shards, all read-write or all read-only.
+
+    A connection is checked out with the connection() context manager and is used by a single thread until
+    it is returned. Nested checkouts on the same thread get the connection the thread already holds for the
+    same shard. The number of shards is read from the environment when the pool is created.
+    """
+
+    def __init__(self, database_path: Optional[str] = None, max_connections: int = DEFAULT_POOL_SIZE,
+                 read_only: bool = False) -> None:
+        self.database_path: str = database_path or get_database_path()
+        self.max_connections: int = max_connections
+        self.read_only: bool = read_only
+        self.shard_count: int = get_shard_count()
+        self._idle: dict[Optional[int], queue.LifoQueue] = {shard: queue.LifoQueue()
+                                                            for shard in [None, *range(self.shard_count)]}
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None, shopper_id: Optional[int] = None) -> Iterator[Connection]:
+        """
+        Context manager checking a connection out of the pool and returning it on exit. Any transaction
+        left open by the caller is rolled back before the connection is reused.
+
+        When shopper data is sharded and a shopper_id is passed, the connection is to the shard holding that
+        shopper's baskets and orders, see create_connection; otherwise it is to the main database.
+
+        :param: seconds to wait for a free connection, None waits forever
+        :param: shopper_id the connection is used for
+        :return: Connection
+        """
+        shard = get_shard(shopper_id, self.shard_count) if shopper_id is not None else None
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        held = self._local.connections.get(shard)
+        if held is not None:
+            yield held
+            return
+
+        if not self._slots.acquire(timeout=timeout):
+            raise sqlite3.OperationalError(f'No connection available after {timeout} seconds')
+        try:
+            try:
+                connection = self._idle[shard].get_nowait()
+            except queue.Empty:
+                connection = create_connection(self.database_path, self.read_only, shard)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        self._local.connections[shard] = connection
+        try:
+            yield connection
+        finally:
+            del self._local.connections[shard]
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle[shard].put(connection)
+            self._slots.release()
+
+    def close(self) -> None:
+        """
+        Function closing every idle connection held by the pool.
+
+        :return: None
+        """
+        for idle in self._idle.values():
+            while True:
+                try:
+                    connection = idle.get_nowait()
+                except queue.Empty:
+                    break
+                close_database_connection(connection)
+        return None
+
+
+_default_pool: Optional[ConnectionPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Function returning the process-wide connection pool, creating it on first use.
+
+    :return: ConnectionPool
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ConnectionPool()
+        return _default_pool
+
+
+def configure_pool(database_path: Optional[str] = None, max_connections: int = DEFAULT_POOL_SIZE) -> ConnectionPool:
+    """
+    Function replacing the process-wide connection pool, closing the idle connections of the previous one.
+
+    :param: database path
+    :param: maximum number of connections
+    :return: ConnectionPool
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = ConnectionPool(database_path, max_connections)
+        return _default_pool
+
+
+def open_database_connection(database_path: Optional[str] = None) -> Connection:
     """
     Function establishing connection with SQL database.
 
+    :param: database path, defaults to get_database_path()
     :return: Connection
     """
     try:
-        root_dir = helpers.get_root_dir()
-        connection = sqlite3.connect('{}/db/qho429.db'.format(root_dir))
-        return connection
+        return create_connection(database_path)
 
     except Exception as e:
         helpers.error(f'Database connection could not be established: \'{e}\'')
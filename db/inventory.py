@@ -1,12 +1,374 @@
+import re
 import sqlite3
+import sys
+import threading
+import weakref
+from collections import OrderedDict
 from sqlite3 import Cursor
-from typing import Union
+from typing import Callable, Union
 
 import helpers
+from db.records import Category, Product, Seller
 from helpers import compile_options_for_printing, error
 
 
-def get_product_categories(cursor: Cursor) -> Union[list[list[Union[int, list]]], None]:
+class CatalogCache:
+    """
+    Bounded read-through cache of ready-to-render catalog option lists.
+
+    Entries are evicted least recently used first once either the entry count or the estimated memory
+    footprint exceeds its limit. Entries are kept per database file, together with the catalog_version the
+    database had when they were loaded. Triggers bump catalog_version on every change to the catalog tables,
+    whichever connection makes it, so every lookup reads it on the caller's connection and drops the
+    database's entries once it has moved on; basket and order writes leave the cache in place. A value whose
+    database was invalidated while it was being loaded is returned but not cached. Cached lists are shared
+    between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024) -> None:
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes: int = 0
+        self._databases: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._versions: dict[str, int] = {}
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cursor: Cursor, key: tuple, load: Callable[[Cursor], object]) -> object:
+        """
+        Function returning the cached value for key, loading and caching it on a miss. Values of None are
+        never cached.
+
+        :param: db cursor
+        :param: cache key
+        :param: function loading the value with the cursor
+        :return: cached or freshly loaded value
+        """
+        database_generation = self._check_catalog_version(cursor)
+        if database_generation is not None:
+            database, generation = database_generation
+            key = (database,) + key
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+
+        value = load(cursor)
+        with self._lock:
+            self.misses += 1
+            if database_generation is not None and value is not None \
+                    and self._generations.get(database) == generation:
+                self._store(key, value)
+        return value
+
+    def invalidate(self) -> None:
+        """
+        Function dropping every cached entry, of every database.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._versions.clear()
+            for database in self._generations:
+                self._generations[database] += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict[str, int]:
+        """
+        Function returning the cache counters.
+
+        :return: dict of hits, misses, invalidations, entries and estimated bytes
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _get_database(self, connection: sqlite3.Connection, schema: str) -> str:
+        """
+        Function returning the file the catalog schema of a connection is stored in, remembered per
+        connection. In-memory databases are private to their connection unless shared, so each connection
+        gets its own name for them.
+
+        :param: connection
+        :param: catalog schema name
+        :return: database file
+        """
+        with self._lock:
+            database = self._databases.get(connection)
+        if database is None:
+            files = {name: file for _, name, file in connection.execute("""PRAGMA database_list""")}
+            database = files[schema] or f':memory:{id(connection)}'
+            with self._lock:
+                self._databases[connection] = database
+        return database
+
+    def _check_catalog_version(self, cursor: Cursor) -> Union[tuple[str, int], None]:
+        """
+        Function dropping the entries of the caller's database if its catalog_version has changed since they
+        were loaded.
+
+        :param: db cursor
+        :return: database file and its current generation, None if the connection cannot be tracked, or reads
+                 an older catalog than the cached one, and the cache must be bypassed
+        """
+        connection = cursor.connection
+        try:
+            schema = getattr(connection, 'catalog_schema', 'main')
+            database = self._get_database(connection, schema)
+            version = connection.execute(f"""SELECT version FROM {schema}.catalog_version""").fetchone()[0]
+        except (TypeError, KeyError, sqlite3.Error):
+            return None
+
+        with self._lock:
+            previous = self._versions.get(database)
+            if previous is not None and version < previous:
+                # A read transaction begun before the catalog changed
+                return None
+            if version != previous:
+                self._versions[database] = version
+                self._generations[database] = self._generations.get(database, 0) + 1
+                if previous is not None:
+                    for key in [key for key in self._entries if key[0] == database]:
+                        self._bytes -= self._entries.pop(key)[1]
+                    self.invalidations += 1
+            return database, self._generations[database]
+
+    def _store(self, key: tuple, value: object) -> None:
+        """
+        Function adding an entry and evicting the least recently used ones until both limits are met.
+        Must be called with the lock held.
+
+        :param: cache key
+        :param: value
+        :return: None
+        """
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return None
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._bytes -= self._entries.popitem(last=False)[1][1]
+        return None
+
+
+def _estimate_size(value: object) -> int:
+    """
+    Function estimating the memory held by a value built from nested lists, tuples and dicts. Objects
+    reachable more than once, like records both listed and indexed by id, are counted once.
+
+    :param: value
+    :return: size in bytes
+    """
+    size = 0
+    pending = [value]
+    seen = set()
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple)):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+    return size
+
+
+"""Largest number of sellers offered for a product, cheapest first"""
+OFFER_LIST_LIMIT: int = 20
+
+"""Largest number of products returned by a search"""
+SEARCH_RESULT_LIMIT: int = 20
+
+"""Pattern splitting search text into the words matched against the product_search index"""
+SEARCH_WORD = re.compile(r'\w+')
+
+"""Shortest search word also matching longer words starting with it; shorter words only match whole words"""
+SEARCH_PREFIX_MIN_LENGTH: int = 3
+
+
+"""Process-wide catalog cache used by the lookup functions below"""
+catalog_cache: CatalogCache = CatalogCache()
+
+
+def get_catalog_cache_stats() -> dict[str, int]:
+    """
+    Function returning the hit and miss counters of the catalog cache.
+
+    :return: dict of counters
+    """
+    return catalog_cache.stats()
+
+
+def get_product_categories(cursor: Cursor) -> Union[list[tuple[int, tuple]], None]:
+    """
+    Function returning a list of product categories, served from the catalog cache.
+
+    :param: db cursor
+    :return: numbered categories
+    """
+    return catalog_cache.get(cursor, ('categories',), _load_product_categories)
+
+
+def get_category_products(cursor: Cursor, category_id: int) -> Union[list[tuple[int, tuple]], None]:
+    """
+    Function returning a list of a category's products, served from the catalog cache.
+
+    :param: db cursor
+    :param: category_id
+    :return: numbered products
+    """
+    return catalog_cache.get(cursor, ('products', category_id),
+                             lambda cache_cursor: _load_category_products(cache_cursor, category_id))
+
+
+def get_product_sellers(cursor: Cursor, product_id: int, limit: int = OFFER_LIST_LIMIT) \
+        -> Union[list[tuple[int, tuple]], None]:
+    """
+    Function returning the cheapest sellers offering a product, numbered cheapest first, served from the
+    product's cached offers.
+
+    :param: db cursor
+    :param: product_id
+    :param: largest number of sellers returned
+    :return: numbered sellers with prices
+    """
+    offers = _get_product_offers(cursor, product_id)
+    if offers is None:
+        return None
+    return offers[0][:limit]
+
+
+def get_product_offer(cursor: Cursor, product_id: int, seller_id: int) -> Union[Seller, None]:
+    """
+    Function returning one seller's offer for a product with a dict lookup in the product's cached offers,
+    whether or not the seller is among the cheapest ones listed by get_product_sellers.
+
+    :param: db cursor
+    :param: product_id
+    :param: seller_id
+    :return: seller with price, None if the seller does not offer the product
+    """
+    offers = _get_product_offers(cursor, product_id)
+    offer = offers[1].get(seller_id) if offers else None
+    if offer is None:
+        helpers.error(f'Seller {seller_id} does not offer product {product_id}')
+    return offer
+
+
+def _get_product_offers(cursor: Cursor, product_id: int) \
+        -> Union[tuple[list[tuple[int, Seller]], dict[int, Seller]], None]:
+    return catalog_cache.get(cursor, ('offers', product_id),
+                             lambda cache_cursor: _load_product_offers(cache_cursor, product_id))
+
+
+def get_product(cursor: Cursor, product_id: int) -> Union[Product, None]:
+    """
+    Function returning a single product, served from the catalog cache.
+
+    :param: db cursor
+    :param: product_id
+    :return: product, None if it does not exist
+    """
+    return catalog_cache.get(cursor, ('product', product_id),
+                             lambda cache_cursor: _load_product(cache_cursor, product_id))
+
+
+def search_products(cursor: Cursor, text: str, limit: int = SEARCH_RESULT_LIMIT) \
+        -> Union[list[tuple[int, tuple]], None]:
+    """
+    Function returning the products whose description, manufacturer or model match every word of the
+    search text, best match first. Words of at least SEARCH_PREFIX_MIN_LENGTH characters also match longer
+    words starting with them, so partial entries like 'sams gal' find 'Samsung Galaxy'; shorter words only
+    match whole words, as one or two letters would start most of the catalog. Punctuation is ignored rather
+    than read as FTS5 query syntax.
+
+    Matches come from the product_search full-text index, whose prefix index covers the shortest prefixes
+    searched. Every match is ranked by bm25 inside the index and only the best limit are joined to products.
+    Results are not cached as searches rarely repeat.
+
+    :param: db cursor
+    :param: search text
+    :param: largest number of products returned
+    :return: numbered products in rank order
+    """
+    words = SEARCH_WORD.findall(text)
+    if not words:
+        helpers.error('Enter at least one word to search for')
+        return None
+
+    try:
+        cursor.execute("""SELECT
+                                products.product_id,
+                                products.product_description
+                          FROM (SELECT
+                                      product_search.rowid AS product_id,
+                                      product_search.rank AS score
+                                FROM product_search
+                                WHERE product_search MATCH ?
+                                ORDER BY product_search.rank
+                                LIMIT ?) AS matches
+                          INNER JOIN products ON products.product_id = matches.product_id
+                          ORDER BY matches.score""", (_search_query(words), limit))
+        products: list[Product] = list(map(Product._make, cursor))
+
+        if len(products):
+            return list(enumerate(products, start=1))
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation:\'{e}\'')
+
+    helpers.error(f'No products match \'{text.strip()}\'')
+    return None
+
+
+def _search_query(words: list[str]) -> str:
+    """
+    Function building the FTS5 query matching every search word, quoted so it is never read as query syntax.
+
+    :param: search words
+    :return: FTS5 query
+    """
+    return ' '.join(f'"{word}"*' if len(word) >= SEARCH_PREFIX_MIN_LENGTH else f'"{word}"' for word in words)
+
+
+def _load_product(cursor: Cursor, product_id: int) -> Union[Product, None]:
+    """
+    Function returning a single product.
+
+    :param: db cursor
+    :param: product_id
+    :return: product
+    """
+    try:
+        cursor.execute("""SELECT 
+                                products.product_id,
+                                products.product_description
+                          FROM products
+                          WHERE products.product_id = ?""", (product_id,))
+        product = cursor.fetchone()
+
+        if product:
+            return Product._make(product)
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation:\'{e}\'')
+
+    helpers.error(f'Product {product_id} not found')
+    return None
+
+
+def _load_product_categories(cursor: Cursor) -> Union[list[tuple[int, tuple]], None]:
     """
     Function returning a list of product categories.
 
@@ -19,11 +381,10 @@ def get_product_categories(cursor: Cursor) -> Union[list[list[Union[int, list]]]
                                 categories.category_id,
                                 categories.category_description
                           FROM categories""")
-        categories: list[tuple] = cursor.fetchall()
+        categories: list[Category] = list(map(Category._make, cursor))
 
         if len(categories):
-            list_of_lists = [list(elem) for elem in categories]
-            return compile_options_for_printing(list_of_lists)
+            return compile_options_for_printing(categories)
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation:\'{e}\'')
 
@@ -31,7 +392,7 @@ def get_product_categories(cursor: Cursor) -> Union[list[list[Union[int, list]]]
     return None
 
 
-def get_category_products(cursor: Cursor, category_id: int) -> Union[list[list[Union[int, list]]], None]:
+def _load_category_products(cursor: Cursor, category_id: int) -> Union[list[tuple[int, tuple]], None]:
     """
     Function returning a list of product categories.
 
@@ -46,11 +407,10 @@ def get_category_products(cursor: Cursor, category_id: int) -> Union[list[list[U
                           FROM products
                           WHERE products.category_id = ?
                           """, (category_id,))
-        products: list[tuple] = cursor.fetchall()
+        products: list[Product] = list(map(Product._make, cursor))
 
         if len(products):
-            list_of_lists = [list(elem) for elem in products]
-            return compile_options_for_printing(list_of_lists)
+            return compile_options_for_printing(products)
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation:\'{e}\'')
 
@@ -58,28 +418,30 @@ def get_category_products(cursor: Cursor, category_id: int) -> Union[list[list[U
     return None
 
 
-def get_product_sellers(cursor: Cursor, product_id: int) -> Union[list[list[Union[int, list]]], None]:
+def _load_product_offers(cursor: Cursor, product_id: int) \
+        -> Union[tuple[list[tuple[int, Seller]], dict[int, Seller]], None]:
     """
-    Function returning a list of product categories.
+    Function returning every offer for a product, read in price order from the
+    product_sellers_product_price_idx index, both numbered cheapest first and keyed by seller_id.
 
     :param: db cursor
-    :param: shopper_id
-    :return: Most recent basket id
+    :param: product_id
+    :return: (numbered sellers with prices, sellers by seller_id)
     """
     try:
         cursor.execute("""SELECT 
                                 sellers.seller_id,
                                 sellers.seller_name,
                                 product_sellers.price
-                          FROM sellers
-                          INNER JOIN product_sellers ON sellers.seller_id = product_sellers.seller_id
+                          FROM product_sellers
+                          INNER JOIN sellers ON sellers.seller_id = product_sellers.seller_id
                           WHERE product_sellers.product_id = ?
+                          ORDER BY product_sellers.price, product_sellers.seller_id
                           """, (product_id,))
-        sellers: list[tuple] = cursor.fetchall()
+        sellers: list[Seller] = list(map(Seller._make, cursor))
 
         if len(sellers):
-            list_of_lists = [list(elem) for elem in sellers]
-            return compile_options_for_printing(list_of_lists)
+            return list(enumerate(sellers, start=1)), {seller.seller_id: seller for seller in sellers}
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation:\'{e}\'')
 
@@ -87,7 +449,7 @@ def get_product_sellers(cursor: Cursor, product_id: int) -> Union[list[list[Unio
     return None
 
 
-def get_sellers_product_price(sellers: list[list[Union[int, list]]], seller_id: int) -> Union[int, None]:
+def get_sellers_product_price(sellers: list[tuple[int, tuple]], seller_id: int) -> Union[int, None]:
     """
     Function returning seller's product price
 
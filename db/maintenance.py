@@ -0,0 +1,232 @@
+import argparse
+import sqlite3
+import threading
+from datetime import date, timedelta
+from sqlite3 import Cursor
+from typing import NamedTuple, Optional
+
+import helpers
+from db.connect import close_database_connection, create_connection, get_shards
+
+"""
+Days a basket is kept after the day it was created on. Baskets are only used on the day they are created, so
+anything older is abandoned; the extra day spares the basket of a session that is open across midnight.
+"""
+BASKET_RETENTION_DAYS: int = 1
+
+"""Age in days after which completed orders are moved to the archive tables"""
+ORDER_ARCHIVE_AGE_DAYS: int = 365
+
+"""Baskets or orders handled per transaction; small batches keep the write lock short for shopper sessions"""
+MAINTENANCE_BATCH_SIZE: int = 500
+
+"""Seconds between two runs of the background maintenance job"""
+MAINTENANCE_INTERVAL_SECONDS: float = 300.0
+
+
+class MaintenanceReport(NamedTuple):
+    baskets_expired: int
+    orders_archived: int
+
+
+def _create_batch_table(cursor: Cursor) -> None:
+    """
+    Function creating the temporary table holding the ids of the batch being expired or archived. The batch
+    is selected into it once, so every statement of the batch's transaction works on the same rows even when
+    many of them share a date.
+
+    :param: db cursor
+    :return: None
+    """
+    cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS maintenance_batch
+                            (id INTEGER PRIMARY KEY)""")
+
+
+def expire_baskets(cursor: Cursor, retention_days: int = BASKET_RETENTION_DAYS,
+                   batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    """
+    Function deleting baskets created more than retention_days before today, with their contents, in
+    transactions of batch_size baskets.
+
+    :param: db cursor
+    :param: days a basket is kept after the day it was created on
+    :param: baskets deleted per transaction
+    :return: number of baskets deleted
+    """
+    cutoff = (date.today() - timedelta(days=retention_days)).strftime('%Y-%m-%d')
+    _create_batch_table(cursor)
+    expired = 0
+    while True:
+        try:
+            cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+            cursor.execute("""DELETE FROM temp.maintenance_batch""")
+            cursor.execute("""INSERT INTO
+                                    temp.maintenance_batch (id)
+                              SELECT
+                                    shopper_baskets.basket_id
+                              FROM shopper_baskets
+                              WHERE shopper_baskets.basket_created_date_time < ?
+                              ORDER BY shopper_baskets.basket_created_date_time, shopper_baskets.basket_id
+                              LIMIT ?""", (cutoff, batch_size))
+            cursor.execute("""DELETE FROM basket_contents
+                              WHERE basket_contents.basket_id IN (SELECT id FROM temp.maintenance_batch)""")
+            cursor.execute("""DELETE FROM shopper_baskets
+                              WHERE shopper_baskets.basket_id IN (SELECT id FROM temp.maintenance_batch)""")
+            deleted = cursor.rowcount
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+            if cursor.connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            return expired
+
+        expired += deleted
+        if deleted < batch_size:
+            return expired
+
+
+def archive_orders(cursor: Cursor, age_days: int = ORDER_ARCHIVE_AGE_DAYS,
+                   batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    """
+    Function moving completed orders placed more than age_days ago, with their ordered products, from
+    shopper_orders and ordered_products to shopper_orders_archive and ordered_products_archive, in
+    transactions of batch_size orders.
+
+    Archived orders keep their ids, which AUTOINCREMENT never hands out again, and still show in the order
+    history and in the sales summaries; only the hot tables, and so the B-trees every checkout and history
+    page touches, stay small.
+
+    :param: db cursor
+    :param: age in days of the orders to archive
+    :param: orders archived per transaction
+    :return: number of orders archived
+    """
+    cutoff = (date.today() - timedelta(days=age_days)).strftime('%Y-%m-%d')
+    _create_batch_table(cursor)
+    archived = 0
+    while True:
+        try:
+            cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+            cursor.execute("""DELETE FROM temp.maintenance_batch""")
+            cursor.execute("""INSERT INTO
+                                    temp.maintenance_batch (id)
+                              SELECT
+                                    shopper_orders.order_id
+                              FROM shopper_orders
+                              WHERE shopper_orders.order_status = 'Complete'
+                              AND shopper_orders.order_date < ?
+                              ORDER BY shopper_orders.order_date, shopper_orders.order_id
+                              LIMIT ?""", (cutoff, batch_size))
+            cursor.execute("""INSERT INTO
+                                    shopper_orders_archive (order_id, shopper_id, order_date, order_status)
+                              SELECT
+                                    shopper_orders.order_id,
+                                    shopper_orders.shopper_id,
+                                    shopper_orders.order_date,
+                                    shopper_orders.order_status
+                              FROM shopper_orders
+                              WHERE shopper_orders.order_id IN (SELECT id FROM temp.maintenance_batch)""")
+            moved = cursor.rowcount
+            cursor.execute("""INSERT INTO
+                                    ordered_products_archive (order_id, product_id, seller_id, quantity, price,
+                                                              ordered_product_status)
+                              SELECT
+                                    ordered_products.order_id,
+                                    ordered_products.product_id,
+                                    ordered_products.seller_id,
+                                    ordered_products.quantity,
+                                    ordered_products.price,
+                                    ordered_products.ordered_product_status
+                              FROM ordered_products
+                              WHERE ordered_products.order_id IN (SELECT id FROM temp.maintenance_batch)""")
+            cursor.execute("""DELETE FROM ordered_products
+                              WHERE ordered_products.order_id IN (SELECT id FROM temp.maintenance_batch)""")
+            cursor.execute("""DELETE FROM shopper_orders
+                              WHERE shopper_orders.order_id IN (SELECT id FROM temp.maintenance_batch)""")
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+            if cursor.connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            return archived
+
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+def run_maintenance(cursor: Cursor, retention_days: int = BASKET_RETENTION_DAYS,
+                    age_days: int = ORDER_ARCHIVE_AGE_DAYS,
+                    batch_size: int = MAINTENANCE_BATCH_SIZE) -> MaintenanceReport:
+    """
+    Function expiring abandoned baskets and archiving old orders.
+
+    :param: db cursor
+    :param: days a basket is kept after the day it was created on
+    :param: age in days of the orders to archive
+    :param: baskets or orders handled per transaction
+    :return: numbers of baskets expired and orders archived
+    """
+    return MaintenanceReport(expire_baskets(cursor, retention_days, batch_size),
+                             archive_orders(cursor, age_days, batch_size))
+
+
+class MaintenanceJob:
+    """
+    Background thread calling run_maintenance every interval seconds on its own connection, one per shard
+    when shopper data is sharded, until closed. Each batch is its own short transaction, so the job can run
+    next to shopper sessions and the service.
+    """
+
+    def __init__(self, database_path: Optional[str] = None, interval: float = MAINTENANCE_INTERVAL_SECONDS,
+                 retention_days: int = BASKET_RETENTION_DAYS, age_days: int = ORDER_ARCHIVE_AGE_DAYS) -> None:
+        self.database_path: Optional[str] = database_path
+        self.interval: float = interval
+        self.retention_days: int = retention_days
+        self.age_days: int = age_days
+        self.totals: MaintenanceReport = MaintenanceReport(0, 0)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        connections = [create_connection(self.database_path, shard=shard) for shard in get_shards()]
+        while True:
+            for connection in connections:
+                report = run_maintenance(connection.cursor(), self.retention_days, self.age_days)
+                self.totals = MaintenanceReport(*map(sum, zip(self.totals, report)))
+            if self._stop.wait(self.interval):
+                break
+        for connection in connections:
+            close_database_connection(connection)
+
+    def close(self) -> None:
+        """
+        Function stopping the job once its current run has finished and closing its connection.
+
+        :return: None
+        """
+        self._stop.set()
+        self._thread.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Expire abandoned baskets and archive old orders')
+    parser.add_argument('--database', help='database path, defaults to db/qho429.db')
+    parser.add_argument('--retention-days', type=int, default=BASKET_RETENTION_DAYS,
+                        help='days a basket is kept after the day it was created on')
+    parser.add_argument('--archive-age-days', type=int, default=ORDER_ARCHIVE_AGE_DAYS,
+                        help='age in days of the completed orders to archive')
+    parser.add_argument('--batch-size', type=int, default=MAINTENANCE_BATCH_SIZE,
+                        help='baskets or orders handled per transaction')
+    arguments = parser.parse_args()
+
+    totals = MaintenanceReport(0, 0)
+    for maintenance_shard in get_shards():
+        maintenance_connection = create_connection(arguments.database, shard=maintenance_shard)
+        report = run_maintenance(maintenance_connection.cursor(), arguments.retention_days,
+                                 arguments.archive_age_days, arguments.batch_size)
+        totals = MaintenanceReport(*map(sum, zip(totals, report)))
+        close_database_connection(maintenance_connection)
+    print(f'{helpers.PrintColors.GREEN}{totals.baskets_expired} baskets expired, '
+          f'{totals.orders_archived} orders archived{helpers.PrintColors.END}')
@@ -0,0 +1,460 @@
+import sqlite3
+from datetime import datetime
+from sqlite3 import Connection, Cursor
+
+import helpers
+
+"""Statements of migration 2, also applied to every shard by SHARD_MIGRATIONS"""
+SUMMARY_STATEMENTS: tuple[str, ...] = (
+    """CREATE TABLE seller_sales_summary
+                (seller_id INTEGER PRIMARY KEY,
+                 quantity_sold INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE product_quantity_summary
+                (product_id INTEGER PRIMARY KEY,
+                 line_count INTEGER NOT NULL DEFAULT 0,
+                 uncancelled_line_count INTEGER NOT NULL DEFAULT 0,
+                 uncancelled_quantity INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TRIGGER ordered_products_summary_insert AFTER INSERT ON ordered_products
+           BEGIN
+                INSERT INTO seller_sales_summary (seller_id, quantity_sold)
+                       VALUES (NEW.seller_id, NEW.quantity)
+                       ON CONFLICT (seller_id) DO UPDATE SET quantity_sold = quantity_sold + excluded.quantity_sold;
+                INSERT INTO product_quantity_summary (product_id, line_count, uncancelled_line_count,
+                                                      uncancelled_quantity)
+                       SELECT NEW.product_id, 1, uncancelled, uncancelled * NEW.quantity
+                       FROM (SELECT NOT EXISTS (SELECT 1 FROM shopper_orders
+                                                WHERE shopper_orders.order_id = NEW.order_id
+                                                AND shopper_orders.order_status = 'Cancelled') AS uncancelled)
+                       WHERE true
+                       ON CONFLICT (product_id) DO UPDATE
+                       SET line_count = line_count + 1,
+                           uncancelled_line_count = uncancelled_line_count + excluded.uncancelled_line_count,
+                           uncancelled_quantity = uncancelled_quantity + excluded.uncancelled_quantity;
+           END""",
+    """CREATE TRIGGER ordered_products_summary_delete AFTER DELETE ON ordered_products
+           BEGIN
+                UPDATE seller_sales_summary
+                   SET quantity_sold = quantity_sold - OLD.quantity
+                 WHERE seller_id = OLD.seller_id;
+                UPDATE product_quantity_summary
+                   SET line_count = line_count - 1,
+                       uncancelled_line_count = uncancelled_line_count - uncancelled.flag,
+                       uncancelled_quantity = uncancelled_quantity - uncancelled.flag * OLD.quantity
+                  FROM (SELECT NOT EXISTS (SELECT 1 FROM shopper_orders
+                                           WHERE shopper_orders.order_id = OLD.order_id
+                                           AND shopper_orders.order_status = 'Cancelled') AS flag) AS uncancelled
+                 WHERE product_id = OLD.product_id;
+           END""",
+    """CREATE TRIGGER ordered_products_summary_update
+           AFTER UPDATE OF order_id, product_id, seller_id, quantity ON ordered_products
+           BEGIN
+                UPDATE seller_sales_summary
+                   SET quantity_sold = quantity_sold - OLD.quantity
+                 WHERE seller_id = OLD.seller_id;
+                UPDATE product_quantity_summary
+                   SET line_count = line_count - 1,
+                       uncancelled_line_count = uncancelled_line_count - uncancelled.flag,
+                       uncancelled_quantity = uncancelled_quantity - uncancelled.flag * OLD.quantity
+                  FROM (SELECT NOT EXISTS (SELECT 1 FROM shopper_orders
+                                           WHERE shopper_orders.order_id = OLD.order_id
+                                           AND shopper_orders.order_status = 'Cancelled') AS flag) AS uncancelled
+                 WHERE product_id = OLD.product_id;
+                INSERT INTO seller_sales_summary (seller_id, quantity_sold)
+                       VALUES (NEW.seller_id, NEW.quantity)
+                       ON CONFLICT (seller_id) DO UPDATE SET quantity_sold = quantity_sold + excluded.quantity_sold;
+                INSERT INTO product_quantity_summary (product_id, line_count, uncancelled_line_count,
+                                                      uncancelled_quantity)
+                       SELECT NEW.product_id, 1, uncancelled, uncancelled * NEW.quantity
+                       FROM (SELECT NOT EXISTS (SELECT 1 FROM shopper_orders
+                                                WHERE shopper_orders.order_id = NEW.order_id
+                                                AND shopper_orders.order_status = 'Cancelled') AS uncancelled)
+                       WHERE true
+                       ON CONFLICT (product_id) DO UPDATE
+                       SET line_count = line_count + 1,
+                           uncancelled_line_count = uncancelled_line_count + excluded.uncancelled_line_count,
+                           uncancelled_quantity = uncancelled_quantity + excluded.uncancelled_quantity;
+           END""",
+    """CREATE TRIGGER shopper_orders_summary_insert AFTER INSERT ON shopper_orders
+           WHEN NEW.order_status = 'Cancelled'
+           BEGIN
+                UPDATE product_quantity_summary
+                   SET uncancelled_line_count = uncancelled_line_count - lines.line_count,
+                       uncancelled_quantity = uncancelled_quantity - lines.quantity
+                  FROM (SELECT product_id, COUNT(*) AS line_count, SUM(quantity) AS quantity
+                        FROM ordered_products
+                        WHERE order_id = NEW.order_id
+                        GROUP BY product_id) AS lines
+                 WHERE product_quantity_summary.product_id = lines.product_id;
+           END""",
+    """CREATE TRIGGER shopper_orders_summary_delete AFTER DELETE ON shopper_orders
+           WHEN OLD.order_status = 'Cancelled'
+           BEGIN
+                UPDATE product_quantity_summary
+                   SET uncancelled_line_count = uncancelled_line_count + lines.line_count,
+                       uncancelled_quantity = uncancelled_quantity + lines.quantity
+                  FROM (SELECT product_id, COUNT(*) AS line_count, SUM(quantity) AS quantity
+                        FROM ordered_products
+                        WHERE order_id = OLD.order_id
+                        GROUP BY product_id) AS lines
+                 WHERE product_quantity_summary.product_id = lines.product_id;
+           END""",
+    """CREATE TRIGGER shopper_orders_summary_update AFTER UPDATE OF order_id, order_status ON shopper_orders
+           WHEN OLD.order_status = 'Cancelled' OR NEW.order_status = 'Cancelled'
+           BEGIN
+                UPDATE product_quantity_summary
+                   SET uncancelled_line_count = uncancelled_line_count + lines.line_count,
+                       uncancelled_quantity = uncancelled_quantity + lines.quantity
+                  FROM (SELECT product_id, COUNT(*) AS line_count, SUM(quantity) AS quantity
+                        FROM ordered_products
+                        WHERE order_id = OLD.order_id AND OLD.order_status = 'Cancelled'
+                        GROUP BY product_id) AS lines
+                 WHERE product_quantity_summary.product_id = lines.product_id;
+                UPDATE product_quantity_summary
+                   SET uncancelled_line_count = uncancelled_line_count - lines.line_count,
+                       uncancelled_quantity = uncancelled_quantity - lines.quantity
+                  FROM (SELECT product_id, COUNT(*) AS line_count, SUM(quantity) AS quantity
+                        FROM ordered_products
+                        WHERE order_id = NEW.order_id AND NEW.order_status = 'Cancelled'
+                        GROUP BY product_id) AS lines
+                 WHERE product_quantity_summary.product_id = lines.product_id;
+           END""",
+    """INSERT INTO seller_sales_summary (seller_id, quantity_sold)
+                SELECT seller_id, SUM(quantity)
+                FROM ordered_products
+                GROUP BY seller_id""",
+    """INSERT INTO product_quantity_summary (product_id, line_count, uncancelled_line_count, uncancelled_quantity)
+                SELECT
+                      ordered_products.product_id,
+                      COUNT(*),
+                      SUM(shopper_orders.order_status IS NOT 'Cancelled'),
+                      SUM((shopper_orders.order_status IS NOT 'Cancelled') * ordered_products.quantity)
+                FROM ordered_products
+                LEFT OUTER JOIN shopper_orders ON shopper_orders.order_id = ordered_products.order_id
+                GROUP BY ordered_products.product_id""",
+)
+
+"""
+Statements refilling the summary tables of migration 2 from every order line, archived ones included, for rows
+loaded while the summary triggers were not in place. Need the all_* views of migration 5.
+"""
+SUMMARY_REBUILD_STATEMENTS: tuple[str, ...] = (
+    """DELETE FROM main.seller_sales_summary""",
+    """INSERT INTO main.seller_sales_summary (seller_id, quantity_sold)
+            SELECT seller_id, SUM(quantity)
+            FROM main.all_ordered_products
+            GROUP BY seller_id""",
+    """DELETE FROM main.product_quantity_summary""",
+    """INSERT INTO main.product_quantity_summary (product_id, line_count, uncancelled_line_count,
+                                                  uncancelled_quantity)
+            SELECT
+                  all_ordered_products.product_id,
+                  COUNT(*),
+                  SUM(all_shopper_orders.order_status IS NOT 'Cancelled'),
+                  SUM((all_shopper_orders.order_status IS NOT 'Cancelled') * all_ordered_products.quantity)
+            FROM main.all_ordered_products
+            LEFT OUTER JOIN main.all_shopper_orders
+                         ON all_shopper_orders.order_id = all_ordered_products.order_id
+            GROUP BY all_ordered_products.product_id""",
+)
+
+"""Archive statements of migration 5, also applied to every shard by SHARD_MIGRATIONS"""
+ARCHIVE_STATEMENTS: tuple[str, ...] = (
+    """CREATE TABLE shopper_orders_archive
+                (order_id INTEGER PRIMARY KEY,
+                 shopper_id INTEGER NOT NULL,
+                 order_date TEXT NOT NULL,
+                 order_status TEXT NOT NULL)""",
+    """CREATE INDEX shopper_orders_archive_shopper_id_idx
+                ON shopper_orders_archive (shopper_id, order_date)""",
+    """CREATE TABLE ordered_products_archive
+                (order_id INTEGER,
+                 product_id INTEGER,
+                 seller_id INTEGER NOT NULL,
+                 quantity INTEGER NOT NULL,
+                 price REAL NOT NULL,
+                 ordered_product_status TEXT,
+                 PRIMARY KEY (order_id, product_id),
+                 CONSTRAINT ordered_products_archive_shopper_orders_archive_fk
+                     FOREIGN KEY (order_id) REFERENCES shopper_orders_archive(order_id))""",
+    """CREATE VIEW all_shopper_orders AS
+                SELECT order_id, shopper_id, order_date, order_status FROM shopper_orders
+                UNION ALL
+                SELECT order_id, shopper_id, order_date, order_status FROM shopper_orders_archive""",
+    """CREATE VIEW all_ordered_products AS
+                SELECT order_id, product_id, seller_id, quantity, price, ordered_product_status
+                FROM ordered_products
+                UNION ALL
+                SELECT order_id, product_id, seller_id, quantity, price, ordered_product_status
+                FROM ordered_products_archive""",
+    """CREATE INDEX shopper_baskets_created_idx
+                ON shopper_baskets (basket_created_date_time)""",
+    """CREATE INDEX shopper_orders_status_date_idx
+                ON shopper_orders (order_status, order_date)""",
+    # Lines moved to the archive still count as sold
+    """DROP TRIGGER ordered_products_summary_delete""",
+    """CREATE TRIGGER ordered_products_summary_delete AFTER DELETE ON ordered_products
+           WHEN NOT EXISTS (SELECT 1 FROM ordered_products_archive
+                            WHERE ordered_products_archive.order_id = OLD.order_id
+                            AND ordered_products_archive.product_id = OLD.product_id)
+           BEGIN
+                UPDATE seller_sales_summary
+                   SET quantity_sold = quantity_sold - OLD.quantity
+                 WHERE seller_id = OLD.seller_id;
+                UPDATE product_quantity_summary
+                   SET line_count = line_count - 1,
+                       uncancelled_line_count = uncancelled_line_count - uncancelled.flag,
+                       uncancelled_quantity = uncancelled_quantity - uncancelled.flag * OLD.quantity
+                  FROM (SELECT NOT EXISTS (SELECT 1 FROM shopper_orders
+                                           WHERE shopper_orders.order_id = OLD.order_id
+                                           AND shopper_orders.order_status = 'Cancelled') AS flag) AS uncancelled
+                 WHERE product_id = OLD.product_id;
+           END""",
+)
+
+"""Catalog tables whose rows the db.inventory catalog cache holds"""
+CATALOG_TABLES: tuple[str, ...] = ('categories', 'products', 'sellers', 'product_sellers')
+
+"""
+Statements of migration 6: a single-row counter bumped by triggers on every change to CATALOG_TABLES, which the
+catalog cache compares to decide whether its entries are still current. Basket and order writes leave it as it is.
+"""
+CATALOG_VERSION_STATEMENTS: tuple[str, ...] = (
+    """CREATE TABLE catalog_version
+                (version INTEGER NOT NULL)""",
+    """INSERT INTO catalog_version (version) VALUES (0)""",
+) + tuple(
+    f"""CREATE TRIGGER {table}_catalog_version_{event.lower()} AFTER {event} ON {table}
+           BEGIN
+                UPDATE catalog_version SET version = version + 1;
+           END"""
+    for table in CATALOG_TABLES for event in ('INSERT', 'UPDATE', 'DELETE')
+)
+
+"""
+Ordered schema migrations as (version, description, statements). Each migration runs in its own transaction
+and is recorded in the schema_version table, so databases created before a migration existed are brought up
+to date the next time a connection is opened. Append new migrations with the next version number; never edit
+a migration that has already been released.
+"""
+MIGRATIONS: list[tuple[int, str, tuple[str, ...]]] = [
+    (1, 'Secondary indexes for the shopper session queries', (
+        """CREATE INDEX IF NOT EXISTS shopper_baskets_shopper_id_idx
+                ON shopper_baskets (shopper_id, basket_created_date_time)""",
+        """CREATE INDEX IF NOT EXISTS products_category_id_idx
+                ON products (category_id)""",
+        """CREATE INDEX IF NOT EXISTS shopper_orders_shopper_id_idx
+                ON shopper_orders (shopper_id, order_date)""",
+        """CREATE INDEX IF NOT EXISTS basket_contents_product_id_idx
+                ON basket_contents (product_id)""",
+        """CREATE INDEX IF NOT EXISTS ordered_products_product_id_idx
+                ON ordered_products (product_id)""",
+        """CREATE INDEX IF NOT EXISTS product_sellers_seller_id_idx
+                ON product_sellers (seller_id)""",
+    )),
+    (2, 'Sales and product quantity summary tables kept up to date by triggers', SUMMARY_STATEMENTS),
+    (3, 'Full-text index over product descriptions, manufacturers and models', (
+        """CREATE VIRTUAL TABLE product_search USING fts5
+                (product_description, product_manufacturer, product_model,
+                 content='products', content_rowid='product_id',
+                 tokenize='unicode61 remove_diacritics 2', prefix='3')""",
+        """CREATE TRIGGER products_search_insert AFTER INSERT ON products
+           BEGIN
+                INSERT INTO product_search (rowid, product_description, product_manufacturer, product_model)
+                       VALUES (NEW.product_id, NEW.product_description, NEW.product_manufacturer, NEW.product_model);
+           END""",
+        """CREATE TRIGGER products_search_delete AFTER DELETE ON products
+           BEGIN
+                INSERT INTO product_search (product_search, rowid, product_description, product_manufacturer,
+                                            product_model)
+                       VALUES ('delete', OLD.product_id, OLD.product_description, OLD.product_manufacturer,
+                               OLD.product_model);
+           END""",
+        """CREATE TRIGGER products_search_update
+           AFTER UPDATE OF product_id, product_description, product_manufacturer, product_model ON products
+           BEGIN
+                INSERT INTO product_search (product_search, rowid, product_description, product_manufacturer,
+                                            product_model)
+                       VALUES ('delete', OLD.product_id, OLD.product_description, OLD.product_manufacturer,
+                               OLD.product_model);
+                INSERT INTO product_search (rowid, product_description, product_manufacturer, product_model)
+                       VALUES (NEW.product_id, NEW.product_description, NEW.product_manufacturer, NEW.product_model);
+           END""",
+        """INSERT INTO product_search (product_search) VALUES ('rebuild')""",
+    )),
+    (4, 'Offers of each product ordered by price', (
+        """CREATE INDEX IF NOT EXISTS product_sellers_product_price_idx
+                ON product_sellers (product_id, price, seller_id)""",
+    )),
+    (5, 'Archive tables for old orders and indexes for the maintenance job', ARCHIVE_STATEMENTS + (
+        # The coursework views read archived orders too
+        """DROP VIEW "1b\"""",
+        """CREATE VIEW "1b" AS SELECT
+                shoppers.shopper_first_name AS 'First Name',
+                shoppers.shopper_surname AS 'Surname',
+                all_shopper_orders.order_id AS 'Order Id',
+                STRFTIME('%d-%m-%Y', all_shopper_orders.order_date) AS 'Order Date',
+                products.product_description AS 'Product Description',
+                sellers.seller_name AS 'Seller Name',
+                all_ordered_products.quantity AS 'Quantity',
+                '£'||PRINTF("%.2f", all_ordered_products.price) AS 'Product Price',
+                all_shopper_orders.order_status AS 'Order Status'
+           FROM shoppers
+           INNER JOIN all_shopper_orders ON shoppers.shopper_id = all_shopper_orders.shopper_id
+           INNER JOIN all_ordered_products ON all_shopper_orders.order_id = all_ordered_products.order_id
+           INNER JOIN products ON all_ordered_products.product_id = products.product_id
+           INNER JOIN sellers ON all_ordered_products.seller_id = sellers.seller_id
+           WHERE shoppers.shopper_id = 10000
+           ORDER BY order_date DESC""",
+        """DROP VIEW "1c\"""",
+        """CREATE VIEW "1c" AS SELECT
+                sellers.seller_account_ref AS 'Seller Account Ref',
+                sellers.seller_name AS 'Seller Name',
+                IFNULL(products.product_code, 0) AS 'Product Code',
+                IFNULL(products.product_description, 0) AS 'Product Description',
+                SUM(IFNULL(all_ordered_products.quantity, 0)) AS 'Total Quantity Sold',
+                '£'||PRINTF("%.2f", SUM((IFNULL(all_ordered_products.quantity, 0) * product_sellers.price)))
+                    AS 'Total Sales Amount'
+           FROM sellers
+           LEFT OUTER JOIN product_sellers ON sellers.seller_id = product_sellers.seller_id
+           LEFT OUTER JOIN all_ordered_products ON product_sellers.seller_id = all_ordered_products.seller_id
+           LEFT OUTER JOIN products ON product_sellers.product_id = products.product_id
+           GROUP BY sellers.seller_id, products.product_id
+           ORDER BY [Total Quantity Sold]""",
+        """DROP VIEW "1d\"""",
+        """CREATE VIEW "1d" AS SELECT
+                category_description AS 'Category Description',
+                product_code AS 'Product Code',
+                product_description AS 'Product Description',
+                PA.[Average Product Quantity]
+           FROM (SELECT
+                       categories.category_id,
+                       category_description,
+                       product_code,
+                       product_description,
+                       IFNULL(AVG(quantity), 0) AS 'Average Product Quantity'
+                 FROM products
+                 INNER JOIN categories ON categories.category_id = products.category_id
+                 LEFT OUTER JOIN all_ordered_products ON products.product_id = all_ordered_products.product_id
+                 LEFT OUTER JOIN all_shopper_orders ON all_shopper_orders.order_id = all_ordered_products.order_id
+                 WHERE order_status <> 'Cancelled' OR order_status IS NULL
+                 GROUP BY products.product_id) AS PA
+           INNER JOIN (SELECT
+                             categories.category_id,
+                             IFNULL(AVG(quantity), 0) AS 'Average Quantity for Category'
+                       FROM products
+                       INNER JOIN categories ON categories.category_id = products.category_id
+                       LEFT OUTER JOIN all_ordered_products ON products.product_id = all_ordered_products.product_id
+                       LEFT OUTER JOIN all_shopper_orders
+                                    ON all_shopper_orders.order_id = all_ordered_products.order_id
+                       WHERE order_status <> 'Cancelled' OR order_status IS NULL
+                       GROUP BY products.product_id) AS CA
+           ON PA.category_id = CA.category_id
+           WHERE PA.[Average Product Quantity] < CA.[Average Quantity for Category]
+           ORDER BY PA.category_description, PA.product_description""",
+    )),
+    (6, 'Catalog version counter bumped by triggers on the catalog tables', CATALOG_VERSION_STATEMENTS),
+]
+
+
+"""
+Schema migrations of the shard files holding shopper data, applied like MIGRATIONS. A shard keeps the shopper
+scoped tables of the main database, without the foreign keys into the shoppers and product_sellers tables:
+those stay in the main database, and SQLite cannot enforce a foreign key across database files.
+"""
+SHARD_MIGRATIONS: list[tuple[int, str, tuple[str, ...]]] = [
+    (1, 'Shopper baskets and orders without foreign keys into the catalog', (
+        """CREATE TABLE shopper_baskets
+                (basket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 shopper_id INTEGER NOT NULL,
+                 basket_created_date_time TEXT NOT NULL)""",
+        """CREATE TABLE basket_contents
+                (basket_id INTEGER,
+                 product_id INTEGER,
+                 seller_id INTEGER NOT NULL,
+                 quantity INTEGER NOT NULL,
+                 price REAL NOT NULL,
+                 PRIMARY KEY (basket_id, product_id),
+                 CONSTRAINT basket_contents_shopper_baskets_fk
+                     FOREIGN KEY (basket_id) REFERENCES shopper_baskets(basket_id))""",
+        """CREATE TABLE shopper_orders
+                (order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 shopper_id INTEGER NOT NULL,
+                 order_date TEXT NOT NULL,
+                 order_status TEXT NOT NULL,
+                 CONSTRAINT shopper_orders_order_status_check
+                     CHECK (order_status in ('Placed','Incomplete','Complete','Cancelled')))""",
+        """CREATE TABLE ordered_products
+                (order_id INTEGER,
+                 product_id INTEGER,
+                 seller_id INTEGER NOT NULL,
+                 quantity INTEGER NOT NULL,
+                 price REAL NOT NULL,
+                 ordered_product_status TEXT,
+                 PRIMARY KEY (order_id, product_id),
+                 CONSTRAINT ordered_products_shopper_orders_fk
+                     FOREIGN KEY (order_id) REFERENCES shopper_orders(order_id),
+                 CONSTRAINT ordered_products_ordered_product_status_check
+                     CHECK (ordered_product_status in ('Placed','Dispatched','Delivered','Cancelled')))""",
+        """CREATE INDEX shopper_baskets_shopper_id_idx
+                ON shopper_baskets (shopper_id, basket_created_date_time)""",
+        """CREATE INDEX shopper_orders_shopper_id_idx
+                ON shopper_orders (shopper_id, order_date)""",
+        """CREATE INDEX basket_contents_product_id_idx
+                ON basket_contents (product_id)""",
+        """CREATE INDEX ordered_products_product_id_idx
+                ON ordered_products (product_id)""",
+    )),
+    (2, 'Sales and product quantity summary tables kept up to date by triggers', SUMMARY_STATEMENTS),
+    (3, 'Archive tables for old orders and indexes for the maintenance job', ARCHIVE_STATEMENTS),
+]
+
+
+def get_schema_version(cursor: Cursor) -> int:
+    """
+    Function returning the most recent migration applied to the database, 0 if none has been applied.
+
+    :param: db cursor
+    :return: schema version
+    """
+    cursor.execute("""CREATE TABLE IF NOT EXISTS schema_version
+                            (version INTEGER PRIMARY KEY,
+                             description TEXT NOT NULL,
+                             applied_date_time TEXT NOT NULL)""")
+    cursor.execute("""SELECT IFNULL(MAX(schema_version.version), 0) FROM schema_version""")
+    return cursor.fetchone()[0]
+
+
+def migrate(connection: Connection,
+            migrations: list[tuple[int, str, tuple[str, ...]]] = MIGRATIONS) -> int:
+    """
+    Function applying every pending migration, one transaction per migration. The version is re-read
+    after the write lock is taken, so concurrent processes opening the same database apply each migration
+    exactly once.
+
+    :param: connection
+    :param: migrations to apply, MIGRATIONS for the main database or SHARD_MIGRATIONS for a shard
+    :return: schema version after migrating
+    """
+    cursor = connection.cursor()
+    version = get_schema_version(cursor)
+    for migration_version, description, statements in migrations:
+        if migration_version <= version:
+            continue
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            if get_schema_version(cursor) < migration_version:
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute("""INSERT INTO
+                                        schema_version (version, description, applied_date_time)
+                                        VALUES(?,?,?)""",
+                               (migration_version, description, datetime.today().strftime('%Y-%m-%d %H:%M:%S')))
+            cursor.execute("COMMIT")
+            version = migration_version
+        except sqlite3.Error as e:
+            helpers.error(f'Schema migration {migration_version} failed. Rolling back... \'{e}\'')
+            if connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            break
+
+    return version
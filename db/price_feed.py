@@ -0,0 +1,206 @@
+import argparse
+import csv
+import json
+import sqlite3
+from sqlite3 import Connection, Cursor
+from typing import Iterator, NamedTuple, Optional
+
+import helpers
+from db.connect import create_connection
+
+"""
+Columns read from a seller price feed. seller_id, product_code and price are required; the product columns are
+only used to create products that are not in the catalog yet.
+"""
+FEED_COLUMNS: tuple[str, ...] = ('seller_id', 'product_code', 'price', 'category_id', 'product_description',
+                                 'product_manufacturer', 'product_model')
+
+"""Feed rows written per transaction; small batches keep the write lock short for shopper sessions"""
+DEFAULT_BATCH_SIZE: int = 500
+
+
+class IngestReport(NamedTuple):
+    inserted: int
+    updated: int
+    rejected: int
+    products_created: int
+
+
+def read_price_feed(path: str) -> Iterator[Optional[dict]]:
+    """
+    Function streaming the rows of a CSV or JSON-lines price feed. Lines that cannot be decoded are
+    yielded as None.
+
+    :param: path of a .csv or .jsonl file
+    :return: generator of rows
+    """
+    with open(path, newline='', encoding='utf-8') as feed:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(feed)
+            return
+
+        for line in feed:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+
+
+def parse_feed_row(row: Optional[dict]) -> Optional[tuple]:
+    """
+    Function validating a feed row and converting it to a tuple of FEED_COLUMNS values.
+
+    :param: feed row
+    :return: tuple of column values, None if the row is invalid
+    """
+    if not row:
+        return None
+    try:
+        seller_id = int(row['seller_id'])
+        product_code = str(row['product_code']).strip()
+        price = round(float(row['price']), 2)
+        category_id = int(row['category_id']) if row.get('category_id') not in (None, '') else None
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not product_code or price < 0:
+        return None
+
+    details = tuple(str(row[column]).strip() if row.get(column) not in (None, '') else None
+                    for column in FEED_COLUMNS[4:])
+    return (seller_id, product_code, price, category_id) + details
+
+
+def ingest_batch(cursor: Cursor, batch: list[tuple]) -> IngestReport:
+    """
+    Function upserting one batch of parsed feed rows, numbered by feed line, in a single transaction.
+
+    The batch is staged in a temporary table and applied with set-based statements: rows for unknown
+    sellers, or for new products without a description and manufacturer or without a known category, are
+    rejected; new products are created; and product_sellers prices are inserted or updated. When the batch
+    has several rows for the same seller and product, the last one wins and the earlier ones count as
+    updates.
+
+    :param: db cursor
+    :param: list of (line number, *FEED_COLUMNS) tuples
+    :return: counts for the batch
+    """
+    try:
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        cursor.execute("""DELETE FROM temp.price_feed_staging""")
+        cursor.executemany("""INSERT INTO
+                                    temp.price_feed_staging (line_number, seller_id, product_code, price, category_id,
+                                                             product_description, product_manufacturer, product_model)
+                                    VALUES(?,?,?,?,?,?,?,?)""", batch)
+        cursor.execute("""DELETE FROM temp.price_feed_staging
+                           WHERE line_number NOT IN (SELECT
+                                                            MAX(line_number)
+                                                      FROM temp.price_feed_staging
+                                                      GROUP BY seller_id, product_code)""")
+        superseded = cursor.rowcount
+        cursor.execute("""DELETE FROM temp.price_feed_staging
+                           WHERE seller_id NOT IN (SELECT sellers.seller_id FROM sellers)
+                           OR (product_code NOT IN (SELECT products.product_code FROM products)
+                               AND (product_description IS NULL
+                                    OR product_manufacturer IS NULL
+                                    OR category_id IS NULL
+                                    OR category_id NOT IN (SELECT categories.category_id FROM categories)))""")
+        rejected = cursor.rowcount
+        cursor.execute("""INSERT INTO
+                                products (category_id, product_code, product_description, product_manufacturer,
+                                          product_model, product_status)
+                          SELECT
+                                category_id,
+                                product_code,
+                                product_description,
+                                product_manufacturer,
+                                product_model,
+                                'Available'
+                          FROM temp.price_feed_staging
+                          WHERE line_number IN (SELECT
+                                                       MAX(line_number)
+                                                FROM temp.price_feed_staging
+                                                WHERE product_code NOT IN (SELECT products.product_code FROM products)
+                                                GROUP BY product_code)""")
+        products_created = cursor.rowcount
+        cursor.execute("""SELECT
+                                COUNT(*)
+                          FROM temp.price_feed_staging
+                          INNER JOIN products ON products.product_code = price_feed_staging.product_code
+                          INNER JOIN product_sellers ON product_sellers.product_id = products.product_id
+                                                    AND product_sellers.seller_id = price_feed_staging.seller_id""")
+        existing = cursor.fetchone()[0]
+        cursor.execute("""INSERT INTO
+                                product_sellers (product_id, seller_id, price)
+                          SELECT
+                                products.product_id,
+                                price_feed_staging.seller_id,
+                                price_feed_staging.price
+                          FROM temp.price_feed_staging
+                          INNER JOIN products ON products.product_code = price_feed_staging.product_code
+                          WHERE true
+                          ON CONFLICT (product_id, seller_id) DO UPDATE SET price = excluded.price""")
+        upserted = cursor.rowcount
+        cursor.execute("COMMIT")
+        return IngestReport(upserted - existing, existing + superseded, rejected, products_created)
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
+
+    return IngestReport(0, 0, len(batch), 0)
+
+
+def ingest_price_feed(connection: Connection, path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> IngestReport:
+    """
+    Function streaming a seller price feed into product_sellers, creating products that are not in the
+    catalog yet. Rows are parsed outside of any transaction and written in batches of batch_size, each in
+    its own short transaction, so shopper sessions only wait for one batch at a time.
+
+    :param: connection
+    :param: path of a .csv or .jsonl file with FEED_COLUMNS
+    :param: rows per transaction
+    :return: inserted, updated and rejected row counts and the number of products created
+    """
+    cursor = connection.cursor()
+    cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS price_feed_staging
+                            (line_number INTEGER PRIMARY KEY,
+                             seller_id INTEGER NOT NULL,
+                             product_code TEXT NOT NULL,
+                             price REAL NOT NULL,
+                             category_id INTEGER,
+                             product_description TEXT,
+                             product_manufacturer TEXT,
+                             product_model TEXT)""")
+
+    totals = IngestReport(0, 0, 0, 0)
+    batch: list[tuple] = []
+    for line_number, row in enumerate(read_price_feed(path), start=1):
+        parsed = parse_feed_row(row)
+        if parsed is None:
+            totals = totals._replace(rejected=totals.rejected + 1)
+            continue
+        batch.append((line_number,) + parsed)
+        if len(batch) >= batch_size:
+            totals = IngestReport(*map(sum, zip(totals, ingest_batch(cursor, batch))))
+            batch = []
+    if batch:
+        totals = IngestReport(*map(sum, zip(totals, ingest_batch(cursor, batch))))
+
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load a seller price feed into product_sellers')
+    parser.add_argument('feed', help='CSV or JSON-lines file with the columns: {}'.format(', '.join(FEED_COLUMNS)))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per transaction')
+    parser.add_argument('--database', help='database path, defaults to db/qho429.db')
+    arguments = parser.parse_args()
+
+    feed_connection = create_connection(arguments.database)
+    report = ingest_price_feed(feed_connection, arguments.feed, arguments.batch_size)
+    feed_connection.close()
+    print(f'{helpers.PrintColors.GREEN}Inserted: {report.inserted}, updated: {report.updated}, '
+          f'rejected: {report.rejected}, products created: {report.products_created}{helpers.PrintColors.END}')
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import sys
+import threading
+import time
+from typing import Optional
+
+from db import connect
+from db.connect import PooledConnection
+
+"""Number of latency histogram buckets; bucket i counts calls that took under 2**i microseconds"""
+HISTOGRAM_BUCKETS: int = 32
+
+"""Primary result codes, SQLITE_BUSY and SQLITE_LOCKED, of statements that gave up waiting for a lock"""
+BUSY_ERROR_CODES: frozenset[int] = frozenset({5, 6})
+
+
+class StatementStats:
+    """
+    Call count, latency and row counters for one function or one statement.
+    """
+
+    __slots__ = ('calls', 'errors', 'rows', 'total_seconds', 'max_seconds', 'histogram')
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.errors: int = 0
+        self.rows: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+        self.histogram: list[int] = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, seconds: float, error: bool) -> None:
+        """
+        Function adding one call to the counters.
+
+        :param: call latency in seconds
+        :param: whether the call raised
+        :return: None
+        """
+        self.calls += 1
+        self.errors += error
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        bucket = min(int(seconds * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Function returning the upper bound of the histogram bucket holding the given percentile.
+
+        :param: percentile as a fraction, e.g. 0.99
+        :return: latency in microseconds
+        """
+        threshold = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= threshold:
+                return float(2 ** bucket)
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {'calls': self.calls, 'errors': self.errors, 'rows': self.rows,
+                'total_ms': round(self.total_seconds * 1000, 3), 'max_ms': round(self.max_seconds * 1000, 3),
+                'p50_us': self.percentile(0.5), 'p99_us': self.percentile(0.99),
+                'histogram_log2_us': self.histogram}
+
+
+class QueryProfile:
+    """
+    Per-function and per-statement statistics collected by ProfilingCursor, plus commit and rollback counts
+    and the number of statements that failed with SQLITE_BUSY or SQLITE_LOCKED once busy_timeout ran out.
+    With WAL and synchronous=NORMAL commits do not fsync, so the commit count is the upper bound on fsyncs.
+    """
+
+    def __init__(self) -> None:
+        self.functions: dict[str, StatementStats] = {}
+        self.statements: dict[str, StatementStats] = {}
+        self.commits: int = 0
+        self.rollbacks: int = 0
+        self.busy_errors: int = 0
+        self.started: float = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, function: str, statement: str, seconds: float, error: bool, busy: bool = False) -> None:
+        """
+        Function recording one executed statement.
+
+        :param: name of the function that executed it
+        :param: normalised statement text
+        :param: latency in seconds
+        :param: whether the statement raised
+        :param: whether it raised because the database was locked
+        :return: None
+        """
+        with self._lock:
+            self.busy_errors += busy
+            for stats in (self.functions.setdefault(function, StatementStats()),
+                          self.statements.setdefault(statement, StatementStats())):
+                stats.record(seconds, error)
+            keyword = statement.split(' ', 1)[0].upper()
+            if keyword in ('COMMIT', 'END'):
+                self.commits += 1
+            elif keyword == 'ROLLBACK':
+                self.rollbacks += 1
+
+    def record_rows(self, function: str, statement: str, rows: int) -> None:
+        """
+        Function adding fetched rows to a function's and a statement's counters.
+
+        :param: function name
+        :param: normalised statement text
+        :param: number of rows fetched
+        :return: None
+        """
+        with self._lock:
+            self.functions[function].rows += rows
+            self.statements[statement].rows += rows
+
+    def to_dict(self) -> dict:
+        """
+        Function returning the profile as JSON-serialisable data.
+
+        :return: dict
+        """
+        with self._lock:
+            return {'elapsed_seconds': round(time.perf_counter() - self.started, 3),
+                    'commits': self.commits,
+                    'rollbacks': self.rollbacks,
+                    'busy_errors': self.busy_errors,
+                    'functions': {name: stats.to_dict() for name, stats in self.functions.items()},
+                    'statements': {sql: stats.to_dict() for sql, stats in self.statements.items()}}
+
+    def export_json(self, path: str) -> None:
+        """
+        Function writing the profile to a JSON file, for comparing runs between releases.
+
+        :param: file path
+        :return: None
+        """
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(self.to_dict(), output, indent=2)
+
+    def report(self, limit: int = 15) -> str:
+        """
+        Function formatting the profile as an end-of-session report, slowest functions and statements first.
+
+        :param: number of statements listed
+        :return: report text
+        """
+        lines = [f'Commits: {self.commits}  Rollbacks: {self.rollbacks}  Busy errors: {self.busy_errors}', '']
+        header = f'{"calls":>7} {"errors":>6} {"rows":>8} {"total ms":>10} {"p50 µs":>8} {"p99 µs":>8}  '
+        for title, entries, width in (('Function', self.functions, 45), ('Statement', self.statements, 80)):
+            lines.append(header + title)
+            ranked = sorted(entries.items(), key=lambda item: item[1].total_seconds, reverse=True)
+            for name, stats in ranked[:limit]:
+                lines.append(f'{stats.calls:>7} {stats.errors:>6} {stats.rows:>8} {stats.total_seconds * 1000:>10.2f} '
+                             f'{stats.percentile(0.5):>8.0f} {stats.percentile(0.99):>8.0f}  {name[:width]}')
+            lines.append('')
+        return '\n'.join(lines)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """
+    Cursor timing every execute and counting the rows fetched, attributing both to the statement and to
+    the function that called execute.
+    """
+
+    profile: Optional[QueryProfile] = None
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        super().__init__(connection)
+        self._last: Optional[tuple[str, str]] = None
+
+    def _timed(self, method, sql: str, parameters) -> sqlite3.Cursor:
+        caller = sys._getframe(2)
+        function = '{}.{}'.format(caller.f_globals.get('__name__', '?').rsplit('.', 1)[-1], caller.f_code.co_name)
+        statement = ' '.join(sql.split())
+        self._last = (function, statement)
+        start = time.perf_counter()
+        error = busy = False
+        try:
+            return method(sql, parameters)
+        except sqlite3.Error as e:
+            error = True
+            busy = (getattr(e, 'sqlite_errorcode', 0) & 0xff) in BUSY_ERROR_CODES
+            raise
+        finally:
+            self.profile.record(function, statement, time.perf_counter() - start, error, busy)
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql: str, parameters) -> sqlite3.Cursor:
+        return self._timed(super().executemany, sql, parameters)
+
+    def _count(self, rows: int) -> None:
+        if self._last and rows:
+            self.profile.record_rows(self._last[0], self._last[1], rows)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count(row is not None)
+        return row
+
+    def fetchmany(self, size: int = 1):
+        rows = super().fetchmany(size)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count(1)
+        return row
+
+
+class ProfilingConnection(PooledConnection):
+    """
+    Connection handing out ProfilingCursor instances and counting commit() and rollback() calls.
+    """
+
+    def cursor(self, factory=ProfilingCursor) -> sqlite3.Cursor:
+        return super().cursor(factory)
+
+    def commit(self) -> None:
+        pending = self.in_transaction
+        start = time.perf_counter()
+        super().commit()
+        if pending:
+            ProfilingCursor.profile.record('connection.commit', 'COMMIT', time.perf_counter() - start, False)
+
+    def rollback(self) -> None:
+        pending = self.in_transaction
+        start = time.perf_counter()
+        super().rollback()
+        if pending:
+            ProfilingCursor.profile.record('connection.rollback', 'ROLLBACK', time.perf_counter() - start, False)
+
+
+def enable_profiling() -> QueryProfile:
+    """
+    Function making every connection created afterwards by db.connect a profiling one and returning the
+    profile they record into.
+
+    :return: QueryProfile
+    """
+    if ProfilingCursor.profile is None:
+        ProfilingCursor.profile = QueryProfile()
+    connect.connection_factory = ProfilingConnection
+    return ProfilingCursor.profile
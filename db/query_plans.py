@@ -0,0 +1,160 @@
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import redirect_stdout
+from sqlite3 import Connection, Cursor
+from typing import Callable, Optional
+
+import helpers
+from db.connect import CATALOG_SCHEMA, get_database_path
+from db.migrations import SHARD_MIGRATIONS, migrate
+
+"""Tables expected to grow with the number of shoppers, orders or products; a full SCAN of these is a regression"""
+LARGE_TABLES: frozenset[str] = frozenset({
+    'shoppers', 'shopper_orders', 'ordered_products', 'shopper_baskets', 'basket_contents',
+    'products', 'product_sellers', 'shopper_orders_archive', 'ordered_products_archive',
+})
+
+"""
+Large tables a function is expected to read in full, e.g. reports listing every product; scans of any other
+large table by that function are still reported
+"""
+ALLOWED_SCANS: dict[str, frozenset[str]] = {
+    'reports.get_product_quantities_below_category': frozenset({'products'}),
+}
+
+"""
+Statements whose plans are not checked. Statements SQLite runs internally, such as the FTS5 index lookups,
+are traced as '--' comments
+"""
+IGNORED_PREFIXES: tuple[str, ...] = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'SAVEPOINT', 'RELEASE', 'EXPLAIN',
+                                     '--')
+
+
+def get_query_workload() -> list[tuple[str, Callable[[Cursor], object]]]:
+    """
+    Function returning a call of every function in the db package that issues a query, as
+    (function name, call taking a cursor). Add new db functions here so their plans are checked.
+
+    :return: list of named calls
+    """
+    from db import basket, inventory, maintenance, recommendations, reports, shoppers
+
+    shopper_id, product_id, seller_id, category_id, basket_id, order_id = 1, 1, 1, 1, 1, 1
+    return [
+        ('shoppers.check_if_shopper_exists', lambda cursor: shoppers.check_if_shopper_exists(cursor, shopper_id)),
+        ('shoppers.get_order_history', lambda cursor: list(shoppers.get_order_history(cursor, shopper_id))),
+        ('shoppers.get_order_history_page',
+         lambda cursor: shoppers.get_order_history_page(cursor, shopper_id, before=('9999-12-31', order_id))),
+        ('inventory.get_product_categories', lambda cursor: inventory.get_product_categories(cursor)),
+        ('inventory.get_category_products', lambda cursor: inventory.get_category_products(cursor, category_id)),
+        ('inventory.get_product_sellers', lambda cursor: inventory.get_product_sellers(cursor, product_id)),
+        ('inventory.get_product_offer',
+         lambda cursor: inventory.get_product_offer(cursor, product_id, seller_id)),
+        ('inventory.get_product', lambda cursor: inventory.get_product(cursor, product_id)),
+        ('inventory.search_products', lambda cursor: inventory.search_products(cursor, 'sam gal')),
+        ('recommendations.iter_order_items',
+         lambda cursor: list(recommendations.iter_order_items(cursor, after_order_id=order_id))),
+        ('basket.get_todays_shopper_basket_id',
+         lambda cursor: basket.get_todays_shopper_basket_id(cursor, shopper_id)),
+        ('basket.get_baskets_contents', lambda cursor: basket.get_baskets_contents(cursor, basket_id)),
+        ('basket.get_basket_total', lambda cursor: basket.get_basket_total(cursor, basket_id)),
+        ('basket.check_if_item_exists_in_basket',
+         lambda cursor: basket.check_if_item_exists_in_basket(cursor, product_id, basket_id)),
+        ('basket.add_item_to_basket',
+         lambda cursor: basket.add_item_to_basket(cursor, shopper_id, seller_id, product_id, 1, 1.0)),
+        ('basket.update_item_quantity_in_basket_contents',
+         lambda cursor: basket.update_item_quantity_in_basket_contents(cursor, basket_id, product_id, 1)),
+        ('basket.delete_item_from_basket_contents',
+         lambda cursor: basket.delete_item_from_basket_contents(cursor, basket_id, product_id)),
+        ('basket.delete_basket_contents', lambda cursor: basket.delete_basket_contents(cursor, basket_id)),
+        ('basket.delete_basket_from_shopper_baskets',
+         lambda cursor: basket.delete_basket_from_shopper_baskets(cursor, basket_id, shopper_id)),
+        ('basket.create_shopper_order', lambda cursor: basket.create_shopper_order(cursor, shopper_id)),
+        ('basket.create_ordered_products',
+         lambda cursor: basket.create_ordered_products(cursor, basket_id, order_id)),
+        ('basket.checkout', lambda cursor: basket.checkout(cursor, basket_id, shopper_id)),
+        ('basket.BasketSession', lambda cursor: basket.BasketSession(cursor, shopper_id)),
+        ('maintenance.expire_baskets', lambda cursor: maintenance.expire_baskets(cursor)),
+        ('maintenance.archive_orders', lambda cursor: maintenance.archive_orders(cursor)),
+        ('reports.get_seller_sales', lambda cursor: reports.get_seller_sales(cursor)),
+        ('reports.get_product_quantities_below_category',
+         lambda cursor: reports.get_product_quantities_below_category(cursor)),
+    ]
+
+
+def get_table_scans(connection: Connection, statement: str) -> list[str]:
+    """
+    Function returning the full scans of large tables in a statement's query plan.
+
+    :param: connection
+    :param: SQL statement with its parameters already expanded
+    :return: query plan details starting with SCAN
+    """
+    plan = connection.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+    scans = []
+    for row in plan:
+        detail: str = row[-1]
+        words = detail.split()
+        if len(words) > 1 and words[0] == 'SCAN' and words[1] in LARGE_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(database_path: Optional[str] = None, sharded: bool = False) -> list[tuple[str, str, str]]:
+    """
+    Function running every call from get_query_workload() against an in-memory, migrated copy of the
+    database and returning each statement that falls back to a full scan of a large table.
+
+    With sharded set, the calls run on an empty in-memory shard with the copy attached as CATALOG_SCHEMA,
+    like a shard connection from db.connect, so the shard schema's indexes are checked instead.
+
+    :param: database path, defaults to get_database_path()
+    :param: run the calls on a shard
+    :return: list of (function name, statement, plan detail)
+    """
+    source = sqlite3.connect(database_path or get_database_path())
+    catalog_uri = 'file:query_plans_catalog?mode=memory&cache=shared'
+    catalog = sqlite3.connect(catalog_uri, uri=True)
+    source.backup(catalog)
+    source.close()
+    migrate(catalog)
+    connection = catalog
+    if sharded:
+        connection = sqlite3.connect('file::memory:', uri=True)
+        migrate(connection, SHARD_MIGRATIONS)
+        connection.execute(f"""ATTACH DATABASE ? AS {CATALOG_SCHEMA}""", (catalog_uri,))
+
+    offenders = []
+    for name, call in get_query_workload():
+        statements: list[str] = []
+        connection.set_trace_callback(statements.append)
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            call(connection.cursor())
+        connection.set_trace_callback(None)
+        for statement in statements:
+            if statement.lstrip().upper().startswith(IGNORED_PREFIXES):
+                continue
+            for detail in get_table_scans(connection, statement):
+                if detail.split()[1] in ALLOWED_SCANS.get(name, ()):
+                    continue
+                offenders.append((name, ' '.join(statement.split()), detail))
+
+    connection.close()
+    catalog.close()
+    return offenders
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report full scans of large tables in the db package queries')
+    parser.add_argument('database', nargs='?', help='database path, defaults to db/qho429.db')
+    parser.add_argument('--sharded', action='store_true', help='run the queries on a shard of the database')
+    arguments = parser.parse_args()
+
+    scans = check_query_plans(arguments.database, arguments.sharded)
+    for function_name, sql, plan_detail in scans:
+        helpers.error(f'{function_name}: {plan_detail} in \'{sql}\'')
+    if not scans:
+        print(f'{helpers.PrintColors.GREEN}No full scans of large tables{helpers.PrintColors.END}')
+    sys.exit(1 if scans else 0)
@@ -0,0 +1,360 @@
+import argparse
+import os
+import threading
+import time
+from sqlite3 import Cursor
+from typing import Iterator, NamedTuple, Optional, Union
+
+import helpers
+from db.connect import close_database_connection, create_connection, get_database_path, get_shards
+from db.inventory import get_product
+from db.records import Product
+
+"""Neighbours stored per product, the most recommend_products can return"""
+RECOMMENDATION_COUNT: int = 5
+
+"""Order lines fetched per batch while counting co-purchases"""
+ORDER_ITEM_BATCH_SIZE: int = 100_000
+
+"""Product pairs buffered before they are merged into the counts"""
+PAIR_BUFFER_SIZE: int = 5_000_000
+
+"""
+Product pairs are counted as int64 keys holding the first product_id in the high bits and the second in the
+low PRODUCT_ID_BITS, so product ids must stay below 2**PRODUCT_ID_BITS
+"""
+PRODUCT_ID_BITS: int = 31
+
+"""Seconds between two incremental rebuilds when the build runs with --interval"""
+REBUILD_INTERVAL_SECONDS: float = 600.0
+
+"""
+Statements reading the order lines of uncancelled orders placed after a given order_id, ordered by order_id
+so each order's lines arrive together. Archived orders are read too, by their own statement, as both tables
+are ordered by their primary key and the union of the two would need a sort.
+"""
+ORDER_ITEM_QUERIES: tuple[str, ...] = (
+    """SELECT
+             ordered_products.order_id,
+             ordered_products.product_id
+       FROM ordered_products
+       INNER JOIN shopper_orders ON shopper_orders.order_id = ordered_products.order_id
+       WHERE ordered_products.order_id > ?
+       AND shopper_orders.order_status <> 'Cancelled'
+       ORDER BY ordered_products.order_id""",
+    """SELECT
+             ordered_products_archive.order_id,
+             ordered_products_archive.product_id
+       FROM ordered_products_archive
+       INNER JOIN shopper_orders_archive ON shopper_orders_archive.order_id = ordered_products_archive.order_id
+       WHERE ordered_products_archive.order_id > ?
+       AND shopper_orders_archive.order_status <> 'Cancelled'
+       ORDER BY ordered_products_archive.order_id""",
+)
+
+
+class CopurchaseUpdate(NamedTuple):
+    orders_added: int
+    products: int
+    pairs: int
+
+
+def get_recommendations_path(database_path: Optional[str] = None) -> str:
+    """
+    Function returning the path of the top neighbours file, next to the database: db/qho429.recommendations.npy.
+
+    :param: database path, defaults to get_database_path()
+    :return: str
+    """
+    return '{}.recommendations.npy'.format(os.path.splitext(database_path or get_database_path())[0])
+
+
+def get_copurchases_path(database_path: Optional[str] = None) -> str:
+    """
+    Function returning the path of the co-purchase counts kept for incremental rebuilds, next to the database.
+
+    :param: database path, defaults to get_database_path()
+    :return: str
+    """
+    return '{}.copurchases.npz'.format(os.path.splitext(database_path or get_database_path())[0])
+
+
+def iter_order_items(cursor: Cursor, after_order_id: int = 0,
+                     batch_size: int = ORDER_ITEM_BATCH_SIZE) -> Iterator[tuple]:
+    """
+    Function streaming the lines of uncancelled orders placed after after_order_id as NumPy arrays, in
+    batches of whole orders of about batch_size lines.
+
+    :param: db cursor
+    :param: order_id after which orders are read
+    :param: order lines fetched per batch
+    :return: iterator of (order_ids, product_ids) int64 arrays
+    """
+    import numpy
+
+    for query in ORDER_ITEM_QUERIES:
+        cursor.execute(query, (after_order_id,))
+        carried = numpy.empty((0, 2), dtype=numpy.int64)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            lines = numpy.concatenate((carried, numpy.array(rows, dtype=numpy.int64).reshape(-1, 2)))
+            if not rows:
+                if len(lines):
+                    yield lines[:, 0], lines[:, 1]
+                break
+            # The last order may continue in the next batch
+            last_order = numpy.searchsorted(lines[:, 0], lines[-1, 0])
+            carried = lines[last_order:]
+            if last_order:
+                yield lines[:last_order, 0], lines[:last_order, 1]
+
+
+def count_pairs(order_ids, product_ids) -> tuple:
+    """
+    Function counting, for the order lines of whole orders, how often each ordered pair of different products
+    was bought in the same order, with array operations instead of a loop over the orders.
+
+    :param: order_ids, grouped so each order's lines are adjacent
+    :param: product_ids of the same lines
+    :return: (pair keys, counts) int64 arrays, keys as described by PRODUCT_ID_BITS
+    """
+    import numpy
+
+    # A product ordered from several sellers in one order counts once for that order
+    order = numpy.lexsort((product_ids, order_ids))
+    order_ids, product_ids = order_ids[order], product_ids[order]
+    first_lines = numpy.concatenate(([True], (order_ids[1:] != order_ids[:-1]) |
+                                     (product_ids[1:] != product_ids[:-1])))
+    order_ids, product_ids = order_ids[first_lines], product_ids[first_lines]
+
+    boundaries = numpy.flatnonzero(numpy.diff(order_ids)) + 1
+    starts = numpy.concatenate(([0], boundaries))
+    sizes = numpy.diff(numpy.concatenate((starts, [len(order_ids)])))
+    # Every line is paired with each line of its order, itself included, then the self pairs are dropped
+    line_sizes = numpy.repeat(sizes, sizes)
+    line_starts = numpy.repeat(starts, sizes)
+    first = numpy.repeat(product_ids, line_sizes)
+    offsets = numpy.arange(line_sizes.sum()) - numpy.repeat(numpy.cumsum(line_sizes) - line_sizes, line_sizes)
+    second = product_ids[numpy.repeat(line_starts, line_sizes) + offsets]
+    distinct = first != second
+    return numpy.unique((first[distinct] << PRODUCT_ID_BITS) | second[distinct], return_counts=True)
+
+
+def merge_counts(keys, counts, new_keys, new_counts) -> tuple:
+    """
+    Function adding one set of pair counts to another.
+
+    :param: pair keys
+    :param: counts
+    :param: pair keys to add
+    :param: counts to add
+    :return: (pair keys, counts) int64 arrays
+    """
+    import numpy
+
+    merged_keys, inverse = numpy.unique(numpy.concatenate((keys, new_keys)), return_inverse=True)
+    merged_counts = numpy.bincount(inverse, weights=numpy.concatenate((counts, new_counts)),
+                                   minlength=len(merged_keys))
+    return merged_keys, merged_counts.astype(numpy.int64)
+
+
+def get_top_neighbours(keys, counts, top_k: int = RECOMMENDATION_COUNT):
+    """
+    Function ranking each product's co-purchased products by count, ties broken by product_id, and keeping
+    the first top_k.
+
+    :param: pair keys
+    :param: counts
+    :param: neighbours kept per product
+    :return: int64 array with one row per product: its product_id followed by top_k neighbour product_ids,
+             padded with 0
+    """
+    import numpy
+
+    first = keys >> PRODUCT_ID_BITS
+    second = keys & ((1 << PRODUCT_ID_BITS) - 1)
+    order = numpy.lexsort((second, -counts, first))
+    first, second = first[order], second[order]
+    group_starts = numpy.concatenate(([True], first[1:] != first[:-1]))[:len(first)]
+    starts = numpy.flatnonzero(group_starts)
+    group = numpy.cumsum(group_starts) - 1
+    rank = numpy.arange(len(first)) - starts[group]
+    kept = rank < top_k
+    table = numpy.zeros((len(starts), top_k + 1), dtype=numpy.int64)
+    table[:, 0] = first[starts]
+    table[group[kept], rank[kept] + 1] = second[kept]
+    return table
+
+
+def _write_atomically(path: str, write) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as output:
+        write(output)
+    os.replace(temporary_path, path)
+
+
+def update_recommendations(database_path: Optional[str] = None, full: bool = False,
+                           top_k: int = RECOMMENDATION_COUNT) -> Union[CopurchaseUpdate, None]:
+    """
+    Function bringing the co-purchase counts up to date and rewriting the top neighbours file.
+
+    The counts and, for each shard, the last order_id counted are kept in get_copurchases_path(), so unless
+    full is set only orders placed since the last update are read. Orders are counted once: an order
+    cancelled after it was counted stays counted until the next full rebuild. Both files are replaced
+    atomically, so readers keep using the previous file until they reload.
+
+    :param: database path, defaults to get_database_path()
+    :param: recount every order
+    :param: neighbours kept per product
+    :return: numbers of orders added, products with neighbours and product pairs, None if NumPy is missing
+    """
+    try:
+        import numpy
+    except ImportError:
+        helpers.error('NumPy is needed to build recommendations')
+        return None
+
+    database_path = database_path or get_database_path()
+    copurchases_path = get_copurchases_path(database_path)
+    keys = numpy.empty(0, dtype=numpy.int64)
+    counts = numpy.empty(0, dtype=numpy.int64)
+    last_order_ids: dict[int, int] = {}
+    if not full and os.path.exists(copurchases_path):
+        with numpy.load(copurchases_path) as state:
+            keys, counts = state['keys'], state['counts']
+            last_order_ids = dict(zip(state['shards'].tolist(), state['last_order_ids'].tolist()))
+
+    orders_added = 0
+    for shard in get_shards():
+        shard_key = -1 if shard is None else shard
+        connection = create_connection(database_path, read_only=True, shard=shard)
+        after_order_id = last_order_ids.get(shard_key, 0)
+        pending_keys, pending_counts, pending = [], [], 0
+        for order_ids, product_ids in iter_order_items(connection.cursor(), after_order_id):
+            if product_ids.max() >= 1 << PRODUCT_ID_BITS:
+                helpers.error(f'Product ids must be below {1 << PRODUCT_ID_BITS} to build recommendations')
+                close_database_connection(connection)
+                return None
+            orders_added += int(numpy.count_nonzero(numpy.diff(order_ids))) + 1
+            last_order_ids[shard_key] = max(last_order_ids.get(shard_key, 0), int(order_ids[-1]))
+            batch_keys, batch_counts = count_pairs(order_ids, product_ids)
+            pending_keys.append(batch_keys)
+            pending_counts.append(batch_counts)
+            pending += len(batch_keys)
+            if pending >= PAIR_BUFFER_SIZE:
+                keys, counts = merge_counts(keys, counts, numpy.concatenate(pending_keys),
+                                            numpy.concatenate(pending_counts))
+                pending_keys, pending_counts, pending = [], [], 0
+        if pending_keys:
+            keys, counts = merge_counts(keys, counts, numpy.concatenate(pending_keys),
+                                        numpy.concatenate(pending_counts))
+        close_database_connection(connection)
+
+    table = get_top_neighbours(keys, counts, top_k)
+    _write_atomically(get_recommendations_path(database_path), lambda output: numpy.save(output, table))
+    _write_atomically(copurchases_path, lambda output: numpy.savez(
+        output, keys=keys, counts=counts, shards=numpy.array(list(last_order_ids), dtype=numpy.int64),
+        last_order_ids=numpy.array(list(last_order_ids.values()), dtype=numpy.int64)))
+    return CopurchaseUpdate(orders_added, len(table), len(keys))
+
+
+class RecommendationIndex:
+    """
+    Top neighbours file memory-mapped read-only, with a dict from product_id to row, so a lookup is one dict
+    access and one row read and only the rows looked up are paged in.
+    """
+
+    def __init__(self, path: str) -> None:
+        import numpy
+
+        self.path: str = path
+        self.modified: int = os.stat(path).st_mtime_ns
+        self.table = numpy.load(path, mmap_mode='r')
+        self.rows: dict[int, int] = {product_id: row for row, product_id in enumerate(self.table[:, 0].tolist())}
+
+    def get(self, product_id: int, limit: int = RECOMMENDATION_COUNT) -> list[int]:
+        """
+        Function returning the products most often bought with a product, most frequent first.
+
+        :param: product_id
+        :param: maximum number of products
+        :return: product_ids, empty if the product has never been bought with another
+        """
+        row = self.rows.get(product_id)
+        if row is None:
+            return []
+        return [neighbour for neighbour in self.table[row, 1:limit + 1].tolist() if neighbour]
+
+
+"""Recommendation index of each file, reloaded when the file is replaced by a rebuild"""
+_indexes: dict[str, RecommendationIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_recommendation_index(path: Optional[str] = None) -> Union[RecommendationIndex, None]:
+    """
+    Function returning the loaded recommendation index, loading it again if the file has been rebuilt since.
+
+    :param: top neighbours file, defaults to get_recommendations_path()
+    :return: RecommendationIndex, None if the file has not been built or NumPy is missing
+    """
+    path = path or get_recommendations_path()
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.modified != modified:
+            try:
+                index = _indexes[path] = RecommendationIndex(path)
+            except (ImportError, OSError, ValueError):
+                return None
+        return index
+
+
+def recommend_products(cursor: Cursor, product_id: int, limit: int = RECOMMENDATION_COUNT,
+                       path: Optional[str] = None) -> list[Product]:
+    """
+    Function returning the products most often bought together with a product, looked up in the recommendation
+    index and described from the catalog cache. Products no longer in the catalog are skipped.
+
+    :param: db cursor
+    :param: product_id
+    :param: maximum number of products
+    :param: top neighbours file, defaults to get_recommendations_path()
+    :return: products, empty when there is nothing to recommend
+    """
+    index = get_recommendation_index(path)
+    if index is None:
+        return []
+    products = (get_product(cursor, neighbour) for neighbour in index.get(product_id, limit))
+    return [product for product in products if product]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the "frequently bought together" recommendations')
+    parser.add_argument('--database', help='database path, defaults to db/qho429.db')
+    parser.add_argument('--full', action='store_true', help='recount every order instead of the new ones')
+    parser.add_argument('--top-k', type=int, default=RECOMMENDATION_COUNT, help='neighbours kept per product')
+    parser.add_argument('--interval', type=float, metavar='SECONDS',
+                        help=f'keep updating every SECONDS, e.g. {REBUILD_INTERVAL_SECONDS:.0f}, until interrupted')
+    arguments = parser.parse_args()
+
+    full_rebuild = arguments.full
+    while True:
+        started = time.perf_counter()
+        update = update_recommendations(arguments.database, full_rebuild, arguments.top_k)
+        if update is None:
+            raise SystemExit(1)
+        print(f'{helpers.PrintColors.GREEN}{update.orders_added} orders added, {update.products} products with '
+              f'recommendations from {update.pairs} product pairs in {time.perf_counter() - started:.2f}s'
+              f'{helpers.PrintColors.END}')
+        if arguments.interval is None:
+            break
+        full_rebuild = False
+        try:
+            time.sleep(arguments.interval)
+        except KeyboardInterrupt:
+            break
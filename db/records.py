@@ -0,0 +1,63 @@
+from typing import NamedTuple
+
+"""
+Row records returned by the db package. They are named tuples, so each row costs one tuple allocation with
+no per-instance __dict__, and positional access used by the printing helpers keeps working. Build them
+straight from cursor rows with Record._make(row).
+"""
+
+
+class Category(NamedTuple):
+    category_id: int
+    category_description: str
+
+
+class Product(NamedTuple):
+    product_id: int
+    product_description: str
+
+
+class Seller(NamedTuple):
+    seller_id: int
+    seller_name: str
+    price: float
+
+
+class BasketLine(NamedTuple):
+    product_id: int
+    product_description: str
+    seller_id: int
+    seller_name: str
+    quantity: int
+    price: float
+
+    @property
+    def total(self) -> float:
+        return self.quantity * self.price
+
+
+class OrderLine(NamedTuple):
+    order_id: int
+    order_date: str
+    product_description: str
+    seller_name: str
+    price: str
+    quantity: int
+    ordered_product_status: str
+
+
+class SellerProductSales(NamedTuple):
+    seller_account_ref: str
+    seller_name: str
+    product_code: str
+    product_description: str
+    total_quantity_sold: int
+    total_sales_amount: str
+
+
+class ProductQuantity(NamedTuple):
+    category_description: str
+    product_code: str
+    product_description: str
+    average_product_quantity: float
+    products_above: int
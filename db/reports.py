@@ -0,0 +1,205 @@
+import argparse
+import sqlite3
+import sys
+from sqlite3 import Cursor
+from typing import Union
+
+import helpers
+from db.connect import close_database_connection, create_connection, get_shard_count, get_shards
+from db.records import ProductQuantity, SellerProductSales
+from render import render_table
+
+
+def _load_shard_summaries(cursor: Cursor) -> None:
+    """
+    Function summing the summary tables of every shard into temporary tables of the same names. Unqualified
+    names resolve to the temp schema first, so the report queries read the totals over every shard in place
+    of the main database's summaries, which stop counting once shopper data is sharded. The summaries are
+    read again on every call.
+
+    :param: db cursor of a connection to the main database
+    :return: None
+    :raises: sqlite3.Error
+    """
+    database_path = next(file for _, name, file in cursor.execute("""PRAGMA database_list""") if name == 'main')
+    cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS seller_sales_summary
+                            (seller_id INTEGER PRIMARY KEY,
+                             quantity_sold INTEGER NOT NULL)""")
+    cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS product_quantity_summary
+                            (product_id INTEGER PRIMARY KEY,
+                             line_count INTEGER NOT NULL,
+                             uncancelled_line_count INTEGER NOT NULL,
+                             uncancelled_quantity INTEGER NOT NULL)""")
+    cursor.execute("""DELETE FROM temp.seller_sales_summary""")
+    cursor.execute("""DELETE FROM temp.product_quantity_summary""")
+    for shard in get_shards():
+        shard_connection = create_connection(database_path, read_only=True, shard=shard)
+        try:
+            cursor.executemany("""INSERT INTO
+                                        temp.seller_sales_summary (seller_id, quantity_sold)
+                                        VALUES(?,?)
+                                  ON CONFLICT (seller_id) DO UPDATE
+                                  SET quantity_sold = quantity_sold + excluded.quantity_sold""",
+                               shard_connection.execute("""SELECT seller_id, quantity_sold
+                                                           FROM main.seller_sales_summary"""))
+            cursor.executemany("""INSERT INTO
+                                        temp.product_quantity_summary (product_id, line_count,
+                                                                       uncancelled_line_count, uncancelled_quantity)
+                                        VALUES(?,?,?,?)
+                                  ON CONFLICT (product_id) DO UPDATE
+                                  SET line_count = line_count + excluded.line_count,
+                                      uncancelled_line_count = uncancelled_line_count
+                                                               + excluded.uncancelled_line_count,
+                                      uncancelled_quantity = uncancelled_quantity + excluded.uncancelled_quantity""",
+                               shard_connection.execute("""SELECT product_id, line_count, uncancelled_line_count,
+                                                                  uncancelled_quantity
+                                                           FROM main.product_quantity_summary"""))
+        finally:
+            close_database_connection(shard_connection)
+
+
+def get_seller_sales(cursor: Cursor) -> Union[list[SellerProductSales], None]:
+    """
+    Function returning the rows of view "1c" from the seller_sales_summary table instead of aggregating
+    ordered_products.
+
+    Like the view, every product a seller offers is reported with the quantity of everything the seller has
+    sold, whatever the product, and with that quantity times the product's current price as the sales
+    amount; sellers without products get a single row of zeros. When shopper data is sharded the quantities
+    are summed over every shard.
+
+    :param: db cursor of a connection to the main database
+    :return: rows ordered by quantity sold
+    """
+    try:
+        if get_shard_count():
+            _load_shard_summaries(cursor)
+        cursor.execute("""SELECT
+                                sellers.seller_account_ref,
+                                sellers.seller_name,
+                                IFNULL(products.product_code, 0),
+                                IFNULL(products.product_description, 0),
+                                IFNULL(seller_sales_summary.quantity_sold, 0) AS quantity_sold,
+                                '£'||PRINTF("%.2f", IFNULL(seller_sales_summary.quantity_sold, 0)
+                                                    * product_sellers.price)
+                          FROM sellers
+                          LEFT OUTER JOIN product_sellers ON product_sellers.seller_id = sellers.seller_id
+                          LEFT OUTER JOIN products ON products.product_id = product_sellers.product_id
+                          LEFT OUTER JOIN seller_sales_summary
+                                       ON seller_sales_summary.seller_id = product_sellers.seller_id
+                          ORDER BY quantity_sold, sellers.seller_id, products.product_id""")
+        return list(map(SellerProductSales._make, cursor))
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation: \'{e}\'')
+
+    return None
+
+
+def get_product_quantities_below_category(cursor: Cursor) -> Union[list[ProductQuantity], None]:
+    """
+    Function returning the rows of view "1d" from the product_quantity_summary table instead of aggregating
+    ordered_products and shopper_orders.
+
+    The view compares each product's average ordered quantity, ignoring cancelled orders, with the average
+    of every other product in its category, and lists the product once for each product with a higher
+    average. Here each product is listed once, with that count in products_above; products with no
+    higher-averaged product in their category are left out, as in the view. Products whose every order
+    line belongs to a cancelled order have no average and are left out too. When shopper data is sharded the
+    quantities are summed over every shard.
+
+    :param: db cursor of a connection to the main database
+    :return: rows ordered by category and product description
+    """
+    try:
+        if get_shard_count():
+            _load_shard_summaries(cursor)
+        cursor.execute("""SELECT
+                                category_description,
+                                product_code,
+                                product_description,
+                                average_quantity,
+                                products_above
+                          FROM (SELECT
+                                      categories.category_description,
+                                      products.product_code,
+                                      products.product_description,
+                                      averages.average_quantity,
+                                      RANK() OVER (PARTITION BY products.category_id
+                                                   ORDER BY averages.average_quantity DESC) - 1 AS products_above
+                                FROM products
+                                INNER JOIN categories ON categories.category_id = products.category_id
+                                INNER JOIN (SELECT
+                                                  products.product_id,
+                                                  CASE WHEN product_quantity_summary.uncancelled_line_count > 0
+                                                       THEN CAST(product_quantity_summary.uncancelled_quantity AS REAL)
+                                                            / product_quantity_summary.uncancelled_line_count
+                                                       ELSE 0 END AS average_quantity
+                                            FROM products
+                                            LEFT OUTER JOIN product_quantity_summary
+                                                         ON product_quantity_summary.product_id = products.product_id
+                                            WHERE IFNULL(product_quantity_summary.line_count, 0) = 0
+                                            OR product_quantity_summary.uncancelled_line_count > 0) AS averages
+                                        ON averages.product_id = products.product_id)
+                          WHERE products_above > 0
+                          ORDER BY category_description, product_description""")
+        return list(map(ProductQuantity._make, cursor))
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation: \'{e}\'')
+
+    return None
+
+
+def check_report_consistency(cursor: Cursor) -> list[str]:
+    """
+    Function comparing both reports with the output of the views they replace. The views only read the
+    shopper tables of the main database, so there is nothing to compare them with once shopper data is
+    sharded.
+
+    :param: db cursor
+    :return: description of every difference, empty when the reports match the views
+    """
+    if get_shard_count():
+        return ['Views 1c and 1d do not read sharded shopper data; unset QHO429_SHARD_COUNT to compare the '
+                'reports with them']
+
+    differences = []
+    cursor.execute("""SELECT * FROM "1c\"""")
+    view_rows = sorted(map(tuple, cursor.fetchall()), key=repr)
+    report_rows = sorted(map(tuple, get_seller_sales(cursor) or []), key=repr)
+    if view_rows != report_rows:
+        differences.append(f'1c: {len(set(view_rows) ^ set(report_rows))} rows differ '
+                           f'({len(view_rows)} in the view, {len(report_rows)} in the report)')
+
+    cursor.execute("""SELECT * FROM "1d\"""")
+    view_rows = sorted(map(tuple, cursor.fetchall()), key=repr)
+    report_rows = sorted((row[:-1] for row in get_product_quantities_below_category(cursor) or []
+                          for _ in range(row.products_above)), key=repr)
+    if view_rows != report_rows:
+        differences.append(f'1d: {len(set(view_rows) ^ set(report_rows))} rows differ '
+                           f'({len(view_rows)} in the view, {len(report_rows)} in the report)')
+
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sales reports read from the summary tables')
+    parser.add_argument('report', choices=('sales', 'quantities', 'check'),
+                        help='sales: view 1c, quantities: view 1d, check: compare both with the views')
+    parser.add_argument('--database', help='database path, defaults to db/qho429.db')
+    arguments = parser.parse_args()
+
+    report_connection = create_connection(arguments.database)
+    report_cursor = report_connection.cursor()
+    if arguments.report == 'sales':
+        render_table(get_seller_sales(report_cursor) or [], headers=SellerProductSales._fields)
+    elif arguments.report == 'quantities':
+        render_table(get_product_quantities_below_category(report_cursor) or [], headers=ProductQuantity._fields)
+    else:
+        mismatches = check_report_consistency(report_cursor)
+        for mismatch in mismatches:
+            helpers.error(mismatch)
+        if not mismatches:
+            print(f'{helpers.PrintColors.GREEN}Reports match views 1c and 1d{helpers.PrintColors.END}')
+        report_connection.close()
+        sys.exit(1 if mismatches else 0)
+    report_connection.close()
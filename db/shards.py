@@ -0,0 +1,114 @@
+import argparse
+import sqlite3
+import sys
+from sqlite3 import Cursor
+from typing import Union
+
+import helpers
+from db.connect import (CATALOG_SCHEMA, close_database_connection, create_connection, get_database_path,
+                        get_shard_path)
+from db.migrations import SUMMARY_REBUILD_STATEMENTS
+
+"""
+Statements copying one shard's share of the shopper data out of the main database, in order: baskets and orders
+first, then the rows belonging to them, then the summary tables rebuilt from the copy. Take the :shard number
+and :shard_count parameters.
+"""
+SHARD_COPY_STATEMENTS: tuple[str, ...] = (
+    f"""INSERT INTO main.shopper_baskets (basket_id, shopper_id, basket_created_date_time)
+             SELECT basket_id, shopper_id, basket_created_date_time
+             FROM {CATALOG_SCHEMA}.shopper_baskets
+             WHERE shopper_id % :shard_count = :shard""",
+    f"""INSERT INTO main.basket_contents (basket_id, product_id, seller_id, quantity, price)
+             SELECT basket_id, product_id, seller_id, quantity, price
+             FROM {CATALOG_SCHEMA}.basket_contents
+             WHERE basket_id IN (SELECT basket_id FROM main.shopper_baskets)""",
+    f"""INSERT INTO main.shopper_orders (order_id, shopper_id, order_date, order_status)
+             SELECT order_id, shopper_id, order_date, order_status
+             FROM {CATALOG_SCHEMA}.shopper_orders
+             WHERE shopper_id % :shard_count = :shard""",
+    f"""INSERT INTO main.ordered_products (order_id, product_id, seller_id, quantity, price, ordered_product_status)
+             SELECT order_id, product_id, seller_id, quantity, price, ordered_product_status
+             FROM {CATALOG_SCHEMA}.ordered_products
+             WHERE order_id IN (SELECT order_id FROM main.shopper_orders)""",
+    f"""INSERT INTO main.shopper_orders_archive (order_id, shopper_id, order_date, order_status)
+             SELECT order_id, shopper_id, order_date, order_status
+             FROM {CATALOG_SCHEMA}.shopper_orders_archive
+             WHERE shopper_id % :shard_count = :shard""",
+    f"""INSERT INTO main.ordered_products_archive (order_id, product_id, seller_id, quantity, price,
+                                                   ordered_product_status)
+             SELECT order_id, product_id, seller_id, quantity, price, ordered_product_status
+             FROM {CATALOG_SCHEMA}.ordered_products_archive
+             WHERE order_id IN (SELECT order_id FROM main.shopper_orders_archive)""",
+    # Archived lines were inserted without going through ordered_products, so their triggers never counted them
+) + SUMMARY_REBUILD_STATEMENTS
+
+
+def copy_shard(cursor: Cursor, shard: int, shard_count: int) -> Union[int, None]:
+    """
+    Function copying the baskets and orders of the shoppers mapped to a shard from the main database into
+    the shard, in one transaction, and rebuilding the shard's summary tables. Copied rows keep their ids,
+    which are all below the shard's own id range. The shard must not hold any shopper data yet.
+
+    :param: db cursor of a read-write connection to the shard
+    :param: shard number
+    :param: number of shards
+    :return: number of orders copied, None if the shard was not empty or the copy failed
+    """
+    try:
+        cursor.execute("""SELECT
+                                EXISTS (SELECT 1 FROM main.shopper_baskets)
+                                OR EXISTS (SELECT 1 FROM main.shopper_orders)
+                                OR EXISTS (SELECT 1 FROM main.shopper_orders_archive)""")
+        if cursor.fetchone()[0]:
+            helpers.error(f'Shard {shard} already holds shopper data')
+            return None
+
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        for statement in SHARD_COPY_STATEMENTS:
+            cursor.execute(statement, {'shard': shard, 'shard_count': shard_count})
+        cursor.execute("""SELECT COUNT(*) FROM main.all_shopper_orders""")
+        orders = cursor.fetchone()[0]
+        cursor.execute("COMMIT")
+        return orders
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+        if cursor.connection.in_transaction:
+            cursor.execute("ROLLBACK")
+
+    return None
+
+
+def split_shopper_data(database_path: str, shard_count: int) -> bool:
+    """
+    Function creating shard_count shard files next to the main database and copying every shopper's baskets
+    and orders into the shard get_shard() maps the shopper to. The main database is left as it is; once
+    QHO429_SHARD_COUNT is set to shard_count, shard connections read the shopper tables of their shard in
+    its place. The shard count cannot be changed afterwards without splitting again into new files.
+
+    :param: main database path
+    :param: number of shards
+    :return: True if every shard was copied
+    """
+    copied = True
+    for shard in range(shard_count):
+        connection = create_connection(database_path, shard=shard)
+        orders = copy_shard(connection.cursor(), shard, shard_count)
+        close_database_connection(connection)
+        if orders is None:
+            copied = False
+            continue
+        print(f'{helpers.PrintColors.GREEN}Shard {shard}: {orders} orders copied to '
+              f'{get_shard_path(shard, database_path)}{helpers.PrintColors.END}')
+    return copied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Split shopper baskets and orders across shard files')
+    parser.add_argument('shard_count', type=int, help='number of shards, the value QHO429_SHARD_COUNT is set to')
+    parser.add_argument('--database', help='database path, defaults to db/qho429.db')
+    arguments = parser.parse_args()
+
+    if arguments.shard_count < 1:
+        parser.error('shard_count must be at least 1')
+    sys.exit(0 if split_shopper_data(arguments.database or get_database_path(), arguments.shard_count) else 1)
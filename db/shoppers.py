@@ -1,79 +1,160 @@
 import sqlite3
+import threading
+from collections import OrderedDict
 from sqlite3 import Cursor
-from typing import Union
+from typing import Iterator, Optional
 
 import helpers
+from db.records import OrderLine
 
+"""Upper bound on the number of shopper ids remembered by the login membership cache"""
+SHOPPER_CACHE_SIZE: int = 4096
 
-def load_shoppers_data(cursor: Cursor) -> Union[list[int], None]:
+"""Number of orders shown per order history page"""
+ORDER_HISTORY_PAGE_SIZE: int = 10
+
+"""Recently authenticated shopper ids, most recently used last"""
+_known_shopper_ids: OrderedDict = OrderedDict()
+_known_shopper_ids_lock = threading.Lock()
+
+
+def check_if_shopper_exists(cursor: Cursor, shopper_id: int) -> int:
     """
-    Function loading shopper_ids from shoppers table.
+    Function checking if the provided shopper_id matches any existing records in the shoppers table.
+
+    The lookup is a single-row primary key search. Shopper ids that were found are remembered in a bounded
+    LRU cache so that repeated logins skip the database; ids that were not found are never cached, which
+    keeps the cache correct when new shoppers are added.
 
     :param: db cursor
-    :return: None if no records found or a list of shopper ids
+    :param: shopper_id
+    :return: Current shopper id
     """
+    with _known_shopper_ids_lock:
+        if shopper_id in _known_shopper_ids:
+            _known_shopper_ids.move_to_end(shopper_id)
+            return shopper_id
+
     try:
         cursor.execute("""SELECT 
                                 shoppers.shopper_id
-                          FROM shoppers;""")
-        shopper_ids = cursor.fetchall()
-
-        if len(shopper_ids):
-            return [shopper_id[0] for shopper_id in shopper_ids]
+                          FROM shoppers
+                          WHERE shoppers.shopper_id = ?""", (shopper_id,))
+        shopper = cursor.fetchone()
+
+        if shopper:
+            with _known_shopper_ids_lock:
+                _known_shopper_ids[shopper_id] = True
+                if len(_known_shopper_ids) > SHOPPER_CACHE_SIZE:
+                    _known_shopper_ids.popitem(last=False)
+            return shopper_id
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation:\'{e}\'')
+        return None
 
-    return None
+    helpers.error(f'Invalid shopper_id. Shopper with id: \'{shopper_id}\' not found')
 
 
-def check_if_shopper_exists(cursor: Cursor, shopper_id: int) -> int:
+def forget_shopper(shopper_id: int) -> None:
     """
-    Function checking if the provided shopper_id matches any existing records in the shoppers table.
+    Function removing a shopper id from the login membership cache, e.g. after the shopper has been deleted.
 
-    :param: db cursor
     :param: shopper_id
-    :return: Current shopper id
+    :return: None
     """
-    shopper_ids = load_shoppers_data(cursor)
-
-    if shopper_ids:
-        if shopper_id in shopper_ids:
-            return shopper_id
-
-        helpers.error(f'Invalid shopper_id. Shopper with id: \'{shopper_id}\' not found')
+    with _known_shopper_ids_lock:
+        _known_shopper_ids.pop(shopper_id, None)
 
 
-def get_order_history(cursor: Cursor, shopper_id: int) -> Union[list, None]:
+def get_order_history_page(cursor: Cursor,
+                           shopper_id: int,
+                           page_size: int = ORDER_HISTORY_PAGE_SIZE,
+                           before: Optional[tuple[str, int]] = None
+                           ) -> tuple[list[OrderLine], Optional[tuple[str, int]]]:
     """
-    Function returning the most recent basket_id if the user has created one on the same day.
+    Function returning one page of the shopper's order history, most recent orders first.
+
+    Pages hold whole orders and are addressed by keyset on (order_date, order_id): pass the key returned
+    with a page as before to get the page after it. Every ordered product is listed, including repeat
+    purchases of the same product from the same seller. Archived orders are read from the archive tables
+    through the all_shopper_orders and all_ordered_products views.
 
     :param: db cursor
     :param: shopper_id
-    :return: order history
+    :param: number of orders per page
+    :param: (order_date, order_id) key the page starts after, None for the first page
+    :return: order lines of the page and the key of the next page, None if this is the last page
+    :raises: ValueError if page_size is below 1
     """
+    if page_size < 1:
+        raise ValueError(f'page_size must be at least 1, got {page_size}')
+
     try:
-        cursor.execute("""SELECT 
-                                shopper_orders.order_id,
-                                shopper_orders.order_date,
+        if before is None:
+            cursor.execute("""SELECT 
+                                    all_shopper_orders.order_id,
+                                    all_shopper_orders.order_date
+                               FROM all_shopper_orders
+                               WHERE all_shopper_orders.shopper_id = ?
+                               ORDER BY all_shopper_orders.order_date DESC, all_shopper_orders.order_id DESC
+                               LIMIT ?""", (shopper_id, page_size + 1))
+        else:
+            cursor.execute("""SELECT 
+                                    all_shopper_orders.order_id,
+                                    all_shopper_orders.order_date
+                               FROM all_shopper_orders
+                               WHERE all_shopper_orders.shopper_id = ?
+                               AND (all_shopper_orders.order_date, all_shopper_orders.order_id) < (?, ?)
+                               ORDER BY all_shopper_orders.order_date DESC, all_shopper_orders.order_id DESC
+                               LIMIT ?""", (shopper_id, before[0], before[1], page_size + 1))
+        orders = cursor.fetchall()
+        if not orders:
+            return [], None
+
+        page = orders[:page_size]
+        next_key = (page[-1][1], page[-1][0]) if len(orders) > len(page) else None
+        order_ids = [order[0] for order in page]
+        cursor.execute(f"""SELECT 
+                                all_shopper_orders.order_id,
+                                all_shopper_orders.order_date,
                                 products.product_description,
                                 sellers.seller_name AS 'Seller',
-                                '£ '||PRINTF("%.2f", ordered_products.price),
-                                ordered_products.quantity,
-                                ordered_products.ordered_product_status
-                           FROM shopper_orders
-                           INNER JOIN ordered_products ON ordered_products.order_id = shopper_orders.order_id
-                           INNER JOIN product_sellers ON product_sellers.product_id = ordered_products.product_id
-                           INNER JOIN products ON products.product_id = ordered_products.product_id
-                           INNER JOIN sellers ON sellers.seller_id = ordered_products.seller_id
-                           WHERE shopper_orders.shopper_id = ?
-                           GROUP BY products.product_id, sellers.seller_id
-                           ORDER BY shopper_orders.order_date DESC""", (shopper_id,))
-        shopper_baskets = cursor.fetchall()
-
-        if shopper_baskets:
-            return shopper_baskets
+                                '£ '||PRINTF("%.2f", all_ordered_products.price),
+                                all_ordered_products.quantity,
+                                all_ordered_products.ordered_product_status
+                           FROM all_shopper_orders
+                           INNER JOIN all_ordered_products
+                                   ON all_ordered_products.order_id = all_shopper_orders.order_id
+                           INNER JOIN products ON products.product_id = all_ordered_products.product_id
+                           INNER JOIN sellers ON sellers.seller_id = all_ordered_products.seller_id
+                           WHERE all_shopper_orders.order_id IN ({','.join('?' * len(order_ids))})
+                           ORDER BY all_shopper_orders.order_date DESC, all_shopper_orders.order_id DESC,
+                                    products.product_description""", order_ids)
+        return list(map(OrderLine._make, cursor)), next_key
     except sqlite3.Error as e:
         helpers.error(f'Unsuccessful database operation:\'{e}\'')
 
-    print(f'{helpers.PrintColors.BLUE}No orders placed by this customer{helpers.PrintColors.END}')
-    return None
+    return [], None
+
+
+def get_order_history(cursor: Cursor,
+                      shopper_id: int,
+                      page_size: int = ORDER_HISTORY_PAGE_SIZE
+                      ) -> Iterator[list[OrderLine]]:
+    """
+    Function returning a generator of the shopper's order history pages, most recent orders first. Each
+    page is only queried when the generator is advanced.
+
+    :param: db cursor
+    :param: shopper_id
+    :param: number of orders per page
+    :return: generator of order history pages
+    """
+    page, next_key = get_order_history_page(cursor, shopper_id, page_size)
+    if not page:
+        print(f'{helpers.PrintColors.BLUE}No orders placed by this customer{helpers.PrintColors.END}')
+    while page:
+        yield page
+        if next_key is None:
+            break
+        page, next_key = get_order_history_page(cursor, shopper_id, page_size, next_key)
@@ -0,0 +1,359 @@
+import argparse
+import itertools
+import math
+import os
+import random
+import shutil
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from sqlite3 import Connection, Cursor
+from typing import Iterator, NamedTuple
+
+import helpers
+from db.connect import get_database_path
+from db.migrations import SUMMARY_REBUILD_STATEMENTS, migrate
+
+
+class DatasetSize(NamedTuple):
+    shoppers: int
+    sellers: int
+    products: int
+    orders: int
+    reviews: int
+
+
+"""Named dataset sizes for the generator and the benchmark suite"""
+SCALES: dict[str, DatasetSize] = {
+    'small': DatasetSize(shoppers=1_000, sellers=50, products=500, orders=5_000, reviews=1_000),
+    'medium': DatasetSize(shoppers=100_000, sellers=500, products=2_000, orders=300_000, reviews=20_000),
+    'large': DatasetSize(shoppers=2_000_000, sellers=5_000, products=20_000, orders=5_000_000, reviews=200_000),
+}
+
+"""Zipf exponent used for product, seller and shopper popularity; higher is more skewed"""
+POPULARITY_SKEW: float = 1.1
+
+"""Rows passed to each executemany call while loading"""
+LOAD_BATCH_SIZE: int = 50_000
+
+"""Number of days of order history generated, ending today"""
+HISTORY_DAYS: int = 3 * 365
+
+ORDER_STATUSES: tuple[tuple[str, str, int], ...] = (
+    # (order_status, ordered_product_status, weight)
+    ('Complete', 'Delivered', 85),
+    ('Placed', 'Placed', 6),
+    ('Incomplete', 'Dispatched', 5),
+    ('Cancelled', 'Cancelled', 4),
+)
+FIRST_NAMES: tuple[str, ...] = ('Olivia', 'Amelia', 'Isla', 'Ava', 'Mia', 'Grace', 'Lily', 'Freya', 'Emily',
+                                'Oliver', 'George', 'Noah', 'Arthur', 'Leo', 'Harry', 'Oscar', 'Jack', 'Charlie')
+SURNAMES: tuple[str, ...] = ('Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies',
+                             'Patel', 'Wright', 'Walker', 'Evans', 'Thomas', 'Roberts', 'Khan', 'Clarke')
+COUNTIES: tuple[str, ...] = ('Bedfordshire', 'Wiltshire', 'Hampshire', 'Kent', 'Essex', 'Surrey', 'Devon',
+                             'Lancashire', 'Yorkshire', 'Norfolk', 'Cheshire', 'Dorset')
+SELLER_WORDS: tuple[str, ...] = ('Digital', 'Electro', 'Tech', 'Value', 'Direct', 'Prime', 'Bright', 'Home',
+                                 'Sound', 'Vision', 'Smart', 'Express')
+MANUFACTURERS: tuple[str, ...] = ('Sony', 'Samsung', 'LG', 'Panasonic', 'Apple', 'Huawei', 'Canon', 'Nikon',
+                                  'Bose', 'Dell', 'Lenovo', 'HP', 'Philips', 'Toshiba', 'Acer', 'JBL')
+PRODUCT_WORDS: tuple[str, ...] = ('Pro', 'Max', 'Lite', 'Plus', 'Ultra', 'Mini', 'Air', 'Neo', 'Edge', 'Go')
+REVIEW_TEXTS: dict[str, tuple[str, ...]] = {
+    'Poor': ('Stopped working after a week', 'Not as described', 'Would not buy again'),
+    'Fair': ('Could be better', 'Does the job but slow delivery', 'Average for the price'),
+    'Good': ('Happy with my purchase', 'Good value', 'Arrived on time'),
+    'Very Good': ('Very pleased, would recommend', 'Great quality for the price', 'Quick delivery'),
+    'Excellent': ('Excellent, exactly what I wanted', 'Five stars', 'Best purchase this year'),
+}
+REVIEW_WEIGHTS: tuple[int, ...] = (5, 10, 25, 30, 30)
+
+
+def zipf_cum_weights(count: int, skew: float = POPULARITY_SKEW) -> list[float]:
+    """
+    Function returning cumulative Zipf weights for ranks 1..count, for use with random.choices.
+
+    :param: number of ranks
+    :param: Zipf exponent
+    :return: cumulative weights
+    """
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _next_id(cursor: Cursor, table: str, column: str) -> int:
+    cursor.execute(f"""SELECT IFNULL(MAX({column}), 0) + 1 FROM {table}""")
+    return cursor.fetchone()[0]
+
+
+def _load(cursor: Cursor, statement: str, rows: Iterator[tuple]) -> int:
+    """
+    Function inserting rows in batches of LOAD_BATCH_SIZE.
+
+    :param: db cursor
+    :param: INSERT statement
+    :param: rows
+    :return: number of rows inserted
+    """
+    loaded = 0
+    while True:
+        batch = list(itertools.islice(rows, LOAD_BATCH_SIZE))
+        if not batch:
+            return loaded
+        cursor.executemany(statement, batch)
+        loaded += len(batch)
+
+
+def _drop_indexes_and_triggers(cursor: Cursor) -> list[str]:
+    """
+    Function dropping every secondary index and trigger, so a bulk load only writes the tables themselves.
+
+    :param: db cursor
+    :return: statements creating them again, indexes first
+    """
+    cursor.execute("""SELECT type, name, sql
+                      FROM sqlite_master
+                      WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                      ORDER BY type""")
+    dropped = cursor.fetchall()
+    for object_type, name, _ in dropped:
+        cursor.execute(f'DROP {object_type.upper()} "{name}"')
+    return [sql for _, _, sql in dropped]
+
+
+def _shopper_rows(rng: random.Random, first_id: int, count: int, today: date) -> Iterator[tuple]:
+    for shopper_id in range(first_id, first_id + count):
+        first_name = rng.choice(FIRST_NAMES)
+        surname = rng.choice(SURNAMES)
+        birth = today - timedelta(days=rng.randrange(18 * 365, 80 * 365))
+        joined = today - timedelta(days=rng.randrange(HISTORY_DAYS + 365))
+        yield (shopper_id, f'SYN{shopper_id}', first_name, surname,
+               f'{first_name.lower()}.{surname.lower()}{shopper_id}@example.com',
+               birth.isoformat() if rng.random() < 0.9 else None, rng.choice(('F', 'M', None)), joined.isoformat())
+
+
+def _seller_rows(rng: random.Random, first_id: int, count: int) -> Iterator[tuple]:
+    for seller_id in range(first_id, first_id + count):
+        name = '{} {} {}'.format(rng.choice(SELLER_WORDS), rng.choice(SELLER_WORDS), seller_id)
+        yield (seller_id, f'SYN{seller_id}', name, f'Unit {rng.randrange(1, 99)}', 'Business Park', None,
+               rng.choice(COUNTIES), 'AB{} {}XY'.format(rng.randrange(1, 99), rng.randrange(1, 9)),
+               f'sales{seller_id}@example.com')
+
+
+def _product_rows(rng: random.Random, first_id: int, count: int, categories: list[tuple[int, str]]) \
+        -> Iterator[tuple]:
+    for product_id in range(first_id, first_id + count):
+        category_id, category_description = rng.choice(categories)
+        manufacturer = rng.choice(MANUFACTURERS)
+        model = '{}{}'.format(manufacturer[:2].upper(), rng.randrange(1000, 99999))
+        description = '{} {} {} {}'.format(manufacturer, category_description.split()[0], rng.choice(PRODUCT_WORDS),
+                                           model)
+        status = rng.choices(('Available', 'Temporarily Unavailable', 'Discontinued'), (90, 6, 4))[0]
+        yield product_id, category_id, f'SYN{product_id}', description, manufacturer, model, status
+
+
+def _review_rows(rng: random.Random, item_ids: list[int], count: int, today: date) -> Iterator[tuple]:
+    cum_weights = zipf_cum_weights(len(item_ids))
+    ratings = tuple(REVIEW_TEXTS)
+    first_day = datetime.combine(today, datetime.min.time()) - timedelta(days=HISTORY_DAYS)
+    for item_id in rng.choices(item_ids, cum_weights=cum_weights, k=count):
+        rating = rng.choices(ratings, REVIEW_WEIGHTS)[0]
+        published = first_day + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+        yield item_id, rating, rng.choice(REVIEW_TEXTS[rating]), published.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate_dataset(connection: Connection, size: DatasetSize, seed: int = 0) -> dict[str, int]:
+    """
+    Function appending a synthetic, skewed dataset to an existing database. Product, seller and shopper
+    popularity follow a Zipf distribution, so a few products and shoppers account for most orders, and
+    order volume grows over the last HISTORY_DAYS days.
+
+    The database is migrated first. Every row is then loaded with executemany inside one transaction with
+    synchronous off, after the secondary indexes and triggers have been dropped; in the same transaction they
+    are created again, each index built in one pass, and what the triggers would have maintained is rebuilt
+    once: the summary tables, the product_search index and the catalog_version counter.
+
+    Never run this against the bundled database; load it into a copy.
+
+    :param: connection to the database to fill
+    :param: numbers of rows to generate
+    :param: random seed, the same seed and size always produce the same rows
+    :return: rows inserted per table
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    migrate(connection)
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("""SELECT category_id, category_description FROM categories""")
+    categories = cursor.fetchall()
+    counts: dict[str, int] = {}
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+        recreate_statements = _drop_indexes_and_triggers(cursor)
+        first_shopper_id = _next_id(cursor, 'shoppers', 'shopper_id')
+        first_seller_id = _next_id(cursor, 'sellers', 'seller_id')
+        first_product_id = _next_id(cursor, 'products', 'product_id')
+        first_order_id = _next_id(cursor, 'shopper_orders', 'order_id')
+        first_basket_id = _next_id(cursor, 'shopper_baskets', 'basket_id')
+
+        counts['shoppers'] = _load(cursor, """INSERT INTO
+                                                   shoppers (shopper_id, shopper_account_ref, shopper_first_name,
+                                                             shopper_surname, shopper_email_address, date_of_birth,
+                                                             gender, date_joined)
+                                                   VALUES(?,?,?,?,?,?,?,?)""",
+                                   _shopper_rows(rng, first_shopper_id, size.shoppers, today))
+        counts['sellers'] = _load(cursor, """INSERT INTO
+                                                  sellers (seller_id, seller_account_ref, seller_name,
+                                                           seller_address_line1, seller_address_line2,
+                                                           seller_address_line3, seller_county, seller_post_code,
+                                                           seller_email_address)
+                                                  VALUES(?,?,?,?,?,?,?,?,?)""",
+                                  _seller_rows(rng, first_seller_id, size.sellers))
+        counts['products'] = _load(cursor, """INSERT INTO
+                                                   products (product_id, category_id, product_code,
+                                                             product_description, product_manufacturer,
+                                                             product_model, product_status)
+                                                   VALUES(?,?,?,?,?,?,?)""",
+                                   _product_rows(rng, first_product_id, size.products, categories))
+
+        # Offers: every product is sold by 1-8 sellers, popular sellers carry more of the catalogue
+        seller_ids = list(range(first_seller_id, first_seller_id + size.sellers))
+        seller_weights = zipf_cum_weights(size.sellers)
+        offers: list[list[tuple[int, float]]] = []
+        for _ in range(size.products):
+            base_price = round(math.exp(rng.gauss(4.5, 1.0)), 2)
+            sellers = set(rng.choices(seller_ids, cum_weights=seller_weights, k=rng.randint(1, 8)))
+            offers.append([(seller_id, round(base_price * rng.uniform(0.85, 1.15), 2)) for seller_id in sellers])
+        counts['product_sellers'] = _load(cursor, """INSERT INTO
+                                                          product_sellers (product_id, seller_id, price)
+                                                          VALUES(?,?,?)""",
+                                          ((first_product_id + index, seller_id, price)
+                                           for index, product_offers in enumerate(offers)
+                                           for seller_id, price in product_offers))
+
+        # Orders: shoppers are ranked in a random order so the heaviest buyers are spread over the id range,
+        # and order dates follow a square root curve so recent days are the busiest
+        shopper_ranking = list(range(first_shopper_id, first_shopper_id + size.shoppers))
+        rng.shuffle(shopper_ranking)
+        shopper_weights = zipf_cum_weights(size.shoppers, POPULARITY_SKEW / 2)
+        product_indexes = list(range(size.products))
+        product_weights = zipf_cum_weights(size.products)
+        statuses = [(order_status, line_status) for order_status, line_status, _ in ORDER_STATUSES]
+        status_weights = [weight for _, _, weight in ORDER_STATUSES]
+        first_day = today - timedelta(days=HISTORY_DAYS)
+        order_lines: list[tuple] = []
+
+        def order_rows() -> Iterator[tuple]:
+            shopper_choices = iter(())
+            for number in range(size.orders):
+                if number % LOAD_BATCH_SIZE == 0:
+                    shopper_choices = iter(rng.choices(shopper_ranking, cum_weights=shopper_weights,
+                                                       k=LOAD_BATCH_SIZE))
+                order_id = first_order_id + number
+                order_date = first_day + timedelta(days=int(HISTORY_DAYS * math.sqrt(number / size.orders)))
+                order_status, line_status = rng.choices(statuses, status_weights)[0]
+                for index in set(rng.choices(product_indexes, cum_weights=product_weights,
+                                             k=rng.choices((1, 2, 3, 4), (50, 30, 15, 5))[0])):
+                    seller_id, price = rng.choice(offers[index])
+                    order_lines.append((order_id, first_product_id + index, seller_id,
+                                        rng.choices((1, 2, 3, 4, 5), (70, 18, 7, 3, 2))[0], price, line_status))
+                yield order_id, next(shopper_choices), order_date.isoformat(), order_status
+
+        counts['shopper_orders'] = 0
+        counts['ordered_products'] = 0
+        rows = order_rows()
+        while True:
+            orders = list(itertools.islice(rows, LOAD_BATCH_SIZE))
+            if not orders:
+                break
+            cursor.executemany("""INSERT INTO
+                                        shopper_orders (order_id, shopper_id, order_date, order_status)
+                                        VALUES(?,?,?,?)""", orders)
+            cursor.executemany("""INSERT INTO
+                                        ordered_products (order_id, product_id, seller_id, quantity, price,
+                                                          ordered_product_status)
+                                        VALUES(?,?,?,?,?,?)""", order_lines)
+            counts['shopper_orders'] += len(orders)
+            counts['ordered_products'] += len(order_lines)
+            order_lines.clear()
+
+        # Open baskets for 1% of shoppers, some of them left over from previous days
+        basket_shoppers = rng.sample(shopper_ranking, max(1, size.shoppers // 100))
+        baskets = [(first_basket_id + number, shopper_id,
+                    (today - timedelta(days=rng.choices((0, rng.randrange(1, 30)), (60, 40))[0])).isoformat())
+                   for number, shopper_id in enumerate(basket_shoppers)]
+        counts['shopper_baskets'] = _load(cursor, """INSERT INTO
+                                                          shopper_baskets (basket_id, shopper_id,
+                                                                           basket_created_date_time)
+                                                          VALUES(?,?,?)""", iter(baskets))
+        basket_lines = []
+        for basket_id, _, _ in baskets:
+            for index in set(rng.choices(product_indexes, cum_weights=product_weights, k=rng.randint(1, 3))):
+                seller_id, price = rng.choice(offers[index])
+                basket_lines.append((basket_id, first_product_id + index, seller_id, rng.randint(1, 3), price))
+        counts['basket_contents'] = _load(cursor, """INSERT INTO
+                                                          basket_contents (basket_id, product_id, seller_id,
+                                                                           quantity, price)
+                                                          VALUES(?,?,?,?,?)""", iter(basket_lines))
+
+        product_ids = list(range(first_product_id, first_product_id + size.products))
+        counts['product_reviews'] = _load(cursor, """INSERT INTO
+                                                          product_reviews (product_id, rating, content,
+                                                                           published_date)
+                                                          VALUES(?,?,?,?)""",
+                                          _review_rows(rng, product_ids, size.reviews - size.reviews // 4, today))
+        counts['seller_reviews'] = _load(cursor, """INSERT INTO
+                                                         seller_reviews (seller_id, rating, content, published_date)
+                                                         VALUES(?,?,?,?)""",
+                                         _review_rows(rng, seller_ids, size.reviews // 4, today))
+
+        for statement in recreate_statements:
+            cursor.execute(statement)
+        for statement in SUMMARY_REBUILD_STATEMENTS:
+            cursor.execute(statement)
+        cursor.execute("""INSERT INTO product_search (product_search) VALUES ('rebuild')""")
+        cursor.execute("""UPDATE catalog_version SET version = version + 1""")
+        cursor.execute("COMMIT")
+    except sqlite3.Error as e:
+        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+        if connection.in_transaction:
+            cursor.execute("ROLLBACK")
+        return {}
+    finally:
+        cursor.execute("PRAGMA synchronous = NORMAL")
+
+    cursor.execute("ANALYZE")
+    return counts
+
+
+def create_dataset(target_path: str, size: DatasetSize, seed: int = 0) -> dict[str, int]:
+    """
+    Function copying the bundled database to target_path and filling the copy with generate_dataset().
+
+    :param: path of the database to create; it must not exist yet
+    :param: numbers of rows to generate
+    :param: random seed
+    :return: rows inserted per table
+    """
+    if os.path.exists(target_path):
+        raise FileExistsError(target_path)
+    shutil.copyfile(get_database_path(), target_path)
+    connection = sqlite3.connect(target_path)
+    try:
+        return generate_dataset(connection, size, seed)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create a copy of db/qho429.db filled with synthetic data')
+    parser.add_argument('output', help='path of the database to create')
+    parser.add_argument('--scale', choices=SCALES, default='medium', help='dataset size')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    inserted = create_dataset(arguments.output, SCALES[arguments.scale], arguments.seed)
+    for table, rows in inserted.items():
+        print(f'{table:>18} {rows:>10}')
+    print(f'{helpers.PrintColors.GREEN}Generated {arguments.scale} dataset in '
+          f'{time.perf_counter() - start:.1f}s{helpers.PrintColors.END}')
@@ -0,0 +1,228 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from sqlite3 import Cursor
+from typing import Callable, Optional
+
+import helpers
+from db import basket
+from db.connect import close_database_connection, create_connection
+
+
+class SerializedWriter:
+    """
+    A single thread owning the only read-write connection and running queued write functions one at a time,
+    in the order they were submitted. Paired with a ConnectionPool of read-only connections, reads scale
+    across threads while writers never contend for the database lock, so basket and order mutations never
+    wait on SQLITE_BUSY.
+
+    Queued functions take the writer's cursor as their first argument, like the functions in db.basket,
+    and run their own transactions. What they print is replayed on the thread waiting for the result.
+    When shopper data is sharded each shard takes writes independently, so there is one writer per shard.
+    """
+
+    def __init__(self, database_path: Optional[str] = None, max_queued: int = 0,
+                 shard: Optional[int] = None) -> None:
+        self.database_path: Optional[str] = database_path
+        self.shard: Optional[int] = shard
+        self._queue: queue.Queue = queue.Queue(max_queued)
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, function: Callable, *arguments) -> Future:
+        """
+        Function queueing a write function call.
+
+        :param: function taking a cursor followed by the arguments
+        :param: arguments
+        :return: Future resolving to (return value, printed output)
+        """
+        future = Future()
+        self._queue.put((future, function, arguments))
+        return future
+
+    def call(self, function: Callable, *arguments) -> object:
+        """
+        Function queueing a write function call and waiting for it to run. Anything the function printed
+        is printed again on the calling thread.
+
+        :param: function taking a cursor followed by the arguments
+        :param: arguments
+        :return: the function's return value
+        """
+        result, printed = self.submit(function, *arguments).result()
+        if printed:
+            print(printed, end='')
+        return result
+
+    def _run(self) -> None:
+        connection = create_connection(self.database_path, shard=self.shard)
+        cursor: Cursor = connection.cursor()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._run_job(cursor, job)
+        close_database_connection(connection)
+
+    @staticmethod
+    def _run_job(cursor: Cursor, job: tuple) -> None:
+        """
+        Function running one queued call on its own and resolving its future.
+
+        :param: writer cursor
+        :param: (future, function, arguments)
+        :return: None
+        """
+        future, function, arguments = job
+        if not future.set_running_or_notify_cancel():
+            return None
+        try:
+            with helpers.capture_output() as printed:
+                result = function(cursor, *arguments)
+            future.set_result((result, printed.getvalue()))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            if cursor.connection.in_transaction:
+                cursor.connection.rollback()
+        return None
+
+    def close(self) -> None:
+        """
+        Function letting the queued calls finish, then stopping the writer thread and closing its connection.
+
+        :return: None
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+
+"""
+db.basket functions a GroupCommitWriter can batch, mapped to (function running their statements inside the
+caller's transaction, value returned to the caller when the statements fail, message the function prints once
+its transaction has committed, None if it prints nothing)
+"""
+GROUP_COMMIT_FUNCTIONS: dict[Callable, tuple[Callable, object, Optional[str]]] = {
+    basket.add_item_to_basket: (basket.insert_basket_item, None, basket.ITEM_ADDED_MESSAGE),
+    basket.update_item_quantity_in_basket_contents: (basket.update_basket_item_quantity, False, None),
+    basket.delete_item_from_basket_contents: (basket.delete_basket_item, False, None),
+}
+
+"""Default time a GroupCommitWriter waits for more mutations after the first one of a batch"""
+DEFAULT_GROUP_COMMIT_WINDOW_MS: float = 2.0
+
+"""Default largest number of mutations committed in one transaction"""
+DEFAULT_GROUP_COMMIT_MAX_BATCH: int = 64
+
+
+class GroupCommitWriter(SerializedWriter):
+    """
+    SerializedWriter committing basket mutations from many sessions in one transaction.
+
+    When a call to one of GROUP_COMMIT_FUNCTIONS reaches the front of the queue, the writer opens a
+    transaction and keeps taking mutations until window_ms has passed since the first one, max_batch
+    mutations are in the batch, or a call that cannot be batched (e.g. checkout) is next. Each mutation
+    runs inside its own savepoint, so a failing one is rolled back and reported to its caller alone, and
+    the batch is committed once. No caller gets its result before the COMMIT, so a mutation is never
+    acknowledged and then lost; if the COMMIT itself fails, every call in the batch fails. A mutation raising
+    anything but sqlite3.Error rolls the whole batch back and every call in it raises that exception.
+
+    Trade-offs: each mutation waits up to window_ms longer for its result, in exchange for one commit per
+    batch instead of one per mutation. With the default synchronous=NORMAL under WAL a commit only appends
+    to the WAL without an fsync, so the gain is the per-transaction overhead; with synchronous=FULL every
+    commit is an fsync and batching saves one fsync per mutation in the batch.
+    """
+
+    def __init__(self, database_path: Optional[str] = None, window_ms: float = DEFAULT_GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = DEFAULT_GROUP_COMMIT_MAX_BATCH, max_queued: int = 0,
+                 shard: Optional[int] = None) -> None:
+        self.window: float = window_ms / 1000
+        self.max_batch: int = max_batch
+        self.batches: int = 0
+        self.batched_calls: int = 0
+        super().__init__(database_path, max_queued, shard)
+
+    def _run(self) -> None:
+        connection = create_connection(self.database_path, shard=self.shard)
+        cursor: Cursor = connection.cursor()
+        job = self._queue.get()
+        while job is not None:
+            if job[1] not in GROUP_COMMIT_FUNCTIONS:
+                self._run_job(cursor, job)
+                job = self._queue.get()
+                continue
+
+            batch = [job]
+            fetch_next = True
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if job is None or job[1] not in GROUP_COMMIT_FUNCTIONS:
+                    fetch_next = False
+                    break
+                batch.append(job)
+            self._commit_batch(cursor, batch)
+            if fetch_next:
+                job = self._queue.get()
+        close_database_connection(connection)
+
+    def _commit_batch(self, cursor: Cursor, batch: list[tuple]) -> None:
+        """
+        Function running a batch of mutations in one transaction, each in its own savepoint, and resolving
+        their futures once the transaction has committed. Calls that succeeded get the message their function
+        prints after its own COMMIT added to their output. Any other exception than sqlite3.Error rolls the
+        whole batch back and is set on the futures of every call in it.
+
+        :param: writer cursor
+        :param: list of (future, function, arguments)
+        :return: None
+        """
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+            for future, function, arguments in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                statements, failure, success_message = GROUP_COMMIT_FUNCTIONS[function]
+                with helpers.capture_output() as printed:
+                    cursor.execute("SAVEPOINT group_commit_call")
+                    try:
+                        result = statements(cursor, *arguments)
+                    except sqlite3.Error as e:
+                        helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+                        cursor.execute("ROLLBACK TO group_commit_call")
+                        result = failure
+                        success_message = None
+                    cursor.execute("RELEASE group_commit_call")
+                results.append((future, result, printed.getvalue(), success_message))
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            if cursor.connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            with helpers.capture_output() as printed:
+                helpers.error(f'Unsuccessful database operation. Rolling back... \'{e}\'')
+            for future, function, arguments in batch:
+                if not future.done():
+                    future.set_result((GROUP_COMMIT_FUNCTIONS[function][1], printed.getvalue()))
+            return None
+        except BaseException as e:
+            if cursor.connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            for future, function, arguments in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return None
+
+        self.batches += 1
+        self.batched_calls += len(results)
+        for future, result, printed, success_message in results:
+            if success_message is not None:
+                printed += f'{success_message}\n'
+            future.set_result((result, printed))
+        return None
@@ -0,0 +1,226 @@
+import json
+import re
+import sys
+from contextlib import ExitStack
+from sqlite3 import Cursor
+from typing import Optional, TextIO
+
+from helpers import capture_output
+from db.basket import BasketSession
+from db.connect import ConnectionPool, get_pool
+from db.inventory import (SEARCH_RESULT_LIMIT, get_category_products, get_product, get_product_categories,
+                          get_product_offer, get_product_sellers, search_products)
+from db.shoppers import ORDER_HISTORY_PAGE_SIZE, check_if_shopper_exists, get_order_history_page
+from db.writer import SerializedWriter
+
+"""Pattern matching the ANSI colour codes the db functions print with"""
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class CommandError(Exception):
+    """
+    Raised by a command handler when the command cannot be carried out; the message is returned to the client.
+    """
+
+
+def _int_argument(command: dict, name: str, required: bool = True, minimum: Optional[int] = None) -> Optional[int]:
+    """
+    Function reading an integer argument from a command.
+
+    :param: command
+    :param: argument name
+    :param: whether the argument must be present
+    :param: smallest value accepted, None for any
+    :return: int, None if it is optional and missing
+    """
+    value = command.get(name)
+    if value is None and not required:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise CommandError(f'\'{name}\' must be an integer')
+    if minimum is not None and value < minimum:
+        raise CommandError(f'\'{name}\' must be at least {minimum}')
+    return value
+
+
+class HeadlessSession:
+    """
+    One client's state in headless mode: the logged in shopper and their basket. Commands are dicts with a
+    'command' key and return JSON-serialisable dicts. With a writer, basket changes are queued on it and
+    the cursor is only used for reads. With a pool whose shopper data is sharded, each login checks out a
+    connection to the shopper's shard and the session runs on it until the next login or close().
+    """
+
+    def __init__(self, cursor: Cursor, writer: Optional[SerializedWriter] = None,
+                 pool: Optional[ConnectionPool] = None) -> None:
+        self.cursor: Cursor = cursor
+        self.writer: Optional[SerializedWriter] = writer
+        self.pool: Optional[ConnectionPool] = pool
+        self.basket: Optional[BasketSession] = None
+        self._shard_checkout = ExitStack()
+        self.handlers = {'login': self.login, 'browse': self.browse, 'basket': self.view_basket, 'add': self.add,
+                         'update': self.update, 'remove': self.remove, 'checkout': self.checkout,
+                         'history': self.history, 'search': self.search}
+
+    def handle(self, command: dict) -> dict:
+        """
+        Function running one command. Anything the db functions print is captured, stripped of colours and
+        returned as the error message when the command fails. An unexpected exception fails only the command
+        that raised it, so the session keeps serving the next ones.
+
+        :param: command
+        :return: result with 'ok' set to True, or 'ok' False and an 'error'
+        """
+        with capture_output() as messages:
+            try:
+                handler = self.handlers.get(command.get('command'))
+                if handler is None:
+                    raise CommandError('Unknown command, expected one of: {}'.format(', '.join(self.handlers)))
+                result = handler(command)
+                result['ok'] = True
+            except CommandError as e:
+                printed = ' '.join(ANSI_ESCAPE.sub('', messages.getvalue()).split())
+                result = {'ok': False, 'error': f'{e} {printed}'.strip()}
+            except Exception as e:
+                result = {'ok': False, 'error': f'Internal error: {type(e).__name__}: {e}'}
+        if 'id' in command:
+            result['id'] = command['id']
+        return result
+
+    def _require_basket(self) -> BasketSession:
+        if self.basket is None:
+            raise CommandError('Not logged in')
+        return self.basket
+
+    def close(self) -> None:
+        """
+        Function returning the shard connection checked out by the last login to the pool.
+
+        :return: None
+        """
+        self._shard_checkout.close()
+
+    def login(self, command: dict) -> dict:
+        shopper_id = _int_argument(command, 'shopper_id')
+        if self.pool is not None and self.pool.shard_count:
+            self.basket = None
+            self._shard_checkout.close()
+            self.cursor = self._shard_checkout.enter_context(self.pool.connection(shopper_id=shopper_id)).cursor()
+        shopper_id = check_if_shopper_exists(self.cursor, shopper_id)
+        if not shopper_id:
+            raise CommandError('Login failed')
+        self.basket = BasketSession(self.cursor, shopper_id, self.writer)
+        return {'shopper_id': shopper_id, 'basket_id': self.basket.basket_id}
+
+    def browse(self, command: dict) -> dict:
+        product_id = _int_argument(command, 'product_id', required=False)
+        category_id = _int_argument(command, 'category_id', required=False)
+        if product_id is not None:
+            options = get_product_sellers(self.cursor, product_id)
+        elif category_id is not None:
+            options = get_category_products(self.cursor, category_id)
+        else:
+            options = get_product_categories(self.cursor)
+        if not options:
+            raise CommandError('Nothing to browse')
+        return {'options': [option._asdict() for _, option in options]}
+
+    def search(self, command: dict) -> dict:
+        text = command.get('text')
+        if not isinstance(text, str):
+            raise CommandError('\'text\' must be a string')
+        limit = _int_argument(command, 'limit', required=False, minimum=1) or SEARCH_RESULT_LIMIT
+        options = search_products(self.cursor, text, limit)
+        if not options:
+            raise CommandError('No products found')
+        return {'options': [option._asdict() for _, option in options]}
+
+    def view_basket(self, command: dict) -> dict:
+        basket = self._require_basket()
+        contents = basket.get_contents() or []
+        return {'basket_id': basket.basket_id, 'lines': [line._asdict() for _, line in contents],
+                'total': round(basket.total, 2)}
+
+    def add(self, command: dict) -> dict:
+        basket = self._require_basket()
+        product_id = _int_argument(command, 'product_id')
+        seller_id = _int_argument(command, 'seller_id')
+        quantity = _int_argument(command, 'quantity')
+        if quantity < 1:
+            raise CommandError('\'quantity\' must be at least 1')
+        if basket.contains(product_id):
+            raise CommandError('Product already in basket, use update')
+        product = get_product(self.cursor, product_id)
+        seller = get_product_offer(self.cursor, product_id, seller_id)
+        if not product or not seller:
+            raise CommandError('Could not add to basket')
+        if not basket.add(product_id, product.product_description, seller_id, seller.seller_name, quantity,
+                          seller.price):
+            raise CommandError('Could not add to basket')
+        return self.view_basket(command)
+
+    def update(self, command: dict) -> dict:
+        quantity = _int_argument(command, 'quantity')
+        if quantity < 1:
+            raise CommandError('\'quantity\' must be at least 1, use remove to delete a product')
+        if not self._require_basket().update_quantity(_int_argument(command, 'product_id'), quantity):
+            raise CommandError('Product not in basket')
+        return self.view_basket(command)
+
+    def remove(self, command: dict) -> dict:
+        if not self._require_basket().remove(_int_argument(command, 'product_id')):
+            raise CommandError('Product not in basket')
+        return self.view_basket(command)
+
+    def checkout(self, command: dict) -> dict:
+        order_id = self._require_basket().checkout()
+        if not order_id:
+            raise CommandError('Checkout failed')
+        return {'order_id': order_id}
+
+    def history(self, command: dict) -> dict:
+        basket = self._require_basket()
+        page_size = _int_argument(command, 'page_size', required=False, minimum=1) or ORDER_HISTORY_PAGE_SIZE
+        before = command.get('before')
+        if before is not None:
+            if not (isinstance(before, list) and len(before) == 2 and isinstance(before[1], int)):
+                raise CommandError('\'before\' must be the [order_date, order_id] returned as \'next\'')
+            before = (str(before[0]), before[1])
+        lines, next_key = get_order_history_page(self.cursor, basket.shopper_id, page_size, before)
+        return {'lines': [line._asdict() for line in lines], 'next': list(next_key) if next_key else None}
+
+
+def run_headless(input_stream: TextIO = None, output_stream: TextIO = None) -> None:
+    """
+    Function reading one JSON command per line and writing one JSON result per line, all through one
+    connection, or the connection to the logged in shopper's shard when shopper data is sharded, until the
+    input ends.
+
+    :param: stream of commands, defaults to stdin
+    :param: stream for results, defaults to stdout
+    :return: None
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    with get_pool().connection() as connection:
+        session = HeadlessSession(connection.cursor(), pool=get_pool())
+        for line in input_stream:
+            if not line.strip():
+                continue
+            try:
+                command = json.loads(line)
+            except ValueError as e:
+                command = None
+                result = {'ok': False, 'error': f'Invalid JSON: {e}'}
+            if isinstance(command, dict):
+                result = session.handle(command)
+            elif command is not None:
+                result = {'ok': False, 'error': 'A command must be a JSON object'}
+            output_stream.write(json.dumps(result) + '\n')
+            output_stream.flush()
+        session.close()
+    get_pool().close()
+
+
+if __name__ == '__main__':
+    run_headless()
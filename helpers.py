@@ -1,5 +1,10 @@
+import io
 import os
-from typing import NewType, Union
+import sys
+import threading
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Iterator, NewType, TextIO, Union
 from tui import user_numerical_entry
 
 
@@ -34,63 +39,125 @@ def error(error_msg: str) -> None:
     print(f'{PrintColors.FAIL}Error! {error_msg}.{PrintColors.END}')
 
 
+class _ThreadOutput(io.TextIOBase):
+    """
+    Stand-in for sys.stdout that sends each thread's output to the buffer it is capturing into, if any, and
+    everything else to the original stream. contextlib.redirect_stdout swaps sys.stdout for the whole
+    process, which mixes up output when several threads run commands at once.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        super().__init__()
+        self.stream: TextIO = stream
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        return (getattr(self.local, 'buffer', None) or self.stream).write(text)
+
+    def flush(self) -> None:
+        (getattr(self.local, 'buffer', None) or self.stream).flush()
+
+    def isatty(self) -> bool:
+        return getattr(self.local, 'buffer', None) is None and self.stream.isatty()
+
+    def fileno(self) -> int:
+        return self.stream.fileno()
+
+
+@contextmanager
+def capture_output() -> Iterator[io.StringIO]:
+    """
+    Context manager capturing what the calling thread prints, leaving other threads' output alone. Captures
+    can be nested.
+
+    :return: buffer holding the captured output
+    """
+    if not isinstance(sys.stdout, _ThreadOutput):
+        sys.stdout = _ThreadOutput(sys.stdout)
+    previous = getattr(sys.stdout.local, 'buffer', None)
+    buffer = io.StringIO()
+    sys.stdout.local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        sys.stdout.local.buffer = previous
+
+
 def get_root_dir() -> str:
     """
-    Function returning the path to the root of the project
+    Function returning the path to the root of the project, the directory holding this module, whatever the
+    current working directory
 
     :param: None
     :return: str
     """
-    return os.path.dirname(os.path.abspath('main.py'))
+    return os.path.dirname(os.path.abspath(__file__))
 
 
-def compile_options_for_printing(options: list[list]) -> list[list[Union[int, list]]]:
+def compile_options_for_printing(options: list[tuple]) -> list[tuple[int, tuple]]:
     """
-    Function preparing options for printing
+    Function preparing options for printing. The options are sorted in place by their second field and
+    numbered from 1 in a single pass.
 
     :param: options list
     :return: compiled list of options
     """
-    options.sort(key=lambda tup: tup[1])
-    numbered: list[list[Union[int, list]]] = []
-    for option in options:
-        index = options.index(option)
-        numbered.append([int(index) + 1, option])
-    return numbered
+    options.sort(key=itemgetter(1))
+    return list(enumerate(options, start=1))
 
 
-def print_options(options: list[list[Union[int, list]]], title: str) -> None:
+def print_options(options: list[tuple[int, tuple]], title: str) -> None:
     """
-    Function printing available options
+    Function printing available options in one buffered write, paged to the terminal height
 
     :param: options list
     :param: options title
     :return: None
     """
-    print(f'{PrintColors.BLUE}{title} \n{PrintColors.END}')
-    for option in options:
-        additional_property = ''
-        if len(option[1]) == 3:
-            additional_property = '(£{})'.format(option[1][2])
-        print(f'{option[0]}. {option[1][1]} {additional_property}')
+    # render imports this module, so it is imported on first use
+    from render import write_paged
+
+    def option_lines() -> Iterator[str]:
+        yield f'{PrintColors.BLUE}{title} \n{PrintColors.END}'
+        for option in options:
+            additional_property = ''
+            if len(option[1]) == 3:
+                additional_property = '(£{})'.format(option[1][2])
+            yield f'{option[0]}. {option[1][1]} {additional_property}'
 
+    write_paged(option_lines())
 
-def get_chosen_option_id(options: list[list[Union[int, list]]], message: str) -> Union[int, None]:
+
+def get_chosen_option(options: list[tuple[int, tuple]], message: str) -> Union[tuple, None]:
     """
-    Function prompting the user for their chosen option and returning the option's id
+    Function prompting the user for their chosen option and returning the option's record
 
     :param: options list
     :param: options title
-    :return: str
+    :return: chosen option record
     """
     chosen_number: int = user_numerical_entry(f'{message}')
-    chosen_option = [item for item in options if item[0] == chosen_number]
-    if len(chosen_option):
-        return chosen_option[0][1][0]
+    if 1 <= chosen_number <= len(options) and options[chosen_number - 1][0] == chosen_number:
+        return options[chosen_number - 1][1]
 
     error(f'Options available range from 1 to {len(options)}')
     return None
 
 
+def get_chosen_option_id(options: list[tuple[int, tuple]], message: str) -> Union[int, None]:
+    """
+    Function prompting the user for their chosen option and returning the option's id
+
+    :param: options list
+    :param: options title
+    :return: str
+    """
+    chosen_option = get_chosen_option(options, message)
+    if chosen_option:
+        return chosen_option[0]
+
+    return None
+
+
 """Separator "line" used to improve the visual representation of CLI logical blocks"""
 separator: str = '-' * 50
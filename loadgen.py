@@ -0,0 +1,296 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import redirect_stdout
+from sqlite3 import Cursor
+from typing import Callable, Optional
+
+import helpers
+from db.basket import BasketSession
+from db.connect import ConnectionPool, get_database_path, get_shard_count
+from db.inventory import get_category_products, get_product_categories, get_product_offer, get_product_sellers
+from db.profiling import enable_profiling
+from db.shoppers import check_if_shopper_exists
+
+"""Default share of each operation in the simulated sessions; shares are relative and need not sum to 1"""
+DEFAULT_OPERATION_MIX: dict[str, float] = {'browse': 0.4, 'add': 0.3, 'update': 0.15, 'checkout': 0.15}
+
+"""Default number of operations a simulated shopper runs after logging in"""
+DEFAULT_SESSION_OPERATIONS: int = 10
+
+"""Shoppers and offers sampled from the database for the workers to pick from"""
+SAMPLE_SIZE: int = 10_000
+
+"""Largest quantity a simulated shopper adds or updates to"""
+MAX_QUANTITY: int = 5
+
+"""Latency percentiles reported for each operation"""
+PERCENTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+
+
+def _browse(cursor: Cursor, session: BasketSession, generator: random.Random, workload: dict) -> Optional[bool]:
+    get_product_categories(cursor)
+    products = get_category_products(cursor, generator.choice(workload['category_ids']))
+    if products:
+        get_product_sellers(cursor, generator.choice(products)[1].product_id)
+    return True
+
+
+def _add(cursor: Cursor, session: BasketSession, generator: random.Random, workload: dict) -> Optional[bool]:
+    product_id, seller_id = generator.choice(workload['offers'])
+    if session.contains(product_id):
+        return None
+    offer = get_product_offer(cursor, product_id, seller_id)
+    if offer is None:
+        return False
+    return session.add(product_id, '', seller_id, offer.seller_name, generator.randint(1, MAX_QUANTITY), offer.price)
+
+
+def _update(cursor: Cursor, session: BasketSession, generator: random.Random, workload: dict) -> Optional[bool]:
+    if not session.lines:
+        return None
+    return session.update_quantity(generator.choice(list(session.lines)), generator.randint(1, MAX_QUANTITY))
+
+
+def _checkout(cursor: Cursor, session: BasketSession, generator: random.Random, workload: dict) -> Optional[bool]:
+    if not session.basket_id:
+        return None
+    return session.checkout() is not None
+
+
+"""
+Operations a simulated shopper can run, taking (cursor, basket session, random generator, workload) and
+returning True when the operation succeeded, False when it failed and None when it did not apply, e.g. an
+update with an empty basket
+"""
+OPERATIONS: dict[str, Callable[[Cursor, BasketSession, random.Random, dict], Optional[bool]]] = {
+    'browse': _browse,
+    'add': _add,
+    'update': _update,
+    'checkout': _checkout,
+}
+
+
+def parse_operation_mix(text: str) -> dict[str, float]:
+    """
+    Function parsing an operation mix such as 'browse=40,add=30,update=15,checkout=15'.
+
+    :param: comma separated operation=share pairs
+    :return: share of each operation
+    """
+    mix = {}
+    for pair in text.split(','):
+        operation, _, share = pair.partition('=')
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation \'{operation}\', expected one of: '
+                                             f'{", ".join(OPERATIONS)}')
+        mix[operation] = float(share)
+    if not any(share > 0 for share in mix.values()):
+        raise argparse.ArgumentTypeError('at least one operation needs a share above 0')
+    return mix
+
+
+def run_worker(database_path: str, seed: int, duration: float, mix: dict[str, float], session_operations: int,
+               workload: dict, busy_timeout_ms: Optional[int] = None) -> dict:
+    """
+    Function run in each load generator process: simulates shopper sessions until duration has passed. Each
+    session logs a random shopper in with check_if_shopper_exists, loads their basket and runs
+    session_operations operations picked at random with the weights in mix, all through one connection of
+    the process, routed to the shopper's shard when shopper data is sharded.
+
+    Statements are timed by the profiling cursor, so the time spent in BEGIN, which waits for the write lock
+    under busy_timeout, is the lock wait, and statements that still found the database locked are counted as
+    busy errors.
+
+    :param: database path
+    :param: random seed
+    :param: seconds to run for
+    :param: share of each operation
+    :param: operations per session after logging in
+    :param: dict of the shopper_ids, (product_id, seller_id) offers and category_ids to pick from
+    :param: busy_timeout replacing the one set by db.connect
+    :return: dict of per-operation latencies, outcome counts and lock counters
+    """
+    profile = enable_profiling()
+    generator = random.Random(seed)
+    operations, weights = list(mix), list(mix.values())
+    latencies: dict[str, list[float]] = collections.defaultdict(list)
+    outcomes: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    pool = ConnectionPool(database_path, max_connections=1)
+    sessions = 0
+    deadline = time.perf_counter() + duration
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        while time.perf_counter() < deadline:
+            shopper_id = generator.choice(workload['shopper_ids'])
+            with pool.connection(shopper_id=shopper_id) as connection:
+                if busy_timeout_ms is not None:
+                    connection.execute(f"""PRAGMA busy_timeout={int(busy_timeout_ms)}""")
+                cursor = connection.cursor()
+                start = time.perf_counter()
+                session = BasketSession(cursor, shopper_id) if check_if_shopper_exists(cursor, shopper_id) else None
+                latencies['login'].append(time.perf_counter() - start)
+                outcomes['login']['ok' if session else 'failed'] += 1
+                sessions += 1
+                for _ in range(session_operations if session else 0):
+                    operation = generator.choices(operations, weights)[0]
+                    start = time.perf_counter()
+                    result = OPERATIONS[operation](cursor, session, generator, workload)
+                    if result is None:
+                        outcomes[operation]['skipped'] += 1
+                        continue
+                    latencies[operation].append(time.perf_counter() - start)
+                    outcomes[operation]['ok' if result else 'failed'] += 1
+    pool.close()
+
+    lock_waits = [stats for statement, stats in profile.statements.items() if statement.upper().startswith('BEGIN')]
+    return {'sessions': sessions,
+            'latencies': dict(latencies),
+            'outcomes': {operation: dict(counts) for operation, counts in outcomes.items()},
+            'lock_wait_seconds': sum(stats.total_seconds for stats in lock_waits),
+            'lock_wait_max_seconds': max((stats.max_seconds for stats in lock_waits), default=0.0),
+            'busy_errors': profile.busy_errors,
+            'rollbacks': profile.rollbacks,
+            'commits': profile.commits}
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run_load(processes: int, duration: float, mix: dict[str, float],
+             session_operations: int = DEFAULT_SESSION_OPERATIONS, database_path: Optional[str] = None,
+             scale: Optional[str] = None, seed: int = 0, busy_timeout_ms: Optional[int] = None) -> dict:
+    """
+    Function running the load generator: copies the database, or builds a synthetic dataset of the given
+    scale, into a scratch directory, splits the copy into shards when QHO429_SHARD_COUNT is set, and runs
+    processes worker processes against it for duration seconds. The sampled shoppers are dealt out between
+    the processes, as a shopper's concurrent sessions would otherwise check out each other's baskets.
+
+    :param: number of worker processes
+    :param: seconds each worker runs for
+    :param: share of each operation
+    :param: operations per session after logging in
+    :param: database to copy, defaults to get_database_path()
+    :param: db.synthetic scale to generate instead of copying
+    :param: random seed
+    :param: busy_timeout of the worker connections, defaults to the one set by db.connect
+    :return: dict of the merged results, as printed by print_load_report
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        copy_path = os.path.join(scratch, 'qho429.db')
+        if scale:
+            from db.synthetic import SCALES, create_dataset
+
+            create_dataset(copy_path, SCALES[scale], seed)
+        else:
+            source = sqlite3.connect(database_path or get_database_path())
+            copy = sqlite3.connect(copy_path)
+            source.backup(copy)
+            copy.close()
+            source.close()
+        if get_shard_count():
+            from db.shards import split_shopper_data
+
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                split_shopper_data(copy_path, get_shard_count())
+
+        connection = sqlite3.connect(copy_path)
+        workload = {
+            'shopper_ids': [row[0] for row in connection.execute("""SELECT shopper_id FROM shoppers LIMIT ?""",
+                                                                 (SAMPLE_SIZE,))],
+            'offers': connection.execute("""SELECT product_id, seller_id FROM product_sellers LIMIT ?""",
+                                         (SAMPLE_SIZE,)).fetchall(),
+            'category_ids': [row[0] for row in connection.execute("""SELECT category_id FROM categories""")],
+        }
+        connection.close()
+
+        # Each process gets its own shoppers, so no two sessions of the same shopper run at once
+        shopper_ids = workload['shopper_ids']
+        arguments = [(copy_path, seed + index, duration, mix, session_operations,
+                      dict(workload, shopper_ids=shopper_ids[index::processes] or shopper_ids), busy_timeout_ms)
+                     for index in range(processes)]
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(run_worker, arguments)
+        elapsed = time.perf_counter() - start
+
+    operations = {}
+    for operation in ['login', *OPERATIONS]:
+        latencies = sorted(latency for result in results for latency in result['latencies'].get(operation, []))
+        counts = collections.Counter()
+        for result in results:
+            counts.update(result['outcomes'].get(operation, {}))
+        if latencies or counts:
+            operations[operation] = {'ok': counts['ok'], 'failed': counts['failed'], 'skipped': counts['skipped']}
+            for fraction in PERCENTILES:
+                latency = _percentile(latencies, fraction)
+                operations[operation][f'p{round(fraction * 100)}_ms'] = round(latency * 1000, 3)
+    completed = sum(entry['ok'] + entry['failed'] for name, entry in operations.items() if name != 'login')
+    return {'processes': processes,
+            'shards': get_shard_count(),
+            'elapsed_seconds': round(elapsed, 3),
+            'sessions': sum(result['sessions'] for result in results),
+            'operations': completed,
+            'operations_per_second': round(completed / elapsed, 1),
+            'per_operation': operations,
+            'lock_wait_seconds': round(sum(result['lock_wait_seconds'] for result in results), 3),
+            'lock_wait_max_ms': round(max(result['lock_wait_max_seconds'] for result in results) * 1000, 3),
+            'busy_errors': sum(result['busy_errors'] for result in results),
+            'rollbacks': sum(result['rollbacks'] for result in results),
+            'commits': sum(result['commits'] for result in results)}
+
+
+def print_load_report(report: dict) -> None:
+    """
+    Function printing the results of run_load.
+
+    :param: dict returned by run_load
+    :return: None
+    """
+    print(f'{report["processes"]} processes, {report["shards"] or "no"} shards: {report["sessions"]} sessions, '
+          f'{report["operations"]} operations in {report["elapsed_seconds"]:.2f}s, '
+          f'{report["operations_per_second"]:.0f} operations/s')
+    print(f'{"operation":>10} {"ok":>7} {"failed":>7} {"skipped":>7}'
+          + ''.join(f' {f"p{round(fraction * 100)} ms":>8}' for fraction in PERCENTILES))
+    for operation, entry in report['per_operation'].items():
+        print(f'{operation:>10} {entry["ok"]:>7} {entry["failed"]:>7} {entry["skipped"]:>7}'
+              + ''.join(f' {entry[f"p{round(fraction * 100)}_ms"]:>8.2f}' for fraction in PERCENTILES))
+    worker_seconds = report['processes'] * report['elapsed_seconds']
+    print(f'Lock wait: {report["lock_wait_seconds"]:.2f}s in total '
+          f'({100 * report["lock_wait_seconds"] / worker_seconds:.1f}% of worker time), '
+          f'longest {report["lock_wait_max_ms"]:.1f} ms')
+    colour = helpers.PrintColors.WARNING if report['busy_errors'] else helpers.PrintColors.GREEN
+    print(f'{colour}Busy errors: {report["busy_errors"]}  Rollbacks: {report["rollbacks"]}  '
+          f'Commits: {report["commits"]}{helpers.PrintColors.END}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent shoppers from several processes against a '
+                                                 'scratch copy of the database')
+    parser.add_argument('--processes', type=int, default=4, help='worker processes, each one shopper at a time')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds each worker runs for')
+    parser.add_argument('--mix', type=parse_operation_mix, default=DEFAULT_OPERATION_MIX,
+                        help='operation shares, e.g. browse=40,add=30,update=15,checkout=15')
+    parser.add_argument('--session-operations', type=int, default=DEFAULT_SESSION_OPERATIONS,
+                        help='operations per session after logging in')
+    parser.add_argument('--database', help='database to copy, defaults to db/qho429.db')
+    parser.add_argument('--scale', help='generate a db.synthetic dataset of this scale instead of copying')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--busy-timeout-ms', type=int,
+                        help='busy_timeout of the worker connections, defaults to the one set by db.connect')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to a JSON file')
+    arguments = parser.parse_args()
+
+    load_report = run_load(arguments.processes, arguments.duration, arguments.mix, arguments.session_operations,
+                           arguments.database, arguments.scale, arguments.seed, arguments.busy_timeout_ms)
+    print_load_report(load_report)
+    if arguments.json:
+        with open(arguments.json, 'w', encoding='utf-8') as results_file:
+            json.dump(load_report, results_file, indent=2)
@@ -0,0 +1,125 @@
+import itertools
+import os
+import sys
+from typing import Iterable, Iterator, Optional, Sequence, TextIO
+
+import helpers
+
+"""Rows read ahead to size the columns of a table whose widths are not passed in"""
+WIDTH_SAMPLE_ROWS: int = 200
+
+"""Lines collected before each write when the output is not paged"""
+WRITE_CHUNK_LINES: int = 1024
+
+"""Gap between table columns"""
+COLUMN_GAP: str = '  '
+
+"""Prompt shown between pages when output is paged to the terminal"""
+PAGE_PROMPT: str = 'Press Enter for more, or Q to stop: '
+
+
+def get_page_size(output: TextIO) -> Optional[int]:
+    """
+    Function returning how many lines fit on the terminal above the paging prompt.
+
+    :param: output stream
+    :return: lines per page, None if the output is not a terminal
+    """
+    try:
+        if not output.isatty():
+            return None
+        return max(1, os.get_terminal_size(output.fileno()).lines - 1)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def write_paged(lines: Iterable[str], output: TextIO = None, page_size: Optional[int] = None) -> int:
+    """
+    Function writing lines in chunks, one write per chunk, so a long listing costs a handful of writes
+    instead of one per line and is never held in memory in full. On a terminal each chunk is one page of
+    page_size lines, followed by a prompt to continue.
+
+    :param: lines without line endings, typically a generator
+    :param: output stream, defaults to stdout
+    :param: lines per page, defaults to the terminal height; pass 0 to never pause
+    :return: number of lines written
+    """
+    output = output or sys.stdout
+    if page_size is None:
+        page_size = get_page_size(output)
+    chunk_lines = page_size or WRITE_CHUNK_LINES
+    written = 0
+    lines = iter(lines)
+    chunk = list(itertools.islice(lines, chunk_lines))
+    while chunk:
+        output.write('\n'.join(chunk) + '\n')
+        output.flush()
+        written += len(chunk)
+        chunk = list(itertools.islice(lines, chunk_lines))
+        if page_size and chunk:
+            user_input: str = input(f'{helpers.PrintColors.CYAN}{PAGE_PROMPT}{helpers.PrintColors.END}')
+            if user_input.strip().upper() == 'Q':
+                break
+    return written
+
+
+def _format_cell(value: object) -> str:
+    if isinstance(value, float):
+        return '{:.2f}'.format(value)
+    return '' if value is None else str(value)
+
+
+def _is_number(value: object) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def format_table(rows: Iterable[Sequence], headers: Sequence[str],
+                 widths: Optional[Sequence[int]] = None) -> Iterator[str]:
+    """
+    Function formatting rows as a plain text table, one line at a time. Unless widths are passed in, each
+    column is as wide as its header and the widest of the first WIDTH_SAMPLE_ROWS values; later values
+    that do not fit are cut short and end in '…'. Columns whose sampled values are all numbers, ignoring
+    blanks, are right aligned.
+
+    :param: rows, typically a cursor or generator
+    :param: column headers
+    :param: column widths
+    :return: lines without line endings
+    """
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, WIDTH_SAMPLE_ROWS))
+    if widths is None:
+        widths = [max([len(header)] + [len(_format_cell(row[column])) for row in sample])
+                  for column, header in enumerate(headers)]
+    numeric = []
+    for column in range(len(headers)):
+        values = [row[column] for row in sample if row[column] not in (None, '')]
+        numeric.append(bool(values) and all(map(_is_number, values)))
+
+    def format_line(cells: Sequence[str]) -> str:
+        line = []
+        for cell, width, right in zip(cells, widths, numeric):
+            if len(cell) > width:
+                cell = cell[:max(0, width - 1)] + '…'
+            line.append(cell.rjust(width) if right else cell.ljust(width))
+        return COLUMN_GAP.join(line).rstrip()
+
+    yield format_line(headers)
+    yield COLUMN_GAP.join('-' * width for width in widths)
+    for row in itertools.chain(sample, rows):
+        yield format_line([_format_cell(value) for value in row])
+
+
+def render_table(rows: Iterable[Sequence], headers: Sequence[str], widths: Optional[Sequence[int]] = None,
+                 output: TextIO = None, page_size: Optional[int] = None) -> int:
+    """
+    Function formatting and writing a table with format_table and write_paged.
+
+    :param: rows, typically a cursor or generator
+    :param: column headers
+    :param: column widths, sized from a sample of the rows when not passed in
+    :param: output stream, defaults to stdout
+    :param: lines per page, defaults to the terminal height; pass 0 to never pause
+    :return: number of lines written
+    """
+    return write_paged(format_table(rows, headers, widths), output, page_size)
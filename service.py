@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import helpers
+from db.connect import create_connection, get_shard, get_shards
+from db.maintenance import MaintenanceJob
+from db.writer import GroupCommitWriter, SerializedWriter
+from headless import HeadlessSession
+
+"""Address the service listens on; it is meant for local use only"""
+DEFAULT_HOST: str = '127.0.0.1'
+DEFAULT_PORT: int = 8429
+
+"""Threads running SQLite calls, each with its own connection"""
+DEFAULT_WORKERS: int = 4
+
+"""Requests admitted at once, running or waiting for a worker; further requests get 503 straight away"""
+DEFAULT_MAX_PENDING: int = 64
+
+"""Largest request body accepted"""
+MAX_BODY_BYTES: int = 64 * 1024
+
+
+def _positive_int(query: dict, name: str) -> int:
+    value = int(query[name])
+    if value < 1:
+        raise ValueError(f'{name} must be at least 1')
+    return value
+
+
+def _search_command(match: re.Match, query: dict, body: dict) -> dict:
+    command = {'command': 'search', 'text': query.get('q', '')}
+    if 'limit' in query:
+        command['limit'] = _positive_int(query, 'limit')
+    return command
+
+
+def _history_command(match: re.Match, query: dict, body: dict) -> dict:
+    command = {'command': 'history'}
+    if 'page_size' in query:
+        command['page_size'] = _positive_int(query, 'page_size')
+    if 'before_date' in query and 'before_id' in query:
+        command['before'] = [query['before_date'], int(query['before_id'])]
+    return command
+
+
+"""
+Routes as (method, path pattern, function building a headless command from the path match, query string and
+body). Paths under /shoppers/<shopper_id> run the command for that shopper.
+"""
+ROUTES: list[tuple[str, re.Pattern, Callable[[re.Match, dict, dict], dict]]] = [
+    ('GET', re.compile(r'/categories'), lambda match, query, body: {'command': 'browse'}),
+    ('GET', re.compile(r'/categories/(\d+)/products'),
+     lambda match, query, body: {'command': 'browse', 'category_id': int(match[1])}),
+    ('GET', re.compile(r'/products'), _search_command),
+    ('GET', re.compile(r'/products/(\d+)/sellers'),
+     lambda match, query, body: {'command': 'browse', 'product_id': int(match[1])}),
+    ('GET', re.compile(r'/shoppers/(\d+)/basket'), lambda match, query, body: {'command': 'basket'}),
+    ('POST', re.compile(r'/shoppers/(\d+)/basket'), lambda match, query, body: dict(body, command='add')),
+    ('PUT', re.compile(r'/shoppers/(\d+)/basket/(\d+)'),
+     lambda match, query, body: dict(body, command='update', product_id=int(match[2]))),
+    ('DELETE', re.compile(r'/shoppers/(\d+)/basket/(\d+)'),
+     lambda match, query, body: {'command': 'remove', 'product_id': int(match[2])}),
+    ('POST', re.compile(r'/shoppers/(\d+)/checkout'), lambda match, query, body: {'command': 'checkout'}),
+    ('GET', re.compile(r'/shoppers/(\d+)/orders'), _history_command),
+]
+
+
+class ShopService:
+    """
+    Local HTTP/JSON front-end over the db package. Requests are parsed on an asyncio event loop and each
+    one runs as a headless command in a bounded thread pool, where every worker thread keeps its own
+    connection. At most max_pending requests are admitted at once; beyond that the service answers 503
+    without queueing, so a burst cannot build an unbounded backlog.
+
+    With split set, the worker connections are read-only and every basket and order change is queued on a
+    single SerializedWriter, so reads run in parallel on WAL snapshots while writes never contend. Passing
+    group_commit_ms implies split and uses a GroupCommitWriter with that window instead. With
+    maintenance_interval set, a MaintenanceJob expires abandoned baskets and archives old orders in the
+    background every maintenance_interval seconds.
+
+    When shopper data is sharded, routes under /shoppers/<shopper_id> run on the worker's connection to that
+    shopper's shard, and split mode runs one writer per shard, so writes to different shards go in parallel.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 database_path: Optional[str] = None, split: bool = False,
+                 group_commit_ms: Optional[float] = None, maintenance_interval: Optional[float] = None) -> None:
+        self.database_path: Optional[str] = database_path
+        self.max_pending: int = max_pending
+        self.writers: dict[Optional[int], SerializedWriter] = {}
+        for shard in get_shards():
+            if group_commit_ms is not None:
+                self.writers[shard] = GroupCommitWriter(database_path, window_ms=group_commit_ms, shard=shard)
+            elif split:
+                self.writers[shard] = SerializedWriter(database_path, shard=shard)
+        self.maintenance: Optional[MaintenanceJob] = None
+        if maintenance_interval is not None:
+            self.maintenance = MaintenanceJob(database_path, maintenance_interval)
+        self.pending: int = 0
+        self.rejected: int = 0
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='db-worker',
+                                            initializer=self._open_worker_connection)
+        self._worker = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _open_worker_connection(self, shard: Optional[int] = None) -> sqlite3.Connection:
+        if not hasattr(self._worker, 'connections'):
+            self._worker.connections = {}
+        connection = create_connection(self.database_path, read_only=bool(self.writers), shard=shard)
+        self._worker.connections[shard] = connection
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def run_command(self, shopper_id: Optional[int], command: dict) -> tuple[HTTPStatus, dict]:
+        """
+        Function running one command on the calling worker's connection, after logging the shopper in
+        when the route names one.
+
+        :param: shopper_id, None for catalog routes
+        :param: headless command
+        :return: HTTP status and JSON result
+        """
+        shard = get_shard(shopper_id) if shopper_id is not None else None
+        connection = self._worker.connections.get(shard) or self._open_worker_connection(shard)
+        session = HeadlessSession(connection.cursor(), self.writers.get(shard))
+        if shopper_id is not None:
+            login = session.handle({'command': 'login', 'shopper_id': shopper_id})
+            if not login['ok']:
+                return HTTPStatus.NOT_FOUND, login
+        result = session.handle(command)
+        return (HTTPStatus.OK if result['ok'] else HTTPStatus.BAD_REQUEST), result
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        """
+        Function routing a request and running it in the thread pool, if it is admitted. A command failing
+        with an unexpected exception is answered with 500 and the connection is kept.
+
+        :param: HTTP method
+        :param: request target
+        :param: request body
+        :return: HTTP status and JSON result
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip('/')
+        routes = [(route_method, match, build) for route_method, pattern, build in ROUTES
+                  if (match := pattern.fullmatch(path))]
+        if not routes:
+            return HTTPStatus.NOT_FOUND, {'ok': False, 'error': 'Unknown path'}
+        match, build = next(((match, build) for route_method, match, build in routes if route_method == method),
+                            (None, None))
+        if build is None:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'ok': False, 'error': f'{method} not allowed'}
+
+        try:
+            parsed_body = json.loads(body) if body else {}
+            if not isinstance(parsed_body, dict):
+                raise ValueError('the body must be a JSON object')
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            command = build(match, query, parsed_body)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'ok': False, 'error': f'Invalid request: {e}'}
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'ok': False, 'error': 'Too many requests in progress'}
+        self.pending += 1
+        try:
+            shopper_id = int(match[1]) if path.startswith('/shoppers/') else None
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.run_command, shopper_id,
+                                                                    command)
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'ok': False, 'error': f'Internal error: {type(e).__name__}: {e}'}
+        finally:
+            self.pending -= 1
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Function serving the HTTP/1.1 requests of one client connection, keeping it open between requests
+        unless the client asks to close it.
+
+        :param: stream reader
+        :param: stream writer
+        :return: None
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split(maxsplit=2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    status, result = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'ok': False, 'error': 'Body too large'}
+                    keep_alive = False
+                else:
+                    status, result = await self.dispatch(method, target, await reader.readexactly(length))
+                    keep_alive = headers.get('connection', '').lower() != 'close' and \
+                        version.strip().upper() != 'HTTP/1.0'
+
+                payload = json.dumps(result).encode()
+                response_headers = [f'HTTP/1.1 {status.value} {status.phrase}',
+                                    'Content-Type: application/json',
+                                    f'Content-Length: {len(payload)}',
+                                    f'Connection: {"keep-alive" if keep_alive else "close"}']
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    response_headers.append('Retry-After: 1')
+                writer.write('\r\n'.join(response_headers + ['', '']).encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """
+        Function accepting connections until cancelled.
+
+        :param: host
+        :param: port
+        :return: None
+        """
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f'{helpers.PrintColors.GREEN}Serving on http://{host}:{port}{helpers.PrintColors.END}', flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        """
+        Function stopping the workers, the writers and the maintenance job and closing their connections.
+
+        :return: None
+        """
+        self._executor.shutdown(wait=True)
+        if self.maintenance is not None:
+            self.maintenance.close()
+        for writer in self.writers.values():
+            writer.close()
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local HTTP/JSON service over the shop database')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='database worker threads')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='requests admitted at once before answering 503')
+    parser.add_argument('--split', action='store_true',
+                        help='read through read-only connections and queue every write on a single writer')
+    parser.add_argument('--group-commit-ms', type=float, metavar='MS',
+                        help='like --split, committing basket changes that arrive within MS milliseconds together')
+    parser.add_argument('--maintenance-interval', type=float, metavar='SECONDS',
+                        help='expire abandoned baskets and archive old orders every SECONDS in the background')
+    arguments = parser.parse_args()
+
+    service = ShopService(arguments.workers, arguments.max_pending, split=arguments.split,
+                          group_commit_ms=arguments.group_commit_ms,
+                          maintenance_interval=arguments.maintenance_interval)
+    try:
+        asyncio.run(service.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
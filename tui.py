@@ -1,3 +1,4 @@
+import sys
 from typing import Union
 
 import helpers
@@ -16,6 +17,18 @@ def header() -> None:
           f'{helpers.PrintColors.END}')
 
 
+def clear_screen() -> None:
+    """
+    Function clearing the terminal with ANSI escape codes rather than by running cls or clear in a shell.
+    Nothing is written when the output is not a terminal.
+
+    :param: None
+    :return: None
+    """
+    if sys.stdout.isatty():
+        print('\033[2J\033[H', end='', flush=True)
+
+
 def user_numerical_entry(message: str) -> int:
     """
     Message prompting the user for a numerical entry.
@@ -58,12 +71,36 @@ def user_confirmation(message: str) -> bool:
             continue
 
 
+def page_navigation(has_previous: bool, has_next: bool) -> Union[str, None]:
+    """
+    Message prompting to move between pages of a paged listing.
+
+    :param: whether there is a previous page
+    :param: whether there is a next page
+    :return: 'N' for the next page, 'P' for the previous page, None to stop paging
+    """
+    choices = []
+    if has_next:
+        choices.append('N for the next page')
+    if has_previous:
+        choices.append('P for the previous page')
+    if not choices:
+        return None
+
+    user_input: str = input(f'{helpers.PrintColors.CYAN}Enter {" or ".join(choices)}, or any other key to '
+                            f'return to the menu: {helpers.PrintColors.END}').strip().upper()
+    print(f'')
+    if (user_input == 'N' and has_next) or (user_input == 'P' and has_previous):
+        return user_input
+    return None
+
 
 def menu(menu_options: dict[int, str] = None) -> Union[int, None]:
     """
     A menu consisting of the following options: 'Display your order history', 'Add an item to
     your basket', 'View your basket', 'Change the quantity of an item in your basket ', 'Remove an item from your
-    basket', 'Checkout' and 'Exit'
+    basket', 'Checkout', 'Exit' and 'Search for a product'. Search comes after Exit so that Exit keeps the
+    number 7 it has always had.
 
     The user's response is read in and returned as an integer corresponding to the selected option.
 
@@ -75,7 +112,7 @@ def menu(menu_options: dict[int, str] = None) -> Union[int, None]:
     if menu_options is None:
         menu_options = {1: "Display your order history", 2: "Add an item to your basket", 3: "View your basket",
                         4: "Change the quantity of an item in your basket ", 5: "Remove an item from your basket",
-                        6: "Checkout", 7: "Exit"}
+                        6: "Checkout", 7: "Exit", 8: "Search for a product"}
 
     for key, value in menu_options.items():
         print(f'{key}. {value}')